@@ -1,6 +1,17 @@
 from django.contrib import admin  # type: ignore
 from django.contrib.auth.admin import UserAdmin
-from .models import Sede, Servicios, Posicion, Dispositivo, Movimiento, Historial, RolUser
+from .models import Sede, Servicios, Posicion, Dispositivo, Movimiento, Historial, RolUser, TrabajoImportacion
+from .busqueda import CAMPOS_BUSQUEDA, filtrar_por_dispositivo
+
+
+class BusquedaDispositivoAdminMixin:
+    """Añade a la búsqueda del admin las filas cuyo dispositivo coincide (ver busqueda.py)."""
+
+    def get_search_results(self, request, queryset, search_term):
+        resultado, duplicados = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            resultado |= filtrar_por_dispositivo(queryset, search_term)
+        return resultado, duplicados
 
 # Admin para RolUser
 @admin.register(RolUser)
@@ -49,7 +60,7 @@ class ServiciosAdmin(admin.ModelAdmin):
 class DispositivoAdmin(admin.ModelAdmin):
     
     list_display = ('tipo', 'marca', 'modelo', 'serial', 'razon_social', 'sede', 'estado', 'ubicacion')
-    search_fields = ('serial', 'modelo', 'marca', 'razon_social')
+    search_fields = CAMPOS_BUSQUEDA
     list_filter = ('tipo', 'estado', 'sede', 'razon_social', 'ubicacion')
     list_editable = ('estado',)
     ordering = ('modelo',)
@@ -67,20 +78,27 @@ class DispositivoAdmin(admin.ModelAdmin):
 
 # Admin para Movimiento
 @admin.register(Movimiento)
-class MovimientoAdmin(admin.ModelAdmin):
+class MovimientoAdmin(BusquedaDispositivoAdminMixin, admin.ModelAdmin):
     list_display = ('dispositivo', 'encargado', 'fecha_movimiento', 'posicion_origen', 'posicion_destino', 'sede')
     list_filter = ('fecha_movimiento', 'posicion_origen', 'posicion_destino', 'sede')
-    search_fields = ('dispositivo__serial', 'dispositivo__modelo', 'encargado__username')
+    search_fields = ('encargado__username',)
     date_hierarchy = 'fecha_movimiento'
     ordering = ('-fecha_movimiento',)
 
 # Admin para Historial
 @admin.register(Historial)
-class HistorialAdmin(admin.ModelAdmin):
+class HistorialAdmin(BusquedaDispositivoAdminMixin, admin.ModelAdmin):
     list_display = ('dispositivo', 'usuario', 'fecha_modificacion', 'tipo_cambio', 'cambios')
-    search_fields = ('dispositivo__serial', 'usuario__username', 'tipo_cambio')
+    search_fields = ('usuario__username', 'tipo_cambio')
     list_filter = ('fecha_modificacion', 'tipo_cambio')
     date_hierarchy = 'fecha_modificacion'
+
+# Admin para TrabajoImportacion
+@admin.register(TrabajoImportacion)
+class TrabajoImportacionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'sede', 'usuario', 'estado', 'filas_procesadas', 'total_filas', 'creados', 'actualizados', 'fecha_creacion')
+    list_filter = ('estado', 'sede')
+    readonly_fields = ('fecha_creacion', 'fecha_inicio', 'fecha_fin', 'ultimo_avance')
     
     
 
@@ -4,4 +4,7 @@ class DispositivosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dispositivos'
     label = 'dispositivos' 
-   # Importa las señales para que se activen
+
+    def ready(self):
+        # Importa las señales para que se activen
+        from . import signals  # noqa: F401
@@ -0,0 +1,125 @@
+"""
+Validación de JWT sin consultar la base para los endpoints que el frontend
+llama constantemente (/api/validate/, /auth/keepalive/).
+
+Los tokens emitidos en el login llevan como claims el usuario, el correo, el
+rol y la sede de la sesión, así que JWTSinConsulta arma el usuario de la
+petición a partir del token firmado. Lo único que el token no sabe es si el
+usuario fue desactivado o eliminado después de emitirlo: cada proceso guarda
+en memoria qué usuarios están activos y lo vuelve a leer de la base cada
+JWT_REVOCACION_VIGENCIA segundos (una consulta por proceso, no por petición).
+Las señales de RolUser lo actualizan al instante en el proceso que hizo el
+cambio. Los cambios de rol se reflejan al renovar el token (/auth/refresh/).
+"""
+import threading
+import time
+from functools import cached_property
+from django.conf import settings # type: ignore
+from rest_framework.exceptions import AuthenticationFailed # type: ignore
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication # type: ignore
+from rest_framework_simplejwt.exceptions import InvalidToken # type: ignore
+from rest_framework_simplejwt.models import TokenUser # type: ignore
+from rest_framework_simplejwt.settings import api_settings # type: ignore
+from rest_framework_simplejwt.tokens import RefreshToken # type: ignore
+from .models import RolUser
+
+
+def agregar_claims(token, usuario, sede_id=None):
+    token['username'] = usuario.username
+    token['email'] = usuario.email
+    token['rol'] = usuario.rol
+    token['sede_id'] = sede_id
+
+
+def emitir_tokens(usuario, sede_id=None):
+    """Refresh token (y su access token) con los claims que usa JWTSinConsulta."""
+    refresh = RefreshToken.for_user(usuario)
+    agregar_claims(refresh, usuario, sede_id)
+    return refresh
+
+
+def _id_usuario(valor):
+    # simplejwt guarda el id como texto
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+class UsuarioToken(TokenUser):
+    """Usuario de la petición armado con los claims del token."""
+
+    @cached_property
+    def id(self):
+        return _id_usuario(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def email(self):
+        return self.token.get('email', '')
+
+    @cached_property
+    def rol(self):
+        return self.token.get('rol')
+
+    @cached_property
+    def sede_id(self):
+        return self.token.get('sede_id')
+
+
+# (ids de usuarios activos, mayor id existente, momento de la lectura)
+_usuarios = (frozenset(), 0, None)
+_bloqueo = threading.Lock()
+
+
+def _vigencia():
+    return getattr(settings, 'JWT_REVOCACION_VIGENCIA', 5)
+
+
+def _cargar_usuarios():
+    global _usuarios
+    # El mayor id nunca baja: si se borra el último usuario, su id sigue
+    # contando como leído y sus tokens se rechazan
+    activos, ultimo_id = set(), _usuarios[1]
+    for pk, activo in RolUser.objects.values_list('pk', 'is_active'):
+        ultimo_id = max(ultimo_id, pk)
+        if activo:
+            activos.add(pk)
+    _usuarios = (frozenset(activos), ultimo_id, time.monotonic())
+
+
+def usuario_vigente(usuario_id):
+    """
+    False si el usuario está desactivado o ya no existe. Los ids mayores que el
+    mayor leído hasta ahora son usuarios creados después de la lectura y se aceptan.
+    """
+    usuario_id = _id_usuario(usuario_id)
+    if usuario_id is None:
+        return False
+    activos, ultimo_id, cargado_en = _usuarios
+    if cargado_en is None or time.monotonic() - cargado_en >= _vigencia():
+        with _bloqueo:
+            if _usuarios[2] == cargado_en:
+                _cargar_usuarios()
+        activos, ultimo_id, _ = _usuarios
+    return usuario_id in activos or usuario_id > ultimo_id
+
+
+def actualizar_usuario(usuario_id, activo):
+    """Refleja de inmediato en este proceso la activación, desactivación o borrado de un usuario."""
+    global _usuarios
+    with _bloqueo:
+        activos, ultimo_id, cargado_en = _usuarios
+        activos = activos | {usuario_id} if activo else activos - {usuario_id}
+        _usuarios = (activos, max(ultimo_id, usuario_id), cargado_en)
+
+
+class JWTSinConsulta(JWTStatelessUserAuthentication):
+    """Autenticación JWT que no carga el usuario de la base."""
+
+    def get_user(self, validated_token):
+        usuario_id = _id_usuario(validated_token.get(api_settings.USER_ID_CLAIM))
+        if usuario_id is None:
+            raise InvalidToken("El token no identifica al usuario")
+        if not usuario_vigente(usuario_id):
+            raise AuthenticationFailed("Usuario desactivado", code='user_inactive')
+        return UsuarioToken(validated_token)
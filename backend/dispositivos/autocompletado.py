@@ -0,0 +1,254 @@
+"""
+Autocompletado de dispositivos por serial, placa CU y modelo.
+
+Cada proceso mantiene en memoria un índice de prefijos (trie) con un resumen
+de cada dispositivo, de modo que las sugerencias se resuelven sin consultar la
+base. El índice se precarga al arrancar el servidor (ver wsgi.py), se
+actualiza con las señales de Dispositivo al confirmar cada transacción y se
+reconstruye por completo cada AUTOCOMPLETADO_VIGENCIA segundos para recoger
+los cambios hechos por otros procesos. Mientras no está cargado las consultas
+se resuelven con istartswith contra la base.
+"""
+import logging
+import os
+import threading
+import time
+from django.conf import settings # type: ignore
+from django.db import connection # type: ignore
+from django.db.models import Q # type: ignore
+from .models import Dispositivo
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_INDEXADOS = ('serial', 'placa_cu', 'modelo')
+CAMPOS_RESUMEN = ('id', 'serial', 'placa_cu', 'modelo', 'marca', 'tipo', 'estado_uso', 'sede_id')
+
+
+def normalizar(texto):
+    return ' '.join((texto or '').upper().split())
+
+
+def claves_dispositivo(resumen):
+    """Textos por los que se puede encontrar un dispositivo."""
+    claves = set()
+    for campo in CAMPOS_INDEXADOS:
+        valor = normalizar(resumen.get(campo))
+        if not valor:
+            continue
+        claves.add(valor)
+        if campo == 'modelo':
+            # El modelo también se encuentra por cada palabra ("400" en "PRODESK 400")
+            palabras = valor.split(' ')
+            for i in range(1, len(palabras)):
+                claves.add(' '.join(palabras[i:]))
+    return claves
+
+
+class _Nodo:
+    __slots__ = ('hijos', 'ids')
+
+    def __init__(self):
+        self.hijos = {}
+        self.ids = set()
+
+
+class IndicePrefijos:
+    """Trie de claves normalizadas -> ids de dispositivo."""
+
+    def __init__(self):
+        self._raiz = _Nodo()
+        self._resumenes = {}
+        self._claves = {}
+
+    def __len__(self):
+        return len(self._resumenes)
+
+    def agregar(self, resumen):
+        self.quitar(resumen['id'])
+        claves = claves_dispositivo(resumen)
+        for clave in claves:
+            nodo = self._raiz
+            for caracter in clave:
+                nodo = nodo.hijos.setdefault(caracter, _Nodo())
+            nodo.ids.add(resumen['id'])
+        self._resumenes[resumen['id']] = resumen
+        self._claves[resumen['id']] = claves
+
+    def quitar(self, dispositivo_id):
+        for clave in self._claves.pop(dispositivo_id, ()):
+            nodo = self._nodo(clave)
+            if nodo is not None:
+                nodo.ids.discard(dispositivo_id)
+        self._resumenes.pop(dispositivo_id, None)
+
+    def _nodo(self, prefijo):
+        nodo = self._raiz
+        for caracter in prefijo:
+            nodo = nodo.hijos.get(caracter)
+            if nodo is None:
+                return None
+        return nodo
+
+    def buscar(self, prefijo, limite=10, filtro=None):
+        """
+        Resúmenes cuyas claves empiezan por `prefijo`, de la coincidencia más
+        corta (exacta) a la más larga. `filtro` descarta resúmenes.
+        """
+        nodo = self._nodo(normalizar(prefijo))
+        if nodo is None:
+            return []
+        resultados = []
+        vistos = set()
+        nivel = [nodo]
+        # Recorrido por niveles: se detiene en cuanto hay suficientes resultados
+        while nivel and len(resultados) < limite:
+            siguiente = []
+            for actual in nivel:
+                for dispositivo_id in sorted(actual.ids):
+                    if dispositivo_id in vistos:
+                        continue
+                    vistos.add(dispositivo_id)
+                    resumen = self._resumenes[dispositivo_id]
+                    if filtro is None or filtro(resumen):
+                        resultados.append(resumen)
+                        if len(resultados) >= limite:
+                            return resultados
+                siguiente.extend(actual.hijos[c] for c in sorted(actual.hijos))
+            nivel = siguiente
+        return resultados
+
+
+_indice = None
+_cargado_en = 0.0
+_bloqueo = threading.Lock()
+_cargando = threading.Event()
+# Cambios confirmados mientras se reconstruye el índice: se aplican al publicarlo
+_pendientes = []
+
+
+def _reiniciar_en_hijo():
+    # Con gunicorn --preload los workers nacen con fork() del proceso que
+    # precargó el índice: heredan el índice y el estado de carga, pero no el
+    # hilo que lo construía ni el dueño del bloqueo. Sin reiniciarlos, un hijo
+    # creería que hay una carga en curso para siempre y acumularía pendientes.
+    global _bloqueo, _cargando, _pendientes
+    _bloqueo = threading.Lock()
+    _cargando = threading.Event()
+    _pendientes = []
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_en_hijo)
+
+
+def _habilitado():
+    return getattr(settings, 'AUTOCOMPLETADO_INDICE', True)
+
+
+def _vigencia():
+    return getattr(settings, 'AUTOCOMPLETADO_VIGENCIA', 300)
+
+
+def resumen_dispositivo(dispositivo):
+    return {campo: getattr(dispositivo, campo) for campo in CAMPOS_RESUMEN}
+
+
+def construir_indice():
+    """Reconstruye el índice desde la base y lo publica al terminar."""
+    global _indice, _cargado_en
+    with _bloqueo:
+        _pendientes.clear()
+    indice = IndicePrefijos()
+    for resumen in Dispositivo.objects.values(*CAMPOS_RESUMEN).iterator(chunk_size=2000):
+        indice.agregar(resumen)
+    with _bloqueo:
+        for aplicar in _pendientes:
+            aplicar(indice)
+        _pendientes.clear()
+        _indice = indice
+        _cargado_en = time.monotonic()
+    return indice
+
+
+def _construir_en_segundo_plano():
+    try:
+        construir_indice()
+    except Exception as e:
+        logger.error(f"Error al construir el índice de autocompletado: {str(e)}", exc_info=True)
+    finally:
+        _cargando.clear()
+        connection.close()
+
+
+def precargar_indice():
+    """Construye el índice en un hilo aparte si no está cargado o ya venció."""
+    if not _habilitado():
+        return
+    with _bloqueo:
+        if _indice is not None and time.monotonic() - _cargado_en < _vigencia():
+            return
+        if _cargando.is_set():
+            return
+        _cargando.set()
+    threading.Thread(target=_construir_en_segundo_plano, name='autocompletado', daemon=True).start()
+
+
+def _aplicar(cambio):
+    with _bloqueo:
+        if _cargando.is_set():
+            _pendientes.append(cambio)
+        if _indice is not None:
+            cambio(_indice)
+
+
+def actualizar_dispositivos(dispositivos):
+    """Refleja en el índice (si está cargado) los dispositivos creados o modificados."""
+    resumenes = [resumen_dispositivo(d) for d in dispositivos]
+
+    def cambio(indice):
+        for resumen in resumenes:
+            indice.agregar(resumen)
+    _aplicar(cambio)
+
+
+def quitar_dispositivo(dispositivo_id):
+    _aplicar(lambda indice: indice.quitar(dispositivo_id))
+
+
+def _filtro(sede_id=None, estado_uso=None):
+    if sede_id is None and estado_uso is None:
+        return None
+
+    def filtro(resumen):
+        return (
+            (sede_id is None or resumen['sede_id'] == sede_id)
+            and (estado_uso is None or resumen['estado_uso'] == estado_uso)
+        )
+    return filtro
+
+
+def _sugerencias_db(texto, limite, sede_id=None, estado_uso=None):
+    coincide = Q()
+    for campo in CAMPOS_INDEXADOS:
+        coincide |= Q(**{f'{campo}__istartswith': texto})
+    coincide |= Q(modelo__icontains=f' {texto}')
+    queryset = Dispositivo.objects.filter(coincide)
+    if sede_id is not None:
+        queryset = queryset.filter(sede_id=sede_id)
+    if estado_uso is not None:
+        queryset = queryset.filter(estado_uso=estado_uso)
+    return list(queryset.order_by('serial', 'id').values(*CAMPOS_RESUMEN)[:limite])
+
+
+def sugerencias(texto, limite=10, sede_id=None, estado_uso=None):
+    """
+    Devuelve (resúmenes, fuente) con los dispositivos cuyo serial, placa CU o
+    modelo empiezan por el texto. `fuente` es 'indice' o 'db'.
+    """
+    precargar_indice()
+    with _bloqueo:
+        indice = _indice if _habilitado() else None
+        if indice is not None:
+            resultados = indice.buscar(texto, limite, _filtro(sede_id, estado_uso))
+            return [dict(r) for r in resultados], 'indice'
+    return _sugerencias_db(normalizar(texto), limite, sede_id, estado_uso), 'db'
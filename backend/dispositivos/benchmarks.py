@@ -0,0 +1,155 @@
+"""
+Benchmarks de los endpoints principales con línea base y detección de regresiones.
+
+Cada escenario se ejecuta con el cliente de pruebas de DRF contra los endpoints
+reales (URLs, permisos, serializadores y renderizado incluidos). Por escenario
+se registran los percentiles de latencia, las consultas SQL de una petición y
+el pico de memoria de Python (tracemalloc, en una pasada aparte para no
+distorsionar las latencias). La cache se vacía antes de cada petición para
+medir el trabajo real y no un acierto de cache.
+
+Los resultados se guardan en JSON (comando benchmark_endpoints --guardar) y
+las ejecuciones siguientes fallan si algún escenario empeora más allá del
+umbral respecto a esa línea base.
+"""
+import io
+import json
+import statistics
+import time
+import tracemalloc
+from django.core.cache import cache # type: ignore
+from django.db import connection # type: ignore
+from django.test.utils import CaptureQueriesContext # type: ignore
+
+VERSION_FORMATO = 1
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _consumir(respuesta):
+    # Las exportaciones son streaming: el trabajo ocurre al leer el contenido
+    if getattr(respuesta, 'streaming', False):
+        for _ in respuesta.streaming_content:
+            pass
+    else:
+        respuesta.content
+    return respuesta
+
+
+class Escenario:
+    """Petición a medir. `peticion(cliente, iteracion)` devuelve la respuesta."""
+
+    def __init__(self, nombre, peticion, esperado=200):
+        self.nombre = nombre
+        self.peticion = peticion
+        self.esperado = esperado
+
+    def ejecutar(self, cliente, iteracion):
+        cache.clear()
+        respuesta = _consumir(self.peticion(cliente, iteracion))
+        if respuesta.status_code != self.esperado:
+            raise AssertionError(
+                f"{self.nombre}: se esperaba {self.esperado} y se obtuvo {respuesta.status_code}"
+            )
+        return respuesta
+
+
+def escenarios_endpoints(sede_id, archivos_importacion):
+    """
+    Escenarios por defecto. `archivos_importacion` son dos Excel (bytes) que
+    se alternan para que cada importación modifique los mismos dispositivos.
+    """
+    def importar(cliente, iteracion):
+        archivo = io.BytesIO(archivos_importacion[iteracion % 2])
+        archivo.name = 'benchmark.xlsx'
+        return cliente.post('/api/importar-dispositivos/', {'file': archivo, 'sede_id': sede_id}, format='multipart')
+
+    return [
+        Escenario('dispositivos', lambda c, i: c.get('/api/dispositivos/')),
+        Escenario('dispositivos_sede', lambda c, i: c.get(f'/api/dispositivos/?sede_id={sede_id}')),
+        Escenario('dashboard', lambda c, i: c.get('/api/dashboard/')),
+        Escenario('historial', lambda c, i: c.get('/api/historial/')),
+        Escenario('movimientos', lambda c, i: c.get('/api/movimientos/')),
+        Escenario('posiciones', lambda c, i: c.get('/api/posiciones/')),
+        Escenario('exportar', lambda c, i: c.get(f'/exportar-excel/?sede={sede_id}')),
+        Escenario('importar', importar, esperado=202),
+    ]
+
+
+def medir(cliente, escenario, iteraciones=20, calentamiento=2):
+    for i in range(calentamiento):
+        escenario.ejecutar(cliente, i)
+
+    latencias = []
+    consultas = []
+    for i in range(iteraciones):
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            escenario.ejecutar(cliente, calentamiento + i)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        consultas.append(len(capturadas))
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        escenario.ejecutar(cliente, calentamiento + iteraciones)
+        pico = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'iteraciones': iteraciones,
+        'p50_ms': round(percentil(latencias, 50), 2),
+        'p95_ms': round(percentil(latencias, 95), 2),
+        'p99_ms': round(percentil(latencias, 99), 2),
+        'media_ms': round(statistics.fmean(latencias), 2),
+        'consultas': max(consultas),
+        'memoria_pico_kb': round(pico / 1024, 1),
+    }
+
+
+def comparar(resultados, linea_base, umbral=0.2, margen_ms=5.0):
+    """
+    Regresiones de `resultados` frente a la línea base. La latencia (p95) y la
+    memoria pueden crecer hasta el umbral relativo (más `margen_ms` para que el
+    ruido en endpoints muy rápidos no falle); las consultas no pueden aumentar.
+    """
+    regresiones = []
+    for nombre, actual in resultados.items():
+        base = linea_base.get('escenarios', {}).get(nombre)
+        if base is None:
+            continue
+        if actual['consultas'] > base['consultas']:
+            regresiones.append(f"{nombre}: consultas {base['consultas']} -> {actual['consultas']}")
+        limite = base['p95_ms'] * (1 + umbral) + margen_ms
+        if actual['p95_ms'] > limite:
+            regresiones.append(f"{nombre}: p95 {base['p95_ms']} ms -> {actual['p95_ms']} ms (límite {limite:.1f})")
+        limite = base['memoria_pico_kb'] * (1 + umbral) + 64
+        if actual['memoria_pico_kb'] > limite:
+            regresiones.append(
+                f"{nombre}: memoria {base['memoria_pico_kb']} KB -> {actual['memoria_pico_kb']} KB (límite {limite:.0f})"
+            )
+    return regresiones
+
+
+def cargar_linea_base(ruta):
+    with open(ruta, encoding='utf-8') as archivo:
+        datos = json.load(archivo)
+    if datos.get('version') != VERSION_FORMATO:
+        raise ValueError(f"Formato de línea base no soportado: {datos.get('version')}")
+    return datos
+
+
+def guardar_linea_base(ruta, resultados, parametros):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump({
+            'version': VERSION_FORMATO,
+            'base_de_datos': connection.vendor,
+            'parametros': parametros,
+            'escenarios': resultados,
+        }, archivo, indent=2, ensure_ascii=False, sort_keys=True)
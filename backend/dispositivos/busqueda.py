@@ -0,0 +1,88 @@
+"""
+Búsqueda de dispositivos por serial, placa CU, marca, modelo y observaciones.
+
+Cada término del texto debe aparecer en alguno de los campos (sin importar
+mayúsculas) y los resultados se ordenan por relevancia: coincidencia exacta,
+luego prefijo y luego contenido, ponderando más los identificadores.
+
+En PostgreSQL la migración 0008 crea índices GIN de trigramas sobre
+UPPER(campo), que es la expresión que Django genera para icontains /
+istartswith / iexact. Así tanto este buscador como los search_fields del
+admin y las búsquedas de historial y movimientos usan el índice en lugar de
+recorrer la tabla con LIKE '%texto%'.
+"""
+from django.db.models import Case, IntegerField, Q, Value, When # type: ignore
+from rest_framework import filters # type: ignore
+from .models import Dispositivo
+
+CAMPOS_BUSQUEDA = ('serial', 'placa_cu', 'marca', 'modelo', 'observaciones')
+
+# Peso de cada campo en la relevancia
+PESOS_CAMPOS = {'serial': 8, 'placa_cu': 8, 'modelo': 4, 'marca': 2, 'observaciones': 1}
+
+
+def terminos_busqueda(texto):
+    return [t for t in (texto or '').split() if t]
+
+
+def filtro_busqueda(texto, prefijo=''):
+    """
+    Q que exige que cada término esté en alguno de los campos de búsqueda.
+    `prefijo` permite filtrar desde otra tabla, p. ej. prefijo='dispositivo__'.
+    """
+    filtro = Q()
+    for termino in terminos_busqueda(texto):
+        alguno = Q()
+        for campo in CAMPOS_BUSQUEDA:
+            alguno |= Q(**{f'{prefijo}{campo}__icontains': termino})
+        filtro &= alguno
+    return filtro
+
+
+def _relevancia(terminos):
+    total = Value(0)
+    for termino in terminos:
+        for campo, peso in PESOS_CAMPOS.items():
+            total += Case(
+                When(**{f'{campo}__iexact': termino}, then=Value(4 * peso)),
+                When(**{f'{campo}__istartswith': termino}, then=Value(2 * peso)),
+                When(**{f'{campo}__icontains': termino}, then=Value(peso)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+    return total
+
+
+def buscar_dispositivos(texto, queryset=None):
+    """Dispositivos que coinciden con el texto, anotados con `relevancia` y ordenados por ella."""
+    terminos = terminos_busqueda(texto)
+    if queryset is None:
+        queryset = Dispositivo.objects.all()
+    if not terminos:
+        return queryset.none()
+    return queryset.filter(filtro_busqueda(texto)).annotate(
+        relevancia=_relevancia(terminos)
+    ).order_by('-relevancia', 'id')
+
+
+def filtrar_por_dispositivo(queryset, texto, campo='dispositivo'):
+    """
+    Filas cuyo dispositivo relacionado coincide con el texto. El dispositivo se
+    resuelve con una subconsulta sobre su propia tabla para aprovechar los
+    índices en lugar de combinar LIKE a través del join.
+    """
+    coincidentes = Dispositivo.objects.filter(filtro_busqueda(texto)).values('id')
+    return queryset.filter(**{f'{campo}__in': coincidentes})
+
+
+class BusquedaDispositivoFilter(filters.SearchFilter):
+    """SearchFilter que además busca en el dispositivo relacionado usando filtro_busqueda."""
+
+    def filter_queryset(self, request, queryset, view):
+        terminos = self.get_search_terms(request)
+        if not terminos:
+            return queryset
+        por_dispositivo = filtrar_por_dispositivo(queryset, ' '.join(terminos))
+        if not getattr(view, 'search_fields', None):
+            return por_dispositivo
+        return por_dispositivo | super().filter_queryset(request, queryset, view)
@@ -0,0 +1,93 @@
+"""
+Cache de respuestas para endpoints de lectura frecuente (sedes, servicios,
+posiciones, catálogos).
+
+Cada vista cacheada declara los grupos de datos de los que depende. Cada grupo
+tiene un número de versión guardado en la propia cache que forma parte de la
+clave; las señales de los modelos lo incrementan al confirmar un cambio, de
+modo que las entradas anteriores dejan de usarse sin tener que buscarlas ni
+borrarlas. Las claves incluyen además el usuario y la sede de la petición.
+
+El backend es el de CACHES['default'] y se puede cambiar por uno compartido
+(Redis, Memcached) sin tocar este módulo.
+"""
+import hashlib
+from functools import wraps
+from django.core.cache import cache # type: ignore
+from django.utils.http import parse_etags # type: ignore
+from rest_framework.response import Response # type: ignore
+
+TIEMPO_CACHE = 300
+
+SEDES = 'sedes'
+SERVICIOS = 'servicios'
+POSICIONES = 'posiciones'
+
+
+def version(grupo):
+    clave = f'version:{grupo}'
+    valor = cache.get(clave)
+    if valor is None:
+        valor = 1
+        cache.add(clave, valor, None)
+    return valor
+
+
+def invalidar(*grupos):
+    """Incrementa la versión de los grupos para descartar sus entradas."""
+    for grupo in grupos:
+        try:
+            cache.incr(f'version:{grupo}')
+        except ValueError:
+            cache.set(f'version:{grupo}', 1, None)
+
+
+def etag(nombre, grupos, *partes):
+    """ETag que cambia cuando cambia la versión de alguno de los grupos."""
+    versiones = '.'.join(str(version(g)) for g in grupos)
+    texto = ':'.join([nombre, versiones, *map(str, partes)])
+    return f'"{hashlib.md5(texto.encode()).hexdigest()}"'
+
+
+def etag_vigente(request, valor):
+    """True si el If-None-Match de la petición incluye la ETag indicada."""
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    return '*' in etags or valor in etags or f'W/{valor}' in etags
+
+
+def _sede_peticion(request, kwargs):
+    sede = kwargs.get('sede_id') or request.query_params.get('sede_id') or request.query_params.get('sede')
+    return sede or 'todas'
+
+
+def clave_respuesta(nombre, grupos, request, kwargs, por_usuario=True):
+    versiones = '.'.join(str(version(g)) for g in grupos)
+    usuario = request.user.pk if por_usuario and request.user.is_authenticated else 'anon'
+    ruta = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'vista:{nombre}:v{versiones}:u{usuario}:s{_sede_peticion(request, kwargs)}:{ruta}'
+
+
+def cachear_respuesta(*grupos, timeout=TIEMPO_CACHE, por_usuario=True):
+    """
+    Cachea las respuestas 200 a GET de una vista de DRF. Se coloca debajo de
+    @api_view / @permission_classes para recibir la petición ya autenticada.
+    `por_usuario=False` comparte la entrada entre usuarios (catálogos fijos).
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return vista(request, *args, **kwargs)
+
+            clave = clave_respuesta(vista.__name__, grupos, request, kwargs, por_usuario)
+            guardada = cache.get(clave)
+            if guardada is not None:
+                return Response(guardada, headers={'X-Cache': 'HIT'})
+
+            respuesta = vista(request, *args, **kwargs)
+            if isinstance(respuesta, Response) and respuesta.status_code == 200:
+                cache.set(clave, respuesta.data, timeout)
+                respuesta['X-Cache'] = 'MISS'
+            return respuesta
+        return envoltura
+    return decorador
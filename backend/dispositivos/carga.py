@@ -0,0 +1,328 @@
+"""
+Prueba de carga HTTP contra un servidor en marcha (runserver o gunicorn).
+
+Cada usuario virtual es un hilo que inicia sesión (/api/login/, token JWT) y
+repite recorridos elegidos al azar según su peso, con una pausa entre ellos
+que simula el tiempo de lectura de la persona:
+
+- tablero: coordinador consultando el dashboard y los movimientos por sede.
+- plano: coordinador refrescando el plano de un piso (con If-None-Match).
+- historial: búsqueda en el historial por serial y por dispositivo.
+- traslado: coordinador moviendo un dispositivo disponible a una posición libre.
+- entrada_salida: celador buscando un dispositivo y registrando su salida y
+  su entrada a una posición.
+
+traslado y entrada_salida MODIFICAN DATOS REALES del servidor (posiciones de
+dispositivos, movimientos e historial): solo se ejecutan con
+permitir_escrituras=True (--permitir-escrituras en el comando load_test) y
+deben apuntarse a una base de pruebas, nunca a producción.
+
+Cada sesión dura `sesion` recorridos y luego se vuelve a iniciar sesión. Por
+endpoint (método y patrón de ruta) se registran latencias, respuestas 4xx
+(rechazos esperables con concurrencia, p. ej. una posición que se llenó) y
+errores (5xx, timeouts, conexión). También se registra el máximo de
+peticiones simultáneas, que es el número de workers y conexiones a la base
+que el servidor necesitó para no encolar.
+"""
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from .benchmarks import percentil
+from .models import Posicion
+
+PESOS_RECORRIDOS = {
+    'tablero': 5,
+    'plano': 4,
+    'historial': 2,
+    'traslado': 1,
+    'entrada_salida': 3,
+}
+# Recorridos que escriben en la base del servidor
+RECORRIDOS_ESCRITURA = {'traslado', 'entrada_salida'}
+
+
+def pesos_por_defecto(permitir_escrituras=False):
+    """PESOS_RECORRIDOS con peso 0 en los recorridos de escritura si no se permiten."""
+    return {
+        nombre: peso if permitir_escrituras or nombre not in RECORRIDOS_ESCRITURA else 0
+        for nombre, peso in PESOS_RECORRIDOS.items()
+    }
+
+
+class ErrorCarga(Exception):
+    """La prueba no puede empezar (servidor caído, credenciales o catálogo vacío)."""
+
+
+class Resultados:
+    """Mediciones por endpoint compartidas por todos los usuarios virtuales."""
+
+    def __init__(self):
+        self._latencias = defaultdict(list)
+        self._rechazos = defaultdict(int)
+        self._errores = defaultdict(int)
+        self._bloqueo = threading.Lock()
+        self._en_curso = 0
+        self.concurrencia_maxima = 0
+
+    def iniciar(self):
+        with self._bloqueo:
+            self._en_curso += 1
+            self.concurrencia_maxima = max(self.concurrencia_maxima, self._en_curso)
+
+    def registrar(self, endpoint, ms, estado):
+        """`estado` es el código HTTP, o None si no hubo respuesta."""
+        with self._bloqueo:
+            self._en_curso -= 1
+            self._latencias[endpoint].append(ms)
+            if estado is None or estado >= 500:
+                self._errores[endpoint] += 1
+            elif estado >= 400:
+                self._rechazos[endpoint] += 1
+
+    def resumen(self, duracion):
+        with self._bloqueo:
+            latencias = {e: list(v) for e, v in self._latencias.items()}
+            rechazos, errores = dict(self._rechazos), dict(self._errores)
+
+        filas = []
+        for endpoint, valores in sorted(latencias.items()):
+            filas.append(_fila(endpoint, valores, rechazos.get(endpoint, 0), errores.get(endpoint, 0), duracion))
+        todas = [ms for valores in latencias.values() for ms in valores]
+        total = _fila('TOTAL', todas, sum(rechazos.values()), sum(errores.values()), duracion) if todas else None
+        return {
+            'duracion_s': round(duracion, 1),
+            'concurrencia_maxima': self.concurrencia_maxima,
+            'endpoints': filas,
+            'total': total,
+        }
+
+
+def _fila(endpoint, latencias, rechazos, errores, duracion):
+    return {
+        'endpoint': endpoint,
+        'peticiones': len(latencias),
+        'rps': round(len(latencias) / duracion, 2) if duracion else 0,
+        'p50_ms': round(percentil(latencias, 50), 1),
+        'p95_ms': round(percentil(latencias, 95), 1),
+        'p99_ms': round(percentil(latencias, 99), 1),
+        'max_ms': round(max(latencias), 1),
+        'rechazos': rechazos,
+        'errores': errores,
+        'errores_pct': round(100 * errores / len(latencias), 2),
+    }
+
+
+class Cliente:
+    """HTTP con urllib (sin dependencias) que mide cada petición en `resultados`."""
+
+    def __init__(self, base_url, resultados, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.resultados = resultados
+        self.timeout = timeout
+        self.token = None
+
+    def peticion(self, endpoint, metodo, ruta, datos=None, cabeceras=None):
+        """Devuelve (estado, datos JSON o None, cabeceras). Estado None si no hubo respuesta."""
+        cabeceras = {'Accept': 'application/json', **(cabeceras or {})}
+        cuerpo = None
+        if datos is not None:
+            cuerpo = json.dumps(datos).encode()
+            cabeceras['Content-Type'] = 'application/json'
+        if self.token:
+            cabeceras['Authorization'] = f'Bearer {self.token}'
+        solicitud = urllib.request.Request(self.base_url + ruta, data=cuerpo, headers=cabeceras, method=metodo)
+
+        estado, contenido, respuesta_cabeceras = None, b'', {}
+        self.resultados.iniciar()
+        inicio = time.perf_counter()
+        try:
+            with urllib.request.urlopen(solicitud, timeout=self.timeout) as respuesta:
+                estado, contenido, respuesta_cabeceras = respuesta.status, respuesta.read(), respuesta.headers
+        except urllib.error.HTTPError as e:
+            estado, contenido, respuesta_cabeceras = e.code, e.read(), e.headers
+        except OSError:
+            pass
+        finally:
+            self.resultados.registrar(endpoint, (time.perf_counter() - inicio) * 1000, estado)
+
+        try:
+            cuerpo_json = json.loads(contenido) if contenido else None
+        except ValueError:
+            cuerpo_json = None
+        return estado, cuerpo_json, respuesta_cabeceras
+
+    def login(self, usuario, clave, sede_id=None):
+        datos = {'username': usuario, 'password': clave}
+        if sede_id:
+            datos['sede_id'] = sede_id
+        estado, cuerpo, _ = self.peticion('POST api/login/', 'POST', '/api/login/', datos)
+        self.token = cuerpo.get('access') if estado == 200 and cuerpo else None
+        return estado
+
+
+class Catalogo:
+    """Sedes, pisos, posiciones y dispositivos que usan los recorridos, leídos por la API."""
+
+    def __init__(self, sedes):
+        self.sedes = sedes  # {sede_id: {'pisos': [...], 'dispositivos': [(id, serial)]}}
+
+    @classmethod
+    def cargar(cls, cliente, sede_id=None):
+        estado, cuerpo, _ = cliente.peticion('GET api/sede/', 'GET', '/api/sede/')
+        if estado != 200:
+            raise ErrorCarga(f"No se pudieron leer las sedes (HTTP {estado})")
+        ids = [s['id'] for s in cuerpo['sedes'] if sede_id in (None, s['id'])]
+
+        sedes = {}
+        for sede in ids:
+            _, posiciones, _ = cliente.peticion(
+                'GET api/sedes/<int:sede_id>/posiciones/', 'GET', f'/api/sedes/{sede}/posiciones/'
+            )
+            _, dispositivos, _ = cliente.peticion(
+                'GET api/dispositivos-disponibles/<int:sede_id>/', 'GET', f'/api/dispositivos-disponibles/{sede}/'
+            )
+            pisos = sorted({p['piso'] for p in posiciones}) if isinstance(posiciones, list) else []
+            dispositivos = [(d['id'], d['serial']) for d in dispositivos or [] if d.get('serial')]
+            if pisos and dispositivos:
+                sedes[sede] = {'pisos': pisos, 'dispositivos': dispositivos}
+        if not sedes:
+            raise ErrorCarga("No hay sedes con posiciones y dispositivos disponibles para la prueba")
+        return cls(sedes)
+
+
+class UsuarioVirtual(threading.Thread):
+
+    def __init__(self, numero, base_url, credenciales, catalogo, resultados, parar, pesos,
+                 pausa=1.0, sesion=20, timeout=30, semilla=None):
+        super().__init__(name=f'usuario-virtual-{numero}', daemon=True)
+        self.cliente = Cliente(base_url, resultados, timeout)
+        self.credenciales = credenciales
+        self.catalogo = catalogo
+        self.parar = parar
+        self.pausa = pausa
+        self.sesion = sesion
+        self.azar = random.Random(None if semilla is None else semilla + numero)
+        self.recorridos = [getattr(self, f'recorrido_{nombre}') for nombre in pesos]
+        self.pesos = list(pesos.values())
+        self.etags = {}  # (sede, piso) -> (ETag, posiciones libres)
+        self.sede = None
+
+    def run(self):
+        while not self.parar.is_set():
+            if self.cliente.login(*self.credenciales) != 200:
+                self.parar.wait(1)
+                continue
+            for _ in range(self.sesion):
+                if self.parar.is_set():
+                    return
+                self.sede = self.azar.choice(list(self.catalogo.sedes))
+                self.azar.choices(self.recorridos, self.pesos)[0]()
+                if self.pausa:
+                    self.parar.wait(self.azar.uniform(0, 2 * self.pausa))
+
+    def _dispositivo(self):
+        return self.azar.choice(self.catalogo.sedes[self.sede]['dispositivos'])
+
+    def _plano(self):
+        """Plano de un piso al azar; devuelve los ids de las posiciones con espacio."""
+        piso = self.azar.choice(self.catalogo.sedes[self.sede]['pisos'])
+        clave = (self.sede, piso)
+        cabeceras = {'If-None-Match': self.etags[clave][0]} if clave in self.etags else None
+        estado, plano, respuesta = self.cliente.peticion(
+            'GET api/sedes/<int:sede_id>/pisos/<str:piso>/plano/', 'GET',
+            f'/api/sedes/{self.sede}/pisos/{piso}/plano/', cabeceras=cabeceras
+        )
+        if estado == 200 and plano:
+            libres = [
+                celda['id'] for fila in plano['celdas'].values() for celda in fila.values()
+                if celda['cantidad_dispositivos'] < Posicion.MAX_DISPOSITIVOS
+            ]
+            self.etags[clave] = (respuesta.get('ETag'), libres)
+        return self.etags.get(clave, (None, []))[1]
+
+    def _mover(self, dispositivo_id, posicion_id, observacion):
+        self.cliente.peticion('POST api/movimientos/crear/', 'POST', '/api/movimientos/crear/', {
+            'dispositivo': dispositivo_id,
+            'posicion_destino': posicion_id,
+            'sede': self.sede,
+            'observacion': observacion,
+        })
+
+    def recorrido_tablero(self):
+        self.cliente.peticion('GET api/dashboard/', 'GET', f'/api/dashboard/?sede_id={self.sede}')
+        self.cliente.peticion('GET api/movimientos-por-sede/', 'GET', f'/api/movimientos-por-sede/?sede={self.sede}')
+
+    def recorrido_plano(self):
+        self._plano()
+
+    def recorrido_historial(self):
+        dispositivo_id, serial = self._dispositivo()
+        self.cliente.peticion('GET api/historial/?search', 'GET', f'/api/historial/?search={serial[:6]}')
+        self.cliente.peticion('GET api/historial/?dispositivo_id', 'GET', f'/api/historial/?dispositivo_id={dispositivo_id}')
+
+    def recorrido_traslado(self):
+        self.cliente.peticion(
+            'GET api/dispositivos-disponibles/<int:sede_id>/', 'GET', f'/api/dispositivos-disponibles/{self.sede}/'
+        )
+        libres = self._plano()
+        if libres:
+            self._mover(self._dispositivo()[0], self.azar.choice(libres), "Prueba de carga: traslado")
+
+    def recorrido_entrada_salida(self):
+        dispositivo_id, serial = self._dispositivo()
+        self.cliente.peticion('GET api/dispositivos/search/', 'GET', f'/api/dispositivos/search/?q={serial}&limit=5')
+        self._mover(dispositivo_id, None, "Prueba de carga: salida")
+        libres = self._plano()
+        if libres:
+            self._mover(dispositivo_id, self.azar.choice(libres), "Prueba de carga: entrada")
+
+
+def ejecutar_carga(base_url, usuario, clave, sede_id=None, usuarios=10, duracion=60, rampa=0,
+                   pesos=None, pausa=1.0, sesion=20, timeout=30, semilla=None, permitir_escrituras=False):
+    """
+    Lanza `usuarios` usuarios virtuales durante `duracion` segundos y devuelve el
+    resumen. Los recorridos de escritura requieren permitir_escrituras=True.
+    """
+    pesos = {
+        nombre: peso for nombre, peso in (pesos or pesos_por_defecto(permitir_escrituras)).items() if peso > 0
+    }
+    desconocidos = set(pesos) - set(PESOS_RECORRIDOS)
+    if desconocidos or not pesos:
+        raise ErrorCarga(f"Recorridos no válidos: {', '.join(sorted(desconocidos)) or 'ninguno con peso'}")
+    escrituras = sorted(set(pesos) & RECORRIDOS_ESCRITURA)
+    if escrituras and not permitir_escrituras:
+        raise ErrorCarga(
+            f"Los recorridos {', '.join(escrituras)} modifican datos del servidor: "
+            "habilítelos explícitamente con permitir_escrituras (--permitir-escrituras)"
+        )
+
+    preparacion = Cliente(base_url, Resultados(), timeout)
+    estado = preparacion.login(usuario, clave, sede_id)
+    if estado != 200:
+        raise ErrorCarga(f"No se pudo iniciar sesión como {usuario} (HTTP {estado})")
+    catalogo = Catalogo.cargar(preparacion, sede_id)
+
+    resultados = Resultados()
+    parar = threading.Event()
+    hilos = [
+        UsuarioVirtual(
+            numero, base_url, (usuario, clave, sede_id), catalogo, resultados, parar, pesos,
+            pausa=pausa, sesion=sesion, timeout=timeout, semilla=semilla
+        )
+        for numero in range(usuarios)
+    ]
+    inicio = time.monotonic()
+    for numero, hilo in enumerate(hilos):
+        # La rampa reparte los arranques para no iniciar todas las sesiones a la vez
+        if rampa and numero:
+            parar.wait(rampa / usuarios)
+        hilo.start()
+    parar.wait(max(0, duracion - (time.monotonic() - inicio)))
+    parar.set()
+    for hilo in hilos:
+        hilo.join(timeout + 1)
+    return resultados.resumen(time.monotonic() - inicio)
@@ -0,0 +1,175 @@
+"""
+Estadísticas de dispositivos y movimientos para el dashboard y las gráficas.
+
+Los totales se leen de tablas de contadores (EstadisticaDispositivos por
+sede × tipo × estado × estado_uso y EstadisticaMovimientos por sede × día)
+que las señales mantienen dentro de la misma transacción que el cambio, de modo
+que las consultas recorren unas pocas filas por sede en lugar del inventario.
+Las tarjetas además se guardan en cache; cualquier cambio en dispositivos
+incrementa la versión del grupo 'dashboard' (ver cache.py), lo que invalida las
+entradas de todas las sedes.
+"""
+from collections import Counter
+from django.core.cache import cache # type: ignore
+from django.db import IntegrityError, transaction # type: ignore
+from django.db.models import Count, F, Sum # type: ignore
+from django.db.models.functions import TruncDate # type: ignore
+from django.utils import timezone # type: ignore
+from .models import Dispositivo, EstadisticaDispositivos, EstadisticaMovimientos, Movimiento
+from .cache import invalidar, version
+
+TIEMPO_CACHE_DASHBOARD = 300
+DASHBOARD = 'dashboard'
+
+# (clave, título, filtro) de cada tarjeta del dashboard
+TARJETAS_DASHBOARD = [
+    ('total', "Total dispositivos", {}),
+    ('en_uso', "Dispositivos en uso", {'estado_uso': 'EN_USO'}),
+    ('buen_estado', "Buen estado", {'estado': 'BUENO'}),
+    ('disponibles', "Dispositivos disponibles", {'estado_uso': 'DISPONIBLE'}),
+    ('en_reparacion', "En reparación", {'estado': 'REPARAR'}),
+    ('perdidos', "Perdidos/robados", {'estado': 'PERDIDO'}),
+    ('mal_estado', "Mal estado", {'estado': 'MALO'}),
+    ('inhabilitados', "Inhabilitados", {'estado_uso': 'INHABILITADO'}),
+]
+
+
+def _filtrar_por_sede(queryset, sede_id):
+    if sede_id == 'null':
+        return queryset.filter(sede__isnull=True)
+    if sede_id:
+        return queryset.filter(sede_id=sede_id)
+    return queryset
+
+
+def calcular_tarjetas(sede_id=None):
+    """Calcula todas las tarjetas a partir de los contadores agrupados por estado."""
+    grupos = list(
+        _filtrar_por_sede(EstadisticaDispositivos.objects.all(), sede_id)
+        .values('estado', 'estado_uso').annotate(cantidad=Sum('total'))
+    )
+    return [
+        {
+            "title": titulo,
+            "value": sum(
+                g['cantidad'] for g in grupos
+                if all(g[campo] == valor for campo, valor in filtro.items())
+            ),
+            "date": "Actualizado hoy"
+        }
+        for _, titulo, filtro in TARJETAS_DASHBOARD
+    ]
+
+
+def totales_dispositivos_por_sede():
+    """Total de dispositivos por sede ({sede_id: total}, None para los que no tienen sede)."""
+    return dict(
+        EstadisticaDispositivos.objects.values('sede_id').annotate(cantidad=Sum('total'))
+        .values_list('sede_id', 'cantidad')
+    )
+
+
+def totales_movimientos_por_sede():
+    """Total de movimientos por sede ({sede_id: total}, None para los que no tienen sede)."""
+    return dict(
+        EstadisticaMovimientos.objects.values('sede_id').annotate(cantidad=Sum('total'))
+        .values_list('sede_id', 'cantidad')
+    )
+
+
+def obtener_tarjetas(sede_id=None):
+    """Devuelve las tarjetas de la sede (o de todas) desde cache si están vigentes."""
+    clave = f'dashboard:v{version(DASHBOARD)}:sede:{sede_id or "todas"}'
+    tarjetas = cache.get(clave)
+    if tarjetas is None:
+        tarjetas = calcular_tarjetas(sede_id)
+        cache.set(clave, tarjetas, TIEMPO_CACHE_DASHBOARD)
+    return tarjetas
+
+
+def invalidar_dashboard():
+    """Descarta las tarjetas cacheadas de todas las sedes."""
+    invalidar(DASHBOARD)
+
+
+CAMPOS_CLAVE_DISPOSITIVO = ('sede_id', 'tipo', 'estado', 'estado_uso')
+
+
+def clave_dispositivo(dispositivo, anterior=False):
+    """
+    Clave del contador al que pertenece el dispositivo. Con anterior=True se usa
+    el estado guardado (instantánea de from_db) en lugar del valor en memoria.
+    """
+    if anterior:
+        return tuple(dispositivo.valor_anterior(campo) for campo in CAMPOS_CLAVE_DISPOSITIVO)
+    return tuple(getattr(dispositivo, campo) for campo in CAMPOS_CLAVE_DISPOSITIVO)
+
+
+def clave_movimiento(movimiento):
+    fecha = movimiento.fecha_movimiento
+    return (movimiento.sede_id, timezone.localdate(fecha) if timezone.is_aware(fecha) else fecha.date())
+
+
+def _sumar(modelo, campos, clave, delta):
+    filtro = dict(zip(campos, clave))
+    if modelo.objects.filter(**filtro).update(total=F('total') + delta):
+        return
+    try:
+        # El savepoint permite reintentar si otra transacción creó la fila a la vez
+        with transaction.atomic():
+            modelo.objects.create(total=delta, **filtro)
+    except IntegrityError:
+        modelo.objects.filter(**filtro).update(total=F('total') + delta)
+
+
+def _aplicar(modelo, campos, deltas):
+    # Orden fijo para que transacciones concurrentes bloqueen las filas en el mismo orden
+    for clave in sorted(deltas, key=repr):
+        if deltas[clave]:
+            _sumar(modelo, campos, clave, deltas[clave])
+
+
+def aplicar_deltas_dispositivos(deltas):
+    """Aplica un Counter {(sede_id, tipo, estado, estado_uso): delta} a los contadores."""
+    _aplicar(EstadisticaDispositivos, ('sede_id', 'tipo', 'estado', 'estado_uso'), deltas)
+
+
+def aplicar_deltas_movimientos(deltas):
+    """Aplica un Counter {(sede_id, fecha): delta} a los contadores."""
+    _aplicar(EstadisticaMovimientos, ('sede_id', 'fecha'), deltas)
+
+
+def trasladar_estadisticas_sede(sede_id):
+    """
+    Pasa los contadores de una sede al grupo sin sede. Se usa antes de borrar la
+    sede, ya que sus dispositivos y movimientos quedan con sede nula (SET_NULL)
+    sin que se disparen señales.
+    """
+    aplicar_deltas_dispositivos(Counter({
+        (None, e.tipo, e.estado, e.estado_uso): e.total
+        for e in EstadisticaDispositivos.objects.filter(sede_id=sede_id)
+    }))
+    aplicar_deltas_movimientos(Counter({
+        (None, e.fecha): e.total
+        for e in EstadisticaMovimientos.objects.filter(sede_id=sede_id)
+    }))
+
+
+def recalcular_estadisticas():
+    """Reconstruye los contadores desde las tablas de dispositivos y movimientos."""
+    with transaction.atomic():
+        EstadisticaDispositivos.objects.all().delete()
+        EstadisticaDispositivos.objects.bulk_create([
+            EstadisticaDispositivos(**fila) for fila in
+            Dispositivo.objects.order_by().values('sede_id', 'tipo', 'estado', 'estado_uso')
+            .annotate(total=Count('id'))
+        ], batch_size=1000)
+
+        EstadisticaMovimientos.objects.all().delete()
+        EstadisticaMovimientos.objects.bulk_create([
+            EstadisticaMovimientos(**fila) for fila in
+            Movimiento.objects.order_by().annotate(fecha=TruncDate('fecha_movimiento'))
+            .values('sede_id', 'fecha').annotate(total=Count('id'))
+        ], batch_size=1000)
+
+        transaction.on_commit(invalidar_dashboard)
@@ -0,0 +1,110 @@
+"""
+Exportación del inventario a CSV o XLSX sin cargar toda la tabla en memoria.
+
+Las filas se leen con un cursor del servidor (.iterator) y se escriben de forma
+incremental: el CSV se envía a medida que se genera y el XLSX se arma con
+openpyxl en modo write-only sobre un archivo temporal que luego se transmite.
+"""
+import csv
+import tempfile
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse # type: ignore
+from openpyxl import Workbook # type: ignore
+from .models import Dispositivo
+
+TAMANO_CHUNK = 2000
+
+# Columnas adicionales que se pueden exportar además de las del modelo
+COLUMNAS_RELACIONADAS = ['sede__nombre', 'posicion__nombre', 'posicion__servicio__nombre']
+
+
+def columnas_disponibles():
+    return [f.attname for f in Dispositivo._meta.concrete_fields] + COLUMNAS_RELACIONADAS
+
+
+class _Eco:
+    """Pseudo-buffer para csv.writer: devuelve cada línea en lugar de guardarla."""
+    def write(self, value):
+        return value
+
+
+def filtrar_dispositivos(params):
+    """Aplica los filtros de sede, estado y tipo (listas separadas por comas)."""
+    queryset = Dispositivo.objects.all()
+
+    sede = params.get('sede')
+    if sede == 'null':
+        queryset = queryset.filter(sede__isnull=True)
+    elif sede:
+        queryset = queryset.filter(sede_id=int(sede))
+
+    for parametro, campo in (('estado', 'estado'), ('tipo', 'tipo'), ('estado_uso', 'estado_uso')):
+        valores = [v.strip() for v in params.get(parametro, '').split(',') if v.strip()]
+        if valores:
+            queryset = queryset.filter(**{f'{campo}__in': valores})
+
+    return queryset.order_by('id')
+
+
+def _filas(queryset, columnas):
+    return queryset.values_list(*columnas).iterator(chunk_size=TAMANO_CHUNK)
+
+
+def _respuesta_csv(queryset, columnas):
+    escritor = csv.writer(_Eco())
+
+    def generar():
+        yield '\ufeff'  # BOM para que Excel detecte UTF-8
+        yield escritor.writerow(columnas)
+        for fila in _filas(queryset, columnas):
+            yield escritor.writerow(fila)
+
+    response = StreamingHttpResponse(generar(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="dispositivos.csv"'
+    return response
+
+
+def _respuesta_xlsx(queryset, columnas):
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Dispositivos')
+    hoja.append(columnas)
+    for fila in _filas(queryset, columnas):
+        hoja.append(fila)
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename='dispositivos.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
+
+def exportar_dispositivos(params, formato='xlsx'):
+    """
+    Devuelve la respuesta de descarga según los parámetros:
+    - formato: 'xlsx' (por defecto) o 'csv'
+    - columnas: lista separada por comas (por defecto todas las del modelo)
+    - sede, estado, tipo, estado_uso: filtros
+    """
+    formato = params.get('formato', formato).lower()
+    if formato not in ('xlsx', 'csv'):
+        return JsonResponse({"error": "Formato no válido. Use 'xlsx' o 'csv'"}, status=400)
+
+    columnas = [c.strip() for c in params.get('columnas', '').split(',') if c.strip()]
+    if columnas:
+        invalidas = set(columnas) - set(columnas_disponibles())
+        if invalidas:
+            return JsonResponse({"error": f"Columnas no válidas: {', '.join(sorted(invalidas))}"}, status=400)
+    else:
+        columnas = [f.attname for f in Dispositivo._meta.concrete_fields]
+
+    try:
+        queryset = filtrar_dispositivos(params)
+    except ValueError:
+        return JsonResponse({"error": "ID de sede inválido"}, status=400)
+
+    if formato == 'csv':
+        return _respuesta_csv(queryset, columnas)
+    return _respuesta_xlsx(queryset, columnas)
@@ -0,0 +1,171 @@
+"""
+Escritura diferida del historial de cambios.
+
+Los eventos no se insertan al momento: se acumulan mientras dura la transacción
+y se escriben con un único bulk_create cuando esta se confirma. Si la
+transacción (o el savepoint en el que se registraron) se revierte, los eventos
+se descartan junto con ella.
+
+Con HISTORIAL_EN_SEGUNDO_PLANO = True la inserción tampoco ocurre en la
+petición: los eventos confirmados se envían a una cola local que drena un
+proceso escritor, agrupándolos en lotes.
+"""
+import atexit
+import logging
+import multiprocessing
+import queue
+import weakref
+from django.conf import settings # type: ignore
+from django.db import transaction # type: ignore
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 500
+ESPERA_LOTE = 0.5  # segundos que el escritor espera para completar un lote
+
+_cola = None
+_escritor = None
+
+
+class _Lote:
+    """Eventos registrados en un mismo nivel de savepoint de la transacción."""
+
+    def __init__(self):
+        self.eventos = []
+        self.escrito = False
+
+    def escribir(self):
+        self.escrito = True
+        guardar_eventos(self.eventos)
+
+
+def _lote_actual(conexion):
+    # Un lote por nivel de savepoint: su callback se registra en ese nivel, así
+    # que Django lo descarta si el savepoint se revierte. El diccionario guarda
+    # referencias débiles y la única fuerte es ese callback, de modo que al
+    # descartarlo (rollback) o ejecutarlo (commit) el lote desaparece solo.
+    lotes = conexion.__dict__.setdefault('_historial_lotes', weakref.WeakValueDictionary())
+    clave = tuple(conexion.savepoint_ids)
+    lote = lotes.get(clave)
+    if lote is None or lote.escrito:
+        lote = lotes[clave] = _Lote()
+        transaction.on_commit(lote.escribir)
+    return lote
+
+
+def registrar_eventos(eventos):
+    """
+    Registra instancias de Historial (sin guardar) para escribirlas al confirmar
+    la transacción en curso. Fuera de una transacción se escriben de inmediato.
+    """
+    if not eventos:
+        return
+    conexion = transaction.get_connection()
+    if not conexion.in_atomic_block:
+        guardar_eventos(eventos)
+        return
+    _lote_actual(conexion).eventos.extend(eventos)
+
+
+def registrar_historial(**campos):
+    """Equivalente diferido de Historial.objects.create(**campos)."""
+    from .models import Historial
+    evento = Historial(**campos)
+    registrar_eventos([evento])
+    return evento
+
+
+def guardar_eventos(eventos):
+    """Escribe los eventos con bulk_create o los envía al proceso escritor."""
+    if not eventos:
+        return
+    if getattr(settings, 'HISTORIAL_EN_SEGUNDO_PLANO', False):
+        try:
+            cola = obtener_cola()
+            for evento in eventos:
+                cola.put(_serializar(evento))
+            return
+        except Exception as e:
+            logger.error(f"No se pudo enviar el historial al escritor, se guarda en línea: {str(e)}")
+    insertar_eventos(eventos)
+
+
+def insertar_eventos(eventos):
+    """
+    Inserta los eventos con bulk_create. Si la base rechaza el lote se reintenta
+    evento por evento, para que uno inválido no se lleve al resto del historial.
+    """
+    from .models import Historial
+
+    try:
+        with transaction.atomic():
+            Historial.objects.bulk_create(eventos, batch_size=TAMANO_LOTE)
+        return
+    except Exception as e:
+        logger.error(f"Error al escribir {len(eventos)} eventos de historial, se reintenta uno por uno: {str(e)}")
+
+    for evento in eventos:
+        # bulk_create asigna pk aunque luego se revierta
+        evento.pk = None
+        evento._state.adding = True
+        try:
+            with transaction.atomic():
+                Historial.objects.bulk_create([evento])
+        except Exception as e:
+            logger.error(f"Evento de historial no guardado {_serializar(evento)}: {str(e)}", exc_info=True)
+
+
+def _serializar(evento):
+    return {
+        f.attname: getattr(evento, f.attname)
+        for f in evento._meta.concrete_fields if not f.primary_key
+    }
+
+
+def obtener_cola():
+    """Cola compartida con el proceso escritor, que se inicia bajo demanda."""
+    global _cola, _escritor
+    if _escritor is None or not _escritor.is_alive():
+        contexto = multiprocessing.get_context('spawn')
+        _cola = contexto.Queue()
+        _escritor = contexto.Process(
+            target=escribir_desde_cola, args=(_cola,), name='historial-escritor', daemon=True
+        )
+        _escritor.start()
+    return _cola
+
+
+def detener_escritor(timeout=10):
+    """Pide al escritor que vacíe la cola y termine."""
+    global _cola, _escritor
+    if _escritor is not None and _escritor.is_alive():
+        _cola.put(None)
+        _escritor.join(timeout)
+    _cola = _escritor = None
+
+
+atexit.register(detener_escritor)
+
+
+def escribir_desde_cola(cola):
+    """Bucle del proceso escritor: agrupa los eventos de la cola en lotes."""
+    import django # type: ignore
+    django.setup()
+    from .models import Historial
+
+    activo = True
+    while activo:
+        filas = []
+        fila = cola.get()
+        while fila is not None:
+            filas.append(fila)
+            if len(filas) >= TAMANO_LOTE:
+                break
+            try:
+                fila = cola.get(timeout=ESPERA_LOTE)
+            except queue.Empty:
+                break
+        activo = fila is not None
+
+        if filas:
+            insertar_eventos([Historial(**f) for f in filas])
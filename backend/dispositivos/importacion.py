@@ -0,0 +1,389 @@
+"""
+Motor de importación masiva de dispositivos desde Excel.
+
+El DataFrame se normaliza con operaciones vectorizadas de pandas, los servicios
+y posiciones de la sede se resuelven en pocas consultas a diccionarios en memoria
+y los dispositivos se aplican con bulk_create / bulk_update, registrando el
+historial y los movimientos también en lote.
+"""
+import logging
+from collections import Counter
+import pandas as pd # type: ignore
+from django.db import IntegrityError, transaction # type: ignore
+from .models import Dispositivo, Servicios, Posicion, Historial, Movimiento
+from .historial import registrar_eventos
+from .estadisticas import (
+    aplicar_deltas_dispositivos, aplicar_deltas_movimientos, clave_dispositivo,
+    clave_movimiento, invalidar_dashboard
+)
+from .autocompletado import actualizar_dispositivos
+from .cache import POSICIONES, SERVICIOS, invalidar
+
+logger = logging.getLogger(__name__)
+
+# Columna del Excel (ya normalizada) -> campo del modelo Dispositivo
+MAPEO_COLUMNAS = {
+    'tipo_dispositivo': 'tipo',
+    'fabricante': 'marca',
+    'modelo': 'modelo',
+    'serial': 'serial',
+    'cu': 'placa_cu',
+    'sistema_operativo': 'sistema_operativo',
+    'procesador': 'procesador',
+    'disco_duro': 'capacidad_disco_duro',
+    'memoria_ram': 'capacidad_memoria_ram',
+    'proveedor': 'proveedor',
+    'estado_proveedor': 'estado_propiedad',
+    'razon_social': 'razon_social',
+    'ubicacion': 'ubicacion',
+    'estado': 'estado',
+    'observacion': 'observaciones',
+    'regimen': 'regimen',
+    'piso': 'piso',
+}
+
+# Campos que se escriben aunque vengan vacíos en el archivo
+CAMPOS_A_MANTENER = {'serial', 'razon_social', 'ubicacion', 'observaciones', 'estado_propiedad', 'regimen', 'piso'}
+
+VALORES_NULOS = r'(?i)^\s*(na|n/a|-)\s*$'
+
+
+def normalizar_columnas(df):
+    """Normaliza los encabezados del Excel: mayúsculas, sin espacios ni tildes."""
+    df.columns = [
+        str(col).upper().strip().replace(' ', '_').replace('Ó', 'O').replace('É', 'E').replace('Á', 'A')
+        for col in df.columns
+    ]
+    return df
+
+
+def normalizar_dataframe(df):
+    """
+    Limpia el DataFrame completo en operaciones por columna:
+    valores 'NA', 'N/A' y '-' pasan a None, los textos se recortan y
+    se aplican los valores por defecto de tipo, modelo y estado.
+    """
+    df = normalizar_columnas(df.copy())
+    df.columns = [col.lower() for col in df.columns]
+
+    for col in df.columns:
+        serie = df[col].astype(object)
+        es_texto = serie.map(type).eq(str)
+        if es_texto.any():
+            texto = serie[es_texto].str.strip()
+            serie[es_texto] = texto.mask(texto.str.fullmatch(VALORES_NULOS))
+        df[col] = serie
+
+    # Los campos de texto se guardan como str aunque Excel los lea como números
+    for columna in [*MAPEO_COLUMNAS, 'servicio', 'posicion']:
+        if columna in df.columns:
+            df[columna] = df[columna].map(lambda v: None if pd.isna(v) else str(v))
+
+    for columna, defecto in (('tipo_dispositivo', 'COMPUTADOR'), ('modelo', 'SIN MODELO')):
+        if columna in df.columns:
+            df[columna] = df[columna].mask(df[columna].isna() | df[columna].eq(''), defecto)
+        else:
+            df[columna] = defecto
+    if 'estado' not in df.columns:
+        df['estado'] = 'BUENO'
+
+    # pandas infiere columnas de texto con NaN; el modelo espera None
+    df = df.astype(object)
+    return df.where(df.notna(), None)
+
+
+class ImportadorDispositivos:
+    """
+    Importa dispositivos de una sede por lotes.
+
+    Los servicios y posiciones se cargan una sola vez y se reutilizan entre
+    lotes; cada lote hace un número fijo de consultas sin importar sus filas.
+    """
+    TAMANO_LOTE = 1000
+
+    def __init__(self, sede, usuario=None):
+        self.sede = sede
+        self.usuario = usuario if usuario and getattr(usuario, 'is_authenticated', False) else None
+        self._servicios = {}
+        self._posiciones = None
+
+    def importar(self, df, tamano_lote=None):
+        """Importa todo el DataFrame en una sola transacción."""
+        df = normalizar_dataframe(df)
+        tamano_lote = tamano_lote or self.TAMANO_LOTE
+        resultado = {'total': len(df), 'created': 0, 'updated': 0, 'errors': []}
+
+        with transaction.atomic():
+            for inicio in range(0, len(df), tamano_lote):
+                parcial = self.importar_lote(df.iloc[inicio:inicio + tamano_lote])
+                resultado['created'] += parcial['created']
+                resultado['updated'] += parcial['updated']
+                resultado['errors'].extend(parcial['errors'])
+
+        return resultado
+
+    def importar_lote(self, df):
+        """
+        Importa un lote ya normalizado (ver normalizar_dataframe).
+        El índice del DataFrame se usa para reportar el número de fila del Excel.
+        """
+        created = 0
+        updated = 0
+        errors = []
+
+        registros = [(idx + 2, fila) for idx, fila in zip(df.index, df.to_dict('records'))]
+        self._cargar_posiciones()
+        self._resolver_servicios({f['servicio'] for _, f in registros if f.get('servicio')})
+
+        seriales = {f['serial'] for _, f in registros if f.get('serial')}
+        existentes = {
+            d.serial: d for d in Dispositivo.objects.filter(serial__in=seriales).select_related('posicion', 'sede')
+        }
+        originales = {serial: self._snapshot(d) for serial, d in existentes.items()}
+
+        placas = {f['cu'] for _, f in registros if f.get('cu')}
+        duenos_placa = dict(
+            Dispositivo.objects.filter(placa_cu__in=placas).values_list('placa_cu', 'serial')
+        )
+
+        ocupacion = dict(Posicion.objects.filter(sede=self.sede).values_list('id', 'ocupacion'))
+
+        por_crear = []
+        posiciones_actualizadas = {}
+        filas = {}
+
+        with transaction.atomic():
+            for row_num, fila in registros:
+                try:
+                    servicio = None
+                    if fila.get('servicio'):
+                        servicio = self._servicios.get(fila['servicio'])
+                        if servicio is None:
+                            raise ValueError(f"No se pudo crear el servicio '{fila['servicio']}' (código analítico duplicado)")
+
+                    posicion = self._buscar_posicion(fila.get('posicion'), fila.get('piso'))
+
+                    datos = {}
+                    for columna, campo in MAPEO_COLUMNAS.items():
+                        valor = fila.get(columna)
+                        if valor is not None or campo in CAMPOS_A_MANTENER:
+                            datos[campo] = valor
+                    self._validar_longitudes(datos)
+
+                    serial = datos.get('serial')
+                    dispositivo = existentes.get(serial) if serial else None
+
+                    placa = datos.get('placa_cu')
+                    if placa in duenos_placa and (serial is None or duenos_placa[placa] != serial):
+                        raise ValueError(f'La placa CU {placa} ya pertenece a otro dispositivo')
+
+                    posicion_anterior_id = dispositivo.posicion_id if dispositivo else None
+                    if posicion and posicion.id != posicion_anterior_id:
+                        if ocupacion.get(posicion.id, 0) >= Posicion.MAX_DISPOSITIVOS:
+                            raise ValueError(
+                                f'La posición {posicion.nombre} ya tiene el máximo de {Posicion.MAX_DISPOSITIVOS} dispositivos'
+                            )
+                        ocupacion[posicion.id] = ocupacion.get(posicion.id, 0) + 1
+                        if posicion_anterior_id:
+                            ocupacion[posicion_anterior_id] = ocupacion.get(posicion_anterior_id, 1) - 1
+
+                    if posicion and servicio and posicion.servicio_id != servicio.id:
+                        posicion.servicio = servicio
+                        posiciones_actualizadas[posicion.id] = posicion
+
+                    if dispositivo is None:
+                        dispositivo = Dispositivo(sede=self.sede, posicion=posicion, **datos)
+                        por_crear.append(dispositivo)
+                        if serial:
+                            existentes[serial] = dispositivo
+                        created += 1
+                    else:
+                        for campo, valor in datos.items():
+                            setattr(dispositivo, campo, valor)
+                        if posicion:
+                            dispositivo.posicion = posicion
+                        elif dispositivo.posicion_id and dispositivo.posicion.sede_id != self.sede.id:
+                            # Viene de otra sede: la posición anterior no aplica en esta
+                            dispositivo.posicion = None
+                        dispositivo.sede = self.sede
+                        updated += 1
+                    filas[id(dispositivo)] = row_num
+
+                    if placa:
+                        duenos_placa[placa] = serial
+
+                except Exception as e:
+                    logger.error(f'Error procesando fila {row_num}: {str(e)}')
+                    errors.append(f'Fila {row_num}: Error al procesar - {str(e)}')
+
+            if posiciones_actualizadas:
+                Posicion.objects.bulk_update(posiciones_actualizadas.values(), ['servicio'])
+
+            por_actualizar, cambios = [], {}
+            for serial, anterior in originales.items():
+                dispositivo = existentes[serial]
+                diferencias = self._diferencias(anterior, dispositivo)
+                if diferencias:
+                    por_actualizar.append(dispositivo)
+                    cambios[id(dispositivo)] = diferencias
+
+            campos = [f.name for f in Dispositivo._meta.concrete_fields if not f.primary_key]
+            creados, actualizados = self._guardar(por_crear, por_actualizar, campos, filas, errors)
+            created -= len(por_crear) - len(creados)
+            updated -= len(por_actualizar) - len(actualizados)
+            por_crear, por_actualizar = creados, actualizados
+
+            historial = [self._historial_creacion(d) for d in por_crear]
+            movimientos = []
+            for dispositivo in por_actualizar:
+                historial.append(self._historial_modificacion(dispositivo, cambios[id(dispositivo)]))
+                if dispositivo.campo_modificado('posicion_id'):
+                    origen_id = dispositivo.valor_anterior('posicion_id')
+                    movimientos.append(Movimiento(
+                        dispositivo=dispositivo,
+                        posicion_origen_id=origen_id,
+                        posicion_destino=dispositivo.posicion,
+                        ubicacion_origen=None if origen_id else 'BODEGA',
+                        ubicacion_destino=None if dispositivo.posicion_id else 'SEDE',
+                        encargado=self.usuario,
+                        observacion="Movimiento automático por cambio de posición",
+                        sede=dispositivo.sede
+                    ))
+
+            Movimiento.objects.bulk_create(movimientos, batch_size=500)
+            registrar_eventos(historial)
+
+            # bulk_create / bulk_update no disparan señales: los contadores se ajustan aquí
+            deltas = Counter(clave_dispositivo(d) for d in por_crear)
+            for dispositivo in por_actualizar:
+                deltas[clave_dispositivo(dispositivo)] += 1
+                deltas[clave_dispositivo(dispositivo, anterior=True)] -= 1
+            aplicar_deltas_dispositivos(deltas)
+            aplicar_deltas_movimientos(Counter(clave_movimiento(m) for m in movimientos))
+            ocupacion = Counter(d.posicion_id for d in por_crear)
+            for dispositivo in por_actualizar:
+                ocupacion[dispositivo.posicion_id] += 1
+                ocupacion[dispositivo.valor_anterior('posicion_id')] -= 1
+            Posicion.ajustar_ocupacion(ocupacion)
+            transaction.on_commit(invalidar_dashboard)
+            transaction.on_commit(lambda: invalidar(SERVICIOS, POSICIONES))
+            modificados = por_crear + por_actualizar
+            transaction.on_commit(lambda: actualizar_dispositivos(modificados))
+
+        return {'created': created, 'updated': updated, 'errors': errors}
+
+    def _guardar(self, por_crear, por_actualizar, campos, filas, errors):
+        """
+        Guarda el lote con bulk_create / bulk_update. Si la base rechaza alguna fila
+        (p. ej. un serial que otra importación creó mientras tanto) se repite fila
+        por fila para reportar solo las rechazadas. Devuelve los dispositivos guardados.
+        """
+        try:
+            with transaction.atomic():
+                Dispositivo.objects.bulk_create(por_crear, batch_size=500)
+                Dispositivo.objects.bulk_update(por_actualizar, campos, batch_size=500)
+            return por_crear, por_actualizar
+        except IntegrityError:
+            for dispositivo in por_crear:
+                self._descartar_pk(dispositivo)
+
+        creados, actualizados = [], []
+        for dispositivo in por_crear + por_actualizar:
+            nuevo = dispositivo._state.adding
+            try:
+                with transaction.atomic():
+                    if nuevo:
+                        Dispositivo.objects.bulk_create([dispositivo])
+                    else:
+                        Dispositivo.objects.bulk_update([dispositivo], campos)
+            except IntegrityError as e:
+                if nuevo:
+                    self._descartar_pk(dispositivo)
+                row_num = filas[id(dispositivo)]
+                logger.error(f'Error guardando fila {row_num}: {str(e)}')
+                errors.append(f'Fila {row_num}: Error al guardar - {str(e)}')
+                continue
+            (creados if nuevo else actualizados).append(dispositivo)
+        return creados, actualizados
+
+    def _descartar_pk(self, dispositivo):
+        # bulk_create asigna pk aunque luego se revierta el savepoint
+        dispositivo.pk = None
+        dispositivo._state.adding = True
+
+    def _cargar_posiciones(self):
+        if self._posiciones is not None:
+            return
+        self._posiciones = {}
+        for posicion in Posicion.objects.filter(sede=self.sede).order_by('-id'):
+            # Orden descendente para que, ante nombres repetidos, quede la de menor id
+            nombre = (posicion.nombre or '').lower()
+            self._posiciones[(nombre, (posicion.piso or '').lower())] = posicion
+            self._posiciones[(nombre, None)] = posicion
+
+    def _buscar_posicion(self, nombre, piso):
+        if not nombre:
+            return None
+        return self._posiciones.get((str(nombre).lower(), str(piso).lower() if piso else None))
+
+    def _resolver_servicios(self, nombres):
+        faltantes = {str(n) for n in nombres} - set(self._servicios)
+        if not faltantes:
+            return
+        for servicio in Servicios.objects.filter(nombre__in=faltantes).order_by('-id'):
+            self._servicios[servicio.nombre] = servicio
+
+        nuevos = [
+            Servicios(nombre=nombre, codigo_analitico=f'SERV-{nombre[:3].upper()}')
+            for nombre in faltantes if nombre not in self._servicios
+        ]
+        if nuevos:
+            Servicios.objects.bulk_create(nuevos, ignore_conflicts=True)
+            for servicio in Servicios.objects.filter(nombre__in=[s.nombre for s in nuevos]):
+                self._servicios.setdefault(servicio.nombre, servicio)
+
+    def _validar_longitudes(self, datos):
+        for campo, valor in datos.items():
+            max_length = Dispositivo._meta.get_field(campo).max_length
+            if valor is not None and max_length and len(str(valor)) > max_length:
+                raise ValueError(f"El campo '{campo}' supera los {max_length} caracteres")
+
+    def _snapshot(self, dispositivo):
+        return {f.name: getattr(dispositivo, f.name) for f in Dispositivo._meta.fields}
+
+    def _diferencias(self, anterior, dispositivo):
+        cambios = {}
+        for nombre, valor_anterior in anterior.items():
+            valor_nuevo = getattr(dispositivo, nombre)
+            if valor_anterior != valor_nuevo:
+                cambios[nombre] = {"antes": str(valor_anterior), "despues": str(valor_nuevo)}
+        return cambios
+
+    def _sede_nombre(self, dispositivo):
+        return self.sede.nombre if dispositivo.posicion_id else None
+
+    def _historial_creacion(self, dispositivo):
+        cambios = {
+            f.name: {"antes": None, "despues": str(getattr(dispositivo, f.name))}
+            for f in Dispositivo._meta.fields
+        }
+        return Historial(
+            dispositivo=dispositivo,
+            usuario=self.usuario,
+            cambios=cambios,
+            tipo_cambio=Historial.TipoCambio.CREACION,
+            modelo_afectado="Dispositivo",
+            instancia_id=dispositivo.id,
+            sede_nombre=self._sede_nombre(dispositivo)
+        )
+
+    def _historial_modificacion(self, dispositivo, cambios):
+        return Historial(
+            dispositivo=dispositivo,
+            usuario=self.usuario,
+            cambios=cambios,
+            tipo_cambio=Historial.TipoCambio.MODIFICACION,
+            modelo_afectado="Dispositivo",
+            instancia_id=dispositivo.id,
+            sede_nombre=self._sede_nombre(dispositivo)
+        )
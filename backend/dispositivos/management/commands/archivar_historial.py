@@ -0,0 +1,56 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from dispositivos.particiones import (
+    archivar_particion, desprender_particion, eliminar_particion, es_particionada,
+    inicio_mes, particiones, particiones_desprendidas, sumar_meses
+)
+
+class Command(BaseCommand):
+    help = "Archiva en CSV comprimido las particiones del historial más antiguas que la retención y luego las desprende"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses', type=int, default=getattr(settings, 'HISTORIAL_MESES_RETENCION', 24),
+            help="Meses completos de historial que se conservan en la base"
+        )
+        parser.add_argument(
+            '--directorio', default=str(getattr(settings, 'HISTORIAL_DIRECTORIO_ARCHIVO', 'archivo_historial')),
+            help="Carpeta donde se guardan los archivos .csv.gz"
+        )
+        parser.add_argument('--conservar-tablas', action='store_true', help="No borrar las tablas ya archivadas")
+        parser.add_argument('--simular', action='store_true', help="Solo mostrar qué particiones se archivarían")
+
+    def handle(self, *args, **options):
+        if not es_particionada(connection):
+            raise CommandError("La tabla de historial no está particionada (requiere PostgreSQL y la migración 0007)")
+
+        corte = sumar_meses(inicio_mes(timezone.now().date()), -options['meses'])
+        vencidas = [nombre for nombre, _, hasta in particiones() if hasta <= corte]
+        # Desprendidas en una ejecución anterior que no llegó a archivarlas o borrarlas
+        pendientes = [
+            nombre for nombre in particiones_desprendidas()
+            if not options['conservar_tablas'] or not os.path.exists(self._ruta(options, nombre))
+        ]
+        if not vencidas and not pendientes:
+            self.stdout.write(f"No hay particiones anteriores a {corte}")
+            return
+
+        for nombre in pendientes + vencidas:
+            if options['simular']:
+                self.stdout.write(f"Se archivaría {nombre}")
+                continue
+            # Primero el volcado: si falla, la partición sigue adjunta y se reintenta en la próxima ejecución
+            ruta = archivar_particion(nombre, options['directorio'])
+            if nombre in vencidas:
+                desprender_particion(nombre)
+            if not options['conservar_tablas']:
+                eliminar_particion(nombre)
+            self.stdout.write(f"{nombre} archivada en {ruta}")
+
+        self.stdout.write(self.style.SUCCESS(f"Historial anterior a {corte} archivado"))
+
+    def _ruta(self, options, nombre):
+        return os.path.join(options['directorio'], f'{nombre}.csv.gz')
@@ -0,0 +1,129 @@
+import io
+import tempfile
+from pathlib import Path
+import pandas as pd
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from dispositivos.benchmarks import (
+    cargar_linea_base, comparar, escenarios_endpoints, guardar_linea_base, medir
+)
+from dispositivos.models import Dispositivo, RolUser, Sede
+
+LINEA_BASE = Path(settings.BASE_DIR) / 'benchmarks' / 'linea_base.json'
+
+
+def archivos_importacion(sede, cantidad):
+    """Dos Excel con los mismos dispositivos de la sede y observaciones distintas."""
+    filas = list(
+        Dispositivo.objects.filter(sede=sede).exclude(serial__isnull=True)
+        .values('tipo', 'marca', 'modelo', 'serial', 'estado')[:cantidad]
+    )
+    archivos = []
+    for version in ('A', 'B'):
+        df = pd.DataFrame([{
+            'TIPO_DISPOSITIVO': f['tipo'],
+            'FABRICANTE': f['marca'],
+            'MODELO': f['modelo'],
+            'SERIAL': f['serial'],
+            'ESTADO': f['estado'],
+            'OBSERVACION': f'Benchmark {version}',
+        } for f in filas])
+        salida = io.BytesIO()
+        df.to_excel(salida, index=False, engine='openpyxl')
+        archivos.append(salida.getvalue())
+    return archivos
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide latencia, consultas y memoria de los endpoints principales sobre un inventario "
+        "generado en una base de pruebas y los compara con la línea base"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dispositivos', type=int, default=5000, help="Tamaño del inventario generado")
+        parser.add_argument('--iteraciones', type=int, default=20)
+        parser.add_argument('--calentamiento', type=int, default=2)
+        parser.add_argument('--filas-importacion', type=int, default=200, help="Filas de cada Excel importado")
+        parser.add_argument('--escenario', action='append', help="Solo los escenarios indicados (repetible)")
+        parser.add_argument('--linea-base', default=str(LINEA_BASE))
+        parser.add_argument('--umbral', type=float, default=0.2, help="Empeoramiento relativo tolerado (0.2 = 20%%)")
+        parser.add_argument('--guardar', action='store_true', help="Guarda los resultados como nueva línea base")
+
+    def handle(self, *args, **options):
+        ruta = Path(options['linea_base'])
+        linea_base = None
+        if not options['guardar']:
+            if ruta.exists():
+                linea_base = cargar_linea_base(ruta)
+            else:
+                self.stdout.write(self.style.WARNING(f"No existe línea base en {ruta}; solo se mostrarán los resultados"))
+
+        # Base de pruebas aislada (como manage.py test) para no tocar los datos reales
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        bases = runner.setup_databases()
+        try:
+            with tempfile.TemporaryDirectory() as media, override_settings(
+                CACHES={
+                    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                    'sesiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                },
+                MEDIA_ROOT=media,
+                IMPORTACION_EN_SEGUNDO_PLANO=False,
+                HISTORIAL_EN_SEGUNDO_PLANO=False,
+                PERFILADO_CONSULTAS=False,
+            ):
+                resultados = self._medir(options)
+        finally:
+            runner.teardown_databases(bases)
+            teardown_test_environment()
+
+        parametros = {k: options[k] for k in ('dispositivos', 'iteraciones', 'calentamiento', 'filas_importacion')}
+        if options['guardar']:
+            guardar_linea_base(ruta, resultados, parametros)
+            self.stdout.write(self.style.SUCCESS(f"Línea base guardada en {ruta}"))
+            return
+        if linea_base is None:
+            return
+
+        if linea_base.get('parametros') != parametros:
+            self.stdout.write(self.style.WARNING(
+                f"Parámetros distintos a los de la línea base: {linea_base.get('parametros')}"
+            ))
+        regresiones = comparar(resultados, linea_base, options['umbral'])
+        if regresiones:
+            raise CommandError("Regresiones respecto a la línea base:\n  " + "\n  ".join(regresiones))
+        self.stdout.write(self.style.SUCCESS("Sin regresiones respecto a la línea base"))
+
+    def _medir(self, options):
+        call_command('generate_inventory', dispositivos=options['dispositivos'], stdout=io.StringIO())
+        sede = Sede.objects.order_by('id').first()
+        usuario = RolUser.objects.create_user(
+            username='benchmark', email='benchmark@test.com', password='clave-benchmark-1', rol='admin'
+        )
+        cliente = APIClient()
+        cliente.force_authenticate(usuario)
+
+        escenarios = escenarios_endpoints(sede.id, archivos_importacion(sede, options['filas_importacion']))
+        if options['escenario']:
+            desconocidos = set(options['escenario']) - {e.nombre for e in escenarios}
+            if desconocidos:
+                raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+            escenarios = [e for e in escenarios if e.nombre in options['escenario']]
+
+        resultados = {}
+        self.stdout.write(f"{'escenario':<20}{'p50':>9}{'p95':>9}{'p99':>9}{'consultas':>11}{'memoria KB':>12}")
+        for escenario in escenarios:
+            r = resultados[escenario.nombre] = medir(
+                cliente, escenario, options['iteraciones'], options['calentamiento']
+            )
+            self.stdout.write(
+                f"{escenario.nombre:<20}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}"
+                f"{r['consultas']:>11}{r['memoria_pico_kb']:>12}"
+            )
+        return resultados
@@ -0,0 +1,277 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from dispositivos.models import (
+    AsignacionDispositivo, CeldaPosicion, Dispositivo, Historial, Movimiento, Posicion, RolUser,
+    Sede, Servicios, UsuarioExterno
+)
+from dispositivos.particiones import crear_particiones, es_particionada
+from dispositivos.estadisticas import invalidar_dashboard, recalcular_estadisticas
+from dispositivos.cache import POSICIONES, SEDES, SERVICIOS, invalidar
+
+MARCAS = {
+    'HP': ['PRODESK 400', 'ELITEBOOK 840', 'E24 G4', 'PRODISPLAY P201'],
+    'DELL': ['OPTIPLEX 7090', 'LATITUDE 5420', 'P2419H'],
+    'LENOVO': ['THINKCENTRE M70', 'THINKPAD T14', 'THINKVISION T24'],
+    'APPLE': ['IPAD 9', 'MACBOOK AIR M1'],
+    'SAMSUNG': ['GALAXY A54', 'GALAXY TAB S6'],
+}
+COLORES = ['#F94144', '#F3722C', '#F8961E', '#F9C74F', '#90BE6D', '#43AA8B', '#577590', '#277DA1']
+COLUMNAS_POR_FILA = 20
+
+
+def letra_columna(indice):
+    """0 -> A, 25 -> Z, 26 -> AA..."""
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord('A') + resto) + letras
+    return letras
+
+
+@contextmanager
+def fechas_manuales(*campos):
+    """Permite fijar campos auto_now_add en bulk_create para repartir las fechas en el tiempo."""
+    for campo in campos:
+        campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo in campos:
+            campo.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = "Genera un inventario sintético (sedes, posiciones, dispositivos, movimientos e historial) para pruebas de volumen"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sedes', type=int, default=3)
+        parser.add_argument('--pisos', type=int, default=3, help=f"Pisos por sede (máximo {len(Posicion.PISOS)})")
+        parser.add_argument('--posiciones', type=int, default=200, help="Posiciones por piso")
+        parser.add_argument('--servicios', type=int, default=10, help="Servicios por sede")
+        parser.add_argument('--dispositivos', type=int, default=10000)
+        parser.add_argument('--movimientos', type=float, default=2, help="Movimientos promedio por dispositivo")
+        parser.add_argument('--historial', type=float, default=3, help="Eventos de historial promedio por dispositivo")
+        parser.add_argument('--asignaciones', type=float, default=0.2, help="Fracción de los dispositivos sin posición asignados a usuarios externos")
+        parser.add_argument('--ocupacion', type=float, default=0.7, help="Fracción de dispositivos ubicados en una posición")
+        parser.add_argument('--dias', type=int, default=365, help="Días hacia atrás en los que se reparten las fechas")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--lote', type=int, default=5000, help="Dispositivos por transacción")
+        parser.add_argument('--prefijo', default='GEN', help="Prefijo de nombres y seriales generados")
+
+    def handle(self, *args, **options):
+        if not 1 <= options['pisos'] <= len(Posicion.PISOS):
+            raise CommandError(f"--pisos debe estar entre 1 y {len(Posicion.PISOS)}")
+        self.prefijo = options['prefijo']
+        if Sede.objects.filter(nombre__startswith=f'{self.prefijo} ').exists():
+            raise CommandError(f"Ya hay datos generados con el prefijo '{self.prefijo}'; use otro --prefijo")
+
+        self.rng = random.Random(options['seed'])
+        self.ahora = timezone.now()
+        self.dias = options['dias']
+        self.lote = options['lote']
+        inicio = time.monotonic()
+
+        if es_particionada(connection):
+            crear_particiones((self.ahora - timedelta(days=self.dias)).date(), self.ahora.date())
+
+        with transaction.atomic():
+            sedes = self.crear_sedes(options['sedes'])
+            servicios = self.crear_servicios(sedes, options['servicios'])
+            posiciones = self.construir_posiciones(sedes, servicios, options['pisos'], options['posiciones'])
+            lugares = self.repartir_lugares(posiciones, int(options['dispositivos'] * options['ocupacion']))
+            Posicion.objects.bulk_create(posiciones, batch_size=self.lote)
+            CeldaPosicion.objects.bulk_create([
+                CeldaPosicion(sede_id=p.sede_id, piso=p.piso, fila=fila, columna=columna, posicion=p)
+                for p in posiciones for fila, columna in p.celdas()
+            ], batch_size=self.lote)
+        self.stdout.write(f"{len(sedes)} sedes, {len(posiciones)} posiciones")
+
+        self.crear_dispositivos(sedes, posiciones, lugares, options)
+
+        recalcular_estadisticas()
+        invalidar(SEDES, SERVICIOS, POSICIONES)
+        invalidar_dashboard()
+        self.stdout.write(self.style.SUCCESS(f"Inventario generado en {time.monotonic() - inicio:.1f} s"))
+
+    def fecha(self):
+        return self.ahora - timedelta(seconds=self.rng.randrange(self.dias * 86400))
+
+    def crear_sedes(self, cantidad):
+        return Sede.objects.bulk_create([
+            Sede(nombre=f'{self.prefijo} Sede {n}', ciudad=f'Ciudad {n}', direccion=f'Calle {n}')
+            for n in range(1, cantidad + 1)
+        ])
+
+    def crear_servicios(self, sedes, por_sede):
+        servicios = Servicios.objects.bulk_create([
+            Servicios(
+                nombre=f'{self.prefijo} Servicio {sede.pk}-{n}',
+                codigo_analitico=f'{self.prefijo}-{sede.pk}-{n}',
+                color=self.rng.choice(COLORES),
+            )
+            for sede in sedes for n in range(1, por_sede + 1)
+        ])
+        Servicios.sedes.through.objects.bulk_create([
+            Servicios.sedes.through(servicios_id=servicio.pk, sede_id=sedes[i // por_sede].pk)
+            for i, servicio in enumerate(servicios)
+        ])
+        return {sede.pk: servicios[i * por_sede:(i + 1) * por_sede] for i, sede in enumerate(sedes)}
+
+    def construir_posiciones(self, sedes, servicios, pisos, por_piso):
+        posiciones = []
+        for sede in sedes:
+            for piso, _ in Posicion.PISOS[:pisos]:
+                ocupadas = set()
+                indice = creadas = 0
+                while creadas < por_piso:
+                    fila, columna = divmod(indice, COLUMNAS_POR_FILA)
+                    indice += 1
+                    if (fila + 1, letra_columna(columna)) in ocupadas:
+                        continue
+                    combinadas = []
+                    # Una de cada diez posiciones ocupa también la celda de la derecha
+                    if columna + 1 < COLUMNAS_POR_FILA and self.rng.random() < 0.1:
+                        combinadas = [{'row': fila + 1, 'col': letra_columna(columna + 1)}]
+                    servicio = self.rng.choice(servicios[sede.pk]) if servicios[sede.pk] else None
+                    posicion = Posicion(
+                        nombre=f'{piso}-{letra_columna(columna)}{fila + 1}', fila=fila + 1,
+                        columna=letra_columna(columna), piso=piso, sede_id=sede.pk,
+                        servicio=servicio, color=servicio.color if servicio else '#FFFFFF',
+                        mergedCells=combinadas,
+                    )
+                    ocupadas.update(posicion.celdas())
+                    posiciones.append(posicion)
+                    creadas += 1
+        return posiciones
+
+    def repartir_lugares(self, posiciones, ubicados):
+        """Posición de cada uno de los primeros `ubicados` dispositivos, con la ocupación ya contada."""
+        lugares = [p for p in posiciones for _ in range(Posicion.MAX_DISPOSITIVOS)]
+        self.rng.shuffle(lugares)
+        lugares = lugares[:ubicados]
+        for posicion in lugares:
+            posicion.ocupacion += 1
+        return lugares
+
+    def crear_dispositivos(self, sedes, posiciones, lugares, options):
+        total = options['dispositivos']
+        por_sede = {}
+        for posicion in posiciones:
+            por_sede.setdefault(posicion.sede_id, []).append(posicion)
+        nombres_sede = {sede.pk: sede.nombre for sede in sedes}
+        usuarios = list(RolUser.objects.values_list('pk', flat=True)[:50]) or [None]
+
+        creados = 0
+        while creados < total:
+            cantidad = min(self.lote, total - creados)
+            with transaction.atomic(), fechas_manuales(
+                Movimiento._meta.get_field('fecha_movimiento'),
+                AsignacionDispositivo._meta.get_field('fecha_asignacion'),
+            ):
+                dispositivos = self.lote_dispositivos(creados, cantidad, sedes, lugares, options['asignaciones'])
+                Dispositivo.objects.bulk_create(dispositivos, batch_size=self.lote)
+                Movimiento.objects.bulk_create(
+                    self.lote_movimientos(dispositivos, por_sede, usuarios, options['movimientos']),
+                    batch_size=self.lote
+                )
+                Historial.objects.bulk_create(
+                    self.lote_historial(dispositivos, nombres_sede, usuarios, options['historial']),
+                    batch_size=self.lote
+                )
+                self.lote_asignaciones(dispositivos, usuarios)
+            creados += cantidad
+            self.stdout.write(f"{creados}/{total} dispositivos")
+
+    def lote_dispositivos(self, desde, cantidad, sedes, lugares, asignados):
+        dispositivos = []
+        for n in range(desde, desde + cantidad):
+            posicion = lugares[n] if n < len(lugares) else None
+            marca = self.rng.choice(list(MARCAS))
+            estado = self.rng.choices(['BUENO', 'REPARAR', 'MALO', 'BODEGA', 'PERDIDO_ROBADO'], [80, 6, 5, 8, 1])[0]
+            dispositivos.append(Dispositivo(
+                tipo=self.rng.choice(Dispositivo.TIPOS_DISPOSITIVOS)[0],
+                estado=estado,
+                estado_uso='EN_USO' if posicion and estado == 'BUENO' else self.rng.choice(['DISPONIBLE', 'INHABILITADO']),
+                marca=marca,
+                modelo=self.rng.choice(MARCAS[marca]),
+                serial=f'{self.prefijo}{n:09d}',
+                placa_cu=f'CU-{self.prefijo}{n:09d}',
+                sede_id=posicion.sede_id if posicion else self.rng.choice(sedes).pk,
+                posicion=posicion,
+                piso=posicion.piso if posicion else None,
+                estado_propiedad=self.rng.choice(Dispositivo.ESTADOS_PROPIEDAD)[0],
+                # Los que no tienen posición pueden estar asignados a un usuario externo
+                ubicacion='SEDE' if posicion or self.rng.random() >= asignados else self.rng.choice(['CASA', 'CLIENTE']),
+                sistema_operativo=self.rng.choice(['WINDOWS 10', 'WINDOWS 11', 'MACOS', 'ANDROID']),
+                procesador=self.rng.choice(['I5', 'I7', 'RYZEN 5', 'M1']),
+                capacidad_memoria_ram=self.rng.choice(['8GB', '16GB', '32GB']),
+                capacidad_disco_duro=self.rng.choice(['256GB', '512GB', '1TB']),
+            ))
+        return dispositivos
+
+    def cantidad(self, promedio):
+        # Entre 0 y el doble del promedio, con el promedio pedido
+        return self.rng.randint(0, max(0, round(2 * promedio)))
+
+    def lote_movimientos(self, dispositivos, por_sede, usuarios, promedio):
+        movimientos = []
+        for dispositivo in dispositivos:
+            candidatas = por_sede.get(dispositivo.sede_id)
+            if not candidatas:
+                continue
+            pasos = self.cantidad(promedio)
+            # Recorrido que termina en la posición actual del dispositivo
+            recorrido = [self.rng.choice(candidatas) for _ in range(pasos)]
+            if recorrido and dispositivo.posicion:
+                recorrido[-1] = dispositivo.posicion
+            fechas = sorted(self.fecha() for _ in recorrido)
+            origen = None
+            for destino, fecha in zip(recorrido, fechas):
+                movimientos.append(Movimiento(
+                    dispositivo=dispositivo, posicion_origen=origen, posicion_destino=destino,
+                    encargado_id=self.rng.choice(usuarios), sede_id=dispositivo.sede_id,
+                    observacion="Movimiento generado", confirmado=True,
+                    fecha_movimiento=fecha, fecha_confirmacion=fecha,
+                ))
+                origen = destino
+        return movimientos
+
+    def lote_historial(self, dispositivos, nombres_sede, usuarios, promedio):
+        tipos = [Historial.TipoCambio.MODIFICACION, Historial.TipoCambio.MOVIMIENTO, Historial.TipoCambio.OTRO]
+        eventos = []
+        for dispositivo in dispositivos:
+            fechas = sorted(self.fecha() for _ in range(self.cantidad(promedio) + 1))
+            for i, fecha in enumerate(fechas):
+                tipo = Historial.TipoCambio.CREACION if i == 0 else self.rng.choice(tipos)
+                eventos.append(Historial(
+                    dispositivo=dispositivo, usuario_id=self.rng.choice(usuarios), fecha_modificacion=fecha,
+                    tipo_cambio=tipo, modelo_afectado='Dispositivo', instancia_id=dispositivo.pk,
+                    sede_nombre=nombres_sede.get(dispositivo.sede_id),
+                    cambios={'estado': dispositivo.estado} if tipo != Historial.TipoCambio.CREACION else None,
+                ))
+        return eventos
+
+    def lote_asignaciones(self, dispositivos, usuarios):
+        elegidos = [d for d in dispositivos if d.ubicacion in ('CASA', 'CLIENTE')]
+        if not elegidos:
+            return
+        externos = UsuarioExterno.objects.bulk_create([
+            UsuarioExterno(
+                documento=f'{self.prefijo}{dispositivo.pk:012d}', nombre_completo=f'Usuario externo {dispositivo.pk}',
+                cargo=self.rng.choice(['Asesor', 'Supervisor', 'Analista']), empresa='Cliente',
+            )
+            for dispositivo in elegidos
+        ], batch_size=self.lote)
+        AsignacionDispositivo.objects.bulk_create([
+            AsignacionDispositivo(
+                usuario=externo, dispositivo=dispositivo, ubicacion_asignada=dispositivo.ubicacion,
+                asignado_por_id=self.rng.choice(usuarios), fecha_asignacion=self.fecha(),
+            )
+            for externo, dispositivo in zip(externos, elegidos)
+        ], batch_size=self.lote)
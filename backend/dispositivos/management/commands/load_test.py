@@ -0,0 +1,83 @@
+import json
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from dispositivos.carga import PESOS_RECORRIDOS, RECORRIDOS_ESCRITURA, ErrorCarga, ejecutar_carga, pesos_por_defecto
+
+
+def leer_pesos(valores, permitir_escrituras=False):
+    """['tablero=5', 'traslado=0'] -> pesos por defecto con esos cambios."""
+    pesos = pesos_por_defecto(permitir_escrituras)
+    for valor in valores or []:
+        nombre, _, peso = valor.partition('=')
+        if nombre not in PESOS_RECORRIDOS:
+            raise CommandError(f"Recorrido desconocido: {nombre} (opciones: {', '.join(PESOS_RECORRIDOS)})")
+        try:
+            pesos[nombre] = int(peso)
+        except ValueError:
+            raise CommandError(f"Peso no válido para {nombre}: {peso}")
+    return pesos
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga contra un servidor en marcha: usuarios virtuales concurrentes que repiten "
+        "recorridos de coordinadores y celadores y reportan rendimiento, latencias y errores por endpoint. "
+        f"Los recorridos {', '.join(sorted(RECORRIDOS_ESCRITURA))} modifican datos y solo se ejecutan "
+        "con --permitir-escrituras"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="URL base del servidor")
+        parser.add_argument('--usuario', required=True, help="Usuario con el que inician sesión los usuarios virtuales")
+        parser.add_argument('--clave', required=True)
+        parser.add_argument('--sede', type=int, help="Sede de la sesión (obligatoria para coordinadores)")
+        parser.add_argument('--usuarios', type=int, default=10, help="Usuarios virtuales concurrentes")
+        parser.add_argument('--duracion', type=int, default=60, help="Segundos de prueba")
+        parser.add_argument('--rampa', type=int, default=0, help="Segundos en los que se reparten los arranques")
+        parser.add_argument('--pausa', type=float, default=1.0, help="Pausa media entre recorridos (0 = sin pausa)")
+        parser.add_argument('--sesion', type=int, default=20, help="Recorridos por sesión antes de volver a iniciar sesión")
+        parser.add_argument('--timeout', type=int, default=30)
+        parser.add_argument(
+            '--peso', action='append', metavar='RECORRIDO=N',
+            help=f"Peso de un recorrido (repetible). Por defecto: {pesos_por_defecto()}"
+        )
+        parser.add_argument(
+            '--permitir-escrituras', action='store_true',
+            help="Ejecuta también los recorridos que mueven dispositivos y registran movimientos "
+                 "(usar solo contra una base de pruebas)"
+        )
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--json', help="Guarda el resumen en este archivo")
+
+    def handle(self, *args, **options):
+        try:
+            resumen = ejecutar_carga(
+                options['url'], options['usuario'], options['clave'], sede_id=options['sede'],
+                usuarios=options['usuarios'], duracion=options['duracion'], rampa=options['rampa'],
+                pesos=leer_pesos(options['peso'], options['permitir_escrituras']), pausa=options['pausa'],
+                sesion=options['sesion'], timeout=options['timeout'], semilla=options['seed'],
+                permitir_escrituras=options['permitir_escrituras'],
+            )
+        except ErrorCarga as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{'endpoint':<52}{'peticiones':>11}{'rps':>8}{'p50':>8}{'p95':>8}{'p99':>8}"
+            f"{'4xx':>6}{'errores':>9}{'% err':>7}"
+        )
+        for fila in resumen['endpoints'] + ([resumen['total']] if resumen['total'] else []):
+            self.stdout.write(
+                f"{fila['endpoint']:<52}{fila['peticiones']:>11}{fila['rps']:>8}{fila['p50_ms']:>8}"
+                f"{fila['p95_ms']:>8}{fila['p99_ms']:>8}{fila['rechazos']:>6}{fila['errores']:>9}"
+                f"{fila['errores_pct']:>7}"
+            )
+        self.stdout.write(
+            f"{options['usuarios']} usuarios virtuales, {resumen['duracion_s']} s, "
+            f"máximo de peticiones simultáneas: {resumen['concurrencia_maxima']}"
+        )
+
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(resumen, indent=2, ensure_ascii=False), encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f"Resumen guardado en {options['json']}"))
+        if resumen['total'] and resumen['total']['errores']:
+            self.stdout.write(self.style.WARNING(f"{resumen['total']['errores']} peticiones con error"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from dispositivos.particiones import crear_particiones, es_particionada, sumar_meses
+
+class Command(BaseCommand):
+    help = "Crea por adelantado las particiones mensuales del historial (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, default=3, help="Meses futuros a preparar (por defecto 3)")
+
+    def handle(self, *args, **options):
+        if not es_particionada(connection):
+            raise CommandError("La tabla de historial no está particionada (requiere PostgreSQL y la migración 0007)")
+
+        hoy = timezone.now().date()
+        creadas = crear_particiones(hoy, sumar_meses(hoy, options['meses']))
+        for nombre in creadas:
+            self.stdout.write(f"Partición creada: {nombre}")
+        self.stdout.write(self.style.SUCCESS(f"{len(creadas)} particiones nuevas"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from dispositivos.estadisticas import recalcular_estadisticas
+from dispositivos.models import EstadisticaDispositivos, EstadisticaMovimientos
+
+class Command(BaseCommand):
+    help = "Reconstruye las tablas de contadores de dispositivos y movimientos por sede"
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write("Recalculando estadísticas...\n")
+        recalcular_estadisticas()
+        self.stdout.write(self.style.SUCCESS(
+            f"Estadísticas recalculadas: {EstadisticaDispositivos.objects.count()} grupos de dispositivos, "
+            f"{EstadisticaMovimientos.objects.count()} días de movimientos"
+        ))
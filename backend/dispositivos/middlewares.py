@@ -1,10 +1,79 @@
+import logging
+import time
+from contextlib import ExitStack
+from django.conf import settings
 from django.contrib.auth import logout
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.utils.deprecation import MiddlewareMixin
+from .perfilado import RegistroConsultas, estadisticas, nombre_endpoint
+
+logger = logging.getLogger(__name__)
 
 class AutoLogoutMiddleware(MiddlewareMixin):
     """
     Middleware para cerrar sesión si el usuario está desactivado.
+    Las peticiones con JWT no usan la sesión (la vigencia del usuario la
+    comprueba la autenticación), así que no se carga sesión ni usuario.
     """
     def process_request(self, request):
+        if request.headers.get('Authorization', '').startswith('Bearer '):
+            return
         if request.user.is_authenticated and not request.user.is_active:
             logout(request)
+
+
+class PerfilConsultasMiddleware:
+    """
+    Mide consultas, tiempo de base de datos y de renderizado de cada petición.
+    Solo está activo con PERFILADO_CONSULTAS = True.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFILADO_CONSULTAS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.umbral_duplicadas = getattr(settings, 'PERFILADO_UMBRAL_DUPLICADAS', 10)
+
+    def __call__(self, request):
+        registro = RegistroConsultas()
+        request._perfil_render = 0.0
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(registro))
+            response = self.get_response(request)
+        total = time.perf_counter() - inicio
+
+        duplicadas = registro.duplicadas()
+        repetidas = sum(duplicadas.values()) - len(duplicadas)
+        render = request._perfil_render
+        response['X-Query-Count'] = str(registro.total)
+        response['X-Query-Duplicates'] = str(repetidas)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={registro.duracion * 1000:.1f};desc="{registro.total} consultas"',
+            f'render;dur={render * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+        endpoint = nombre_endpoint(request)
+        estadisticas.registrar(endpoint, {
+            'consultas': registro.total,
+            'db_ms': registro.duracion * 1000,
+            'render_ms': render * 1000,
+            'total_ms': total * 1000,
+            'duplicadas': duplicadas,
+        })
+        if repetidas >= self.umbral_duplicadas:
+            sql, veces = max(duplicadas.items(), key=lambda d: d[1])
+            logger.warning(f"Posible N+1 en {endpoint}: {veces} veces {sql[:200]}")
+        return response
+
+    def process_template_response(self, request, response):
+        # El renderizado (JSONRenderer de DRF) ocurre después de la vista
+        inicio = time.perf_counter()
+
+        def medir(_):
+            request._perfil_render += time.perf_counter() - inicio
+        response.add_post_render_callback(medir)
+        return response
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.5 on 2026-10-18 18:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def poblar_estadisticas(apps, schema_editor):
+    Dispositivo = apps.get_model('dispositivos', 'Dispositivo')
+    Movimiento = apps.get_model('dispositivos', 'Movimiento')
+    EstadisticaDispositivos = apps.get_model('dispositivos', 'EstadisticaDispositivos')
+    EstadisticaMovimientos = apps.get_model('dispositivos', 'EstadisticaMovimientos')
+
+    EstadisticaDispositivos.objects.bulk_create([
+        EstadisticaDispositivos(**fila) for fila in
+        Dispositivo.objects.order_by().values('sede_id', 'tipo', 'estado', 'estado_uso')
+        .annotate(total=Count('id'))
+    ], batch_size=1000)
+    EstadisticaMovimientos.objects.bulk_create([
+        EstadisticaMovimientos(**fila) for fila in
+        Movimiento.objects.order_by().annotate(fecha=TruncDate('fecha_movimiento'))
+        .values('sede_id', 'fecha').annotate(total=Count('id'))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0005_trabajoimportacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaDispositivos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=20)),
+                ('estado', models.CharField(blank=True, max_length=18, null=True)),
+                ('estado_uso', models.CharField(blank=True, max_length=100, null=True)),
+                ('total', models.IntegerField(default=0)),
+                ('sede', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas_dispositivos', to='dispositivos.sede')),
+            ],
+            options={
+                'verbose_name': 'Estadística de dispositivos',
+                'verbose_name_plural': 'Estadísticas de dispositivos',
+                'constraints': [models.UniqueConstraint(fields=('sede', 'tipo', 'estado', 'estado_uso'), name='unique_estadistica_dispositivos', nulls_distinct=False)],
+            },
+        ),
+        migrations.CreateModel(
+            name='EstadisticaMovimientos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('total', models.IntegerField(default=0)),
+                ('sede', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas_movimientos', to='dispositivos.sede')),
+            ],
+            options={
+                'verbose_name': 'Estadística de movimientos',
+                'verbose_name_plural': 'Estadísticas de movimientos',
+                'constraints': [models.UniqueConstraint(fields=('sede', 'fecha'), name='unique_estadistica_movimientos', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunPython(poblar_estadisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:00
+
+from django.db import migrations, models
+from django.utils import timezone
+from dispositivos.particiones import (
+    TABLA, crear_particion_defecto, crear_particiones, es_particionada, sumar_meses
+)
+
+MESES_ADELANTE = 3
+
+
+def _indices_y_claves(cursor, tabla):
+    # Índices no únicos y claves foráneas para recrearlos sobre la tabla nueva
+    cursor.execute(
+        "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND schemaname = current_schema()",
+        [tabla]
+    )
+    indices = [fila[0] for fila in cursor.fetchall() if ' UNIQUE ' not in fila[0]]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [tabla]
+    )
+    return indices, cursor.fetchall()
+
+
+def _copiar_tabla(cursor, origen, claves_primarias, indices, claves_foraneas):
+    cursor.execute(f'INSERT INTO {TABLA} SELECT * FROM {origen}')
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLA}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {TABLA}"
+    )
+    cursor.execute(f'DROP TABLE {origen}')
+    cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {TABLA}_pkey PRIMARY KEY ({claves_primarias})')
+    for indice in indices:
+        cursor.execute(indice)
+    for nombre, definicion in claves_foraneas:
+        cursor.execute(f'ALTER TABLE {TABLA} ADD CONSTRAINT {nombre} {definicion}')
+
+
+def particionar_historial(apps, schema_editor):
+    conexion = schema_editor.connection
+    if conexion.vendor != 'postgresql' or es_particionada(conexion):
+        return
+
+    with conexion.cursor() as cursor:
+        indices, claves_foraneas = _indices_y_claves(cursor, TABLA)
+        cursor.execute(f'SELECT MIN(fecha_modificacion) FROM {TABLA}')
+        primera = cursor.fetchone()[0]
+
+        cursor.execute(f'ALTER TABLE {TABLA} RENAME TO {TABLA}_anterior')
+        cursor.execute(
+            f'CREATE TABLE {TABLA} (LIKE {TABLA}_anterior INCLUDING DEFAULTS INCLUDING IDENTITY) '
+            f'PARTITION BY RANGE (fecha_modificacion)'
+        )
+
+    crear_particion_defecto(conexion)
+    hoy = timezone.now().date()
+    crear_particiones(primera.date() if primera else hoy, sumar_meses(hoy, MESES_ADELANTE), conexion)
+
+    with conexion.cursor() as cursor:
+        # La clave primaria de una tabla particionada debe incluir la columna de partición
+        _copiar_tabla(cursor, f'{TABLA}_anterior', 'id, fecha_modificacion', indices, claves_foraneas)
+
+
+def desparticionar_historial(apps, schema_editor):
+    conexion = schema_editor.connection
+    if conexion.vendor != 'postgresql' or not es_particionada(conexion):
+        return
+
+    with conexion.cursor() as cursor:
+        indices, claves_foraneas = _indices_y_claves(cursor, TABLA)
+        cursor.execute(f'ALTER TABLE {TABLA} RENAME TO {TABLA}_particionada')
+        cursor.execute(f'CREATE TABLE {TABLA} (LIKE {TABLA}_particionada INCLUDING DEFAULTS INCLUDING IDENTITY)')
+        _copiar_tabla(cursor, f'{TABLA}_particionada', 'id', indices, claves_foraneas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0006_estadisticas'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar_historial, desparticionar_historial),
+        migrations.AddIndex(
+            model_name='historial',
+            index=models.Index(fields=['-fecha_modificacion'], name='dispositivo_fecha_m_38cb63_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historial',
+            index=models.Index(fields=['tipo_cambio', '-fecha_modificacion'], name='dispositivo_tipo_ca_033c84_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historial',
+            index=models.Index(fields=['dispositivo', '-fecha_modificacion'], name='dispositivo_disposi_09c2d2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historial',
+            index=models.Index(fields=['usuario', 'tipo_cambio', '-fecha_modificacion'], name='dispositivo_usuario_0c7609_idx'),
+        ),
+    ]
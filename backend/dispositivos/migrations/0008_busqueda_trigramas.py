@@ -0,0 +1,38 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+CAMPOS_BUSQUEDA = ('serial', 'placa_cu', 'marca', 'modelo', 'observaciones')
+
+
+def _nombre_indice(campo):
+    return f'dispositivo_{campo}_trgm_idx'
+
+
+def crear_indices(apps, schema_editor):
+    # Índices sobre UPPER(campo): la expresión que Django usa en icontains/istartswith
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for campo in CAMPOS_BUSQUEDA:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {_nombre_indice(campo)} '
+            f'ON dispositivos_dispositivo USING gin (UPPER({campo}) gin_trgm_ops)'
+        )
+
+
+def eliminar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for campo in CAMPOS_BUSQUEDA:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {_nombre_indice(campo)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0007_historial_particionado'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
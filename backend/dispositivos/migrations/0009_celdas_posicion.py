@@ -0,0 +1,61 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _celdas(fila, columna, celdas_combinadas):
+    celdas = set()
+    for celda in [{'row': fila, 'col': columna}, *(celdas_combinadas or [])]:
+        try:
+            numero = int(celda.get('row'))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        letra = str(celda.get('col') or '').strip().upper()
+        if numero >= 1 and letra:
+            celdas.add((numero, letra))
+    return celdas
+
+
+def poblar_celdas(apps, schema_editor):
+    # Ante solapamientos ya existentes conserva la celda la posición más antigua
+    Posicion = apps.get_model('dispositivos', 'Posicion')
+    CeldaPosicion = apps.get_model('dispositivos', 'CeldaPosicion')
+    ocupadas = set()
+    nuevas = []
+    for posicion in Posicion.objects.order_by('id').values('id', 'sede_id', 'piso', 'fila', 'columna', 'mergedCells'):
+        for fila, columna in sorted(_celdas(posicion['fila'], posicion['columna'], posicion['mergedCells'])):
+            clave = (posicion['sede_id'], posicion['piso'], fila, columna)
+            if clave in ocupadas:
+                continue
+            ocupadas.add(clave)
+            nuevas.append(CeldaPosicion(
+                sede_id=posicion['sede_id'], piso=posicion['piso'], fila=fila, columna=columna,
+                posicion_id=posicion['id']
+            ))
+    CeldaPosicion.objects.bulk_create(nuevas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0008_busqueda_trigramas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CeldaPosicion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('piso', models.CharField(max_length=50)),
+                ('fila', models.IntegerField()),
+                ('columna', models.CharField(max_length=5)),
+                ('posicion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='celdas_ocupadas', to='dispositivos.posicion')),
+                ('sede', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='celdas', to='dispositivos.sede')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sede', 'piso', 'fila', 'columna'), name='celda_posicion_unica', nulls_distinct=False)],
+            },
+        ),
+        migrations.RunPython(poblar_celdas, migrations.RunPython.noop),
+    ]
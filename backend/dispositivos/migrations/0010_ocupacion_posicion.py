@@ -0,0 +1,42 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:16
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def calcular_ocupacion(apps, schema_editor):
+    Posicion = apps.get_model('dispositivos', 'Posicion')
+    Dispositivo = apps.get_model('dispositivos', 'Dispositivo')
+    totales = dict(
+        Dispositivo.objects.filter(posicion__isnull=False)
+        .values('posicion_id').annotate(total=Count('id')).values_list('posicion_id', 'total')
+    )
+    excedidas = sorted(p for p, total in totales.items() if total > 5)
+    if excedidas:
+        raise RuntimeError(
+            f"Las posiciones {excedidas} tienen más de 5 dispositivos; reasígnelos antes de migrar."
+        )
+    posiciones = list(Posicion.objects.filter(pk__in=totales).only('id'))
+    for posicion in posiciones:
+        posicion.ocupacion = totales[posicion.id]
+    Posicion.objects.bulk_update(posiciones, ['ocupacion'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0009_celdas_posicion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='posicion',
+            name='ocupacion',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(calcular_ocupacion, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='posicion',
+            constraint=models.CheckConstraint(condition=models.Q(('ocupacion__lte', 5)), name='posicion_ocupacion_maxima'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def conciliar_posiciones(apps, schema_editor):
+    """
+    La FK Dispositivo.posicion queda como única ubicación. Los dispositivos que
+    solo estaban en la m2m pasan a la FK de su posición de menor id, si es de su
+    sede y aún tiene cupo; los demás quedan sin posición.
+    """
+    Posicion = apps.get_model('dispositivos', 'Posicion')
+    Dispositivo = apps.get_model('dispositivos', 'Dispositivo')
+    PosicionDispositivo = Posicion.dispositivos.through
+
+    sin_fk = {
+        d.id: d for d in Dispositivo.objects.filter(
+            posicion__isnull=True, posiciones__isnull=False
+        ).distinct().only('id', 'sede_id', 'piso', 'posicion_id')
+    }
+    if not sin_fk:
+        return
+    candidatas = {}
+    for dispositivo_id, posicion_id in PosicionDispositivo.objects.filter(
+        dispositivo_id__in=sin_fk
+    ).order_by('posicion_id').values_list('dispositivo_id', 'posicion_id'):
+        candidatas.setdefault(dispositivo_id, []).append(posicion_id)
+    posiciones = Posicion.objects.in_bulk({p for ids in candidatas.values() for p in ids})
+
+    asignados = []
+    for dispositivo_id, posicion_ids in candidatas.items():
+        dispositivo = sin_fk[dispositivo_id]
+        for posicion_id in posicion_ids:
+            posicion = posiciones[posicion_id]
+            if dispositivo.sede_id not in (None, posicion.sede_id) or posicion.ocupacion >= 5:
+                continue
+            posicion.ocupacion += 1
+            dispositivo.posicion_id = posicion.id
+            dispositivo.sede_id = posicion.sede_id
+            dispositivo.piso = posicion.piso
+            asignados.append(dispositivo)
+            break
+    Dispositivo.objects.bulk_update(asignados, ['posicion', 'sede', 'piso'], batch_size=1000)
+    Posicion.objects.bulk_update(posiciones.values(), ['ocupacion'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0010_ocupacion_posicion'),
+    ]
+
+    operations = [
+        migrations.RunPython(conciliar_posiciones, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='posicion',
+            name='dispositivos',
+        ),
+        migrations.AlterField(
+            model_name='dispositivo',
+            name='posicion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='dispositivos', to='dispositivos.posicion'),
+        ),
+    ]
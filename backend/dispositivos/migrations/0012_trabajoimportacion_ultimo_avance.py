@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dispositivos', '0011_ubicacion_unica'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='ultimo_avance',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models # type: ignore
+from django.db import IntegrityError, models # type: ignore
+from django.db.models import Case, F, Q, Value, When # type: ignore
 from django.contrib.auth.models import AbstractUser # type: ignore
 from django.db.models.signals import post_save # type: ignore
 from django.dispatch import receiver # type: ignore
@@ -119,7 +120,91 @@ class Servicios(models.Model):
         verbose_name = "Servicios"
         verbose_name_plural = "Servicios"
         
-class Posicion(models.Model):
+class SeguimientoCambiosMixin:
+    """
+    Guarda en memoria los valores con los que la instancia se leyó de la base
+    (hook from_db) para que las señales comparen contra ellos sin volver a
+    consultar. Tras cada save() la instantánea pasa a ser lo guardado.
+    """
+    _valores_cargados = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._valores_cargados = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._registrar_valores(fields)
+
+    def _registrar_valores(self, campos=None):
+        cargados = self.get_deferred_fields()
+        valores = {
+            f.attname: getattr(self, f.attname) for f in self._meta.concrete_fields
+            if f.attname not in cargados and (campos is None or f.name in campos or f.attname in campos)
+        }
+        if campos is None or self._valores_cargados is None:
+            self._valores_cargados = valores
+        else:
+            self._valores_cargados = {**self._valores_cargados, **valores}
+
+    def _completar_valores(self):
+        """Lee de la base los campos que faltan en la instantánea (diferidos con only()/defer())."""
+        faltantes = [f.attname for f in self._meta.concrete_fields if f.attname not in self._valores_cargados]
+        if not faltantes or not self.pk:
+            return
+        fila = type(self)._base_manager.filter(pk=self.pk).values(*faltantes).first()
+        if fila is not None:
+            self._valores_cargados = {**self._valores_cargados, **fila}
+
+    def valor_anterior(self, attname):
+        """Valor guardado del campo (el actual si la instancia es nueva, None si no existe en la base)."""
+        if self._valores_cargados is None:
+            return getattr(self, attname)
+        if attname not in self._valores_cargados:
+            self._completar_valores()
+        return self._valores_cargados.get(attname)
+
+    def campo_modificado(self, attname):
+        """True si la instancia es nueva, el campo difiere de lo guardado o no se puede saber."""
+        if self._valores_cargados is None:
+            return True
+        if attname not in self._valores_cargados:
+            self._completar_valores()
+        return attname not in self._valores_cargados or self._valores_cargados[attname] != getattr(self, attname)
+
+    def campos_modificados(self):
+        """{campo: (antes, despues)} de los campos que cambiaron desde la última lectura."""
+        if self._valores_cargados is None:
+            return {}
+        return {
+            f: (antes, getattr(self, f)) for f, antes in self._valores_cargados.items()
+            if antes != getattr(self, f)
+        }
+
+    def _cargar_valores_previos(self, force_insert=False):
+        if not self.pk or force_insert:
+            return
+        if self._valores_cargados is None:
+            # Instancia construida a mano con pk: única lectura para conocer el estado previo
+            self._valores_cargados = type(self)._base_manager.filter(pk=self.pk).values(
+                *[f.attname for f in self._meta.concrete_fields]
+            ).first()
+        else:
+            # Campos diferidos: se leen antes de guardar, después la base ya tiene lo nuevo
+            self._completar_valores()
+
+    def save(self, *args, **kwargs):
+        self._cargar_valores_previos(kwargs.get('force_insert'))
+        super().save(*args, **kwargs)
+        self._registrar_valores(kwargs.get('update_fields'))
+
+
+MAX_DISPOSITIVOS_POSICION = 5
+
+
+class Posicion(SeguimientoCambiosMixin, models.Model):
     ESTADOS = [
         ('disponible', 'Disponible'),
         ('ocupado', 'Ocupado'),
@@ -135,7 +220,8 @@ class Posicion(models.Model):
         ('TORRE1', 'T1'),
     ]
 
-    MAX_DISPOSITIVOS = 5  # Límite máximo de dispositivos por posición
+    MAX_DISPOSITIVOS = MAX_DISPOSITIVOS_POSICION  # Límite máximo de dispositivos por posición
+    CAMPOS_CELDAS = ('sede_id', 'piso', 'fila', 'columna', 'mergedCells')
 
     nombre = models.CharField(max_length=100, blank=True, null=True)
     tipo = models.CharField(max_length=50, blank=True, null=True)
@@ -152,8 +238,10 @@ class Posicion(models.Model):
     piso = models.CharField(max_length=50, choices=PISOS)
     sede = models.ForeignKey('Sede', on_delete=models.CASCADE, related_name="posiciones", null=True, blank=True)
     servicio = models.ForeignKey('Servicios', on_delete=models.SET_NULL, related_name="posiciones", null=True, blank=True)
-    dispositivos = models.ManyToManyField('Dispositivo', related_name='posiciones', blank=True)
     mergedCells = models.JSONField(default=list)
+    # Dispositivos con esta posición (Dispositivo.posicion). Solo se modifica con
+    # ajustar_ocupacion; save() nunca lo escribe para no pisar esos incrementos.
+    ocupacion = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.nombre} - Piso {self.piso}"
@@ -165,20 +253,10 @@ class Posicion(models.Model):
             raise ValidationError("La columna debe contener solo letras.")
         
         # Validar que no se exceda el límite de dispositivos
-        if self.pk and self.dispositivos.count() > self.MAX_DISPOSITIVOS:
+        if self.ocupacion > self.MAX_DISPOSITIVOS:
             raise ValidationError(f"Una posición no puede tener más de {self.MAX_DISPOSITIVOS} dispositivos.")
 
     def save(self, *args, **kwargs):
-        # Variable para controlar si debemos guardar los dispositivos después
-        save_dispositivos = False
-        dispositivos_temp = None
-        
-        # Si es un nuevo objeto y tiene dispositivos asignados
-        if not self.pk and hasattr(self, '_dispositivos_temp'):
-            dispositivos_temp = self._dispositivos_temp
-            save_dispositivos = True
-            delattr(self, '_dispositivos_temp')
-        
         # Si se está eliminando el servicio, restablecer el color al valor por defecto
         if self.servicio_id is None and 'servicio' in kwargs.get('update_fields', []):
             self.color = "#FFFFFF"  # Color por defecto
@@ -192,23 +270,140 @@ class Posicion(models.Model):
             if 'update_fields' in kwargs:
                 kwargs['update_fields'].append('color')
         
+        # Las celdas solo se recalculan si cambió algo que las define
+        sincronizar = not self.pk or any(self.campo_modificado(c) for c in self.CAMPOS_CELDAS)
+
+        # La ocupación se mantiene con F() desde los dispositivos: no se reescribe al guardar
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != 'ocupacion'
+            ]
+
         # Primero guardamos el objeto para obtener un ID
-        super().save(*args, **kwargs)
-        
-        # Si hay dispositivos temporales, los asignamos después de guardar
-        if save_dispositivos and dispositivos_temp:
-            self.dispositivos.set(dispositivos_temp)
-            
-        # Validar el límite de dispositivos después de guardar
-        if self.dispositivos.count() > self.MAX_DISPOSITIVOS:
-            raise ValidationError(f"Una posición no puede tener más de {self.MAX_DISPOSITIVOS} dispositivos.")
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if sincronizar:
+                self.sincronizar_celdas()
 
     def cantidad_dispositivos(self):
-        return self.dispositivos.count()
+        return self.ocupacion
+
+    @classmethod
+    def ajustar_ocupacion(cls, deltas):
+        """
+        Aplica {posicion_id: delta} a la ocupación con F(), en dos UPDATE sin
+        importar cuántas posiciones cambien: primero se liberan lugares y luego
+        se ocupan. El segundo solo afecta filas con cupo, así que dos traslados
+        concurrentes no pueden llenar de más una posición.
+        """
+        liberar = {p: d for p, d in deltas.items() if p and d < 0}
+        ocupar = {p: d for p, d in deltas.items() if p and d > 0}
+        with transaction.atomic():
+            if liberar:
+                cls.objects.filter(pk__in=liberar).update(ocupacion=cls._sumar_ocupacion(liberar))
+            if ocupar:
+                con_cupo = Q(pk__in=[])
+                for posicion_id, delta in ocupar.items():
+                    con_cupo |= Q(pk=posicion_id, ocupacion__lte=cls.MAX_DISPOSITIVOS - delta)
+                if cls.objects.filter(con_cupo).update(ocupacion=cls._sumar_ocupacion(ocupar)) != len(ocupar):
+                    raise ValidationError(
+                        f"La posición ya tiene el máximo de {cls.MAX_DISPOSITIVOS} dispositivos asignados."
+                    )
+
+    @staticmethod
+    def _sumar_ocupacion(deltas):
+        return F('ocupacion') + Case(
+            *[When(pk=posicion_id, then=Value(delta)) for posicion_id, delta in deltas.items()],
+            default=Value(0), output_field=models.IntegerField()
+        )
+
+    def celdas(self):
+        return calcular_celdas(self.fila, self.columna, self.mergedCells)
+
+    def sincronizar_celdas(self):
+        """
+        Ajusta las filas de CeldaPosicion a las celdas actuales de la posición.
+        Si otra posición ya ocupa alguna, la restricción única lo impide.
+        """
+        deseadas = self.celdas()
+        sobrantes = []
+        for celda_id, sede_id, piso, fila, columna in self.celdas_ocupadas.values_list(
+            'id', 'sede_id', 'piso', 'fila', 'columna'
+        ):
+            if sede_id == self.sede_id and piso == self.piso and (fila, columna) in deseadas:
+                deseadas.discard((fila, columna))
+            else:
+                sobrantes.append(celda_id)
+        try:
+            with transaction.atomic():
+                if sobrantes:
+                    CeldaPosicion.objects.filter(id__in=sobrantes).delete()
+                CeldaPosicion.objects.bulk_create([
+                    CeldaPosicion(sede_id=self.sede_id, piso=self.piso, fila=fila, columna=columna, posicion=self)
+                    for fila, columna in sorted(deseadas)
+                ])
+        except IntegrityError:
+            raise ValidationError(f"Alguna de las celdas ya está ocupada en el piso {self.piso} de la sede seleccionada.")
 
     class Meta:
         verbose_name = "Posición"
         verbose_name_plural = "Posiciones"
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(ocupacion__lte=MAX_DISPOSITIVOS_POSICION), name='posicion_ocupacion_maxima'
+            ),
+        ]
+
+
+def calcular_celdas(fila, columna, celdas_combinadas):
+    """{(fila, COLUMNA)} que ocupa una posición: la suya y las combinadas válidas."""
+    celdas = set()
+    for celda in [{'row': fila, 'col': columna}, *(celdas_combinadas or [])]:
+        try:
+            numero = int(celda.get('row'))
+        except (AttributeError, TypeError, ValueError):
+            continue
+        letra = str(celda.get('col') or '').strip().upper()
+        if numero >= 1 and letra:
+            celdas.add((numero, letra))
+    return celdas
+
+
+class CeldaPosicion(models.Model):
+    """
+    Celda de la cuadrícula de un piso ocupada por una posición (incluidas sus
+    celdas combinadas). La restricción única garantiza que dos posiciones no
+    se solapen, incluso con ediciones concurrentes.
+    """
+    sede = models.ForeignKey('Sede', on_delete=models.CASCADE, related_name='celdas', null=True, blank=True)
+    piso = models.CharField(max_length=50)
+    fila = models.IntegerField()
+    columna = models.CharField(max_length=5)
+    posicion = models.ForeignKey(Posicion, on_delete=models.CASCADE, related_name='celdas_ocupadas')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sede', 'piso', 'fila', 'columna'], name='celda_posicion_unica', nulls_distinct=False
+            ),
+        ]
+
+    @classmethod
+    def ocupadas(cls, sede_id, piso, celdas, excluir_posicion=None):
+        """
+        Celdas de `celdas` ya ocupadas por otra posición. Una sola consulta por
+        el rectángulo que las contiene (índice de la restricción única).
+        """
+        if not celdas:
+            return []
+        filas = [fila for fila, _ in celdas]
+        queryset = cls.objects.filter(
+            sede_id=sede_id, piso=piso, fila__gte=min(filas), fila__lte=max(filas),
+            columna__in={columna for _, columna in celdas}
+        )
+        if excluir_posicion is not None:
+            queryset = queryset.exclude(posicion_id=excluir_posicion)
+        return sorted(c for c in queryset.values_list('fila', 'columna') if c in celdas)
 
 @receiver(pre_delete, sender='dispositivos.Servicios')
 def handle_servicio_delete(sender, instance, **kwargs):
@@ -227,7 +422,7 @@ def handle_servicio_delete(sender, instance, **kwargs):
         colorFuente="#000000"
     )
 
-class Dispositivo(models.Model):
+class Dispositivo(SeguimientoCambiosMixin, models.Model):
     TIPOS_DISPOSITIVOS = [
         ('COMPUTADOR', 'Computador'),
         ('DESKTOP', 'Desktop'),
@@ -283,7 +478,7 @@ class Dispositivo(models.Model):
     placa_cu = models.CharField(max_length=50, unique=True, null=True, blank=True)
     piso = models.CharField(max_length=10, null=True, blank=True)
     estado_propiedad = models.CharField(max_length=10, choices=ESTADOS_PROPIEDAD, null=True, blank=True)
-    posicion = models.ForeignKey(Posicion, on_delete=models.SET_NULL, null=True, blank=True, related_name='dispositivos_relacionados')
+    posicion = models.ForeignKey(Posicion, on_delete=models.SET_NULL, null=True, blank=True, related_name='dispositivos')
     sede = models.ForeignKey('Sede', on_delete=models.SET_NULL, null=True, blank=True, related_name="dispositivos", db_index=True)
     capacidad_disco_duro = models.CharField(max_length=100, null=True, blank=True)  # Cambiado de choices a campo libre
     capacidad_memoria_ram = models.CharField(max_length=100, null=True, blank=True)  # Cambiado de choices a campo libre
@@ -298,8 +493,12 @@ class Dispositivo(models.Model):
         return f"{self.tipo} {self.marca} {self.modelo} - {self.serial if self.serial else 'Sin serial'}"
 
     def clean(self):
+        # Las validaciones de posición solo aplican si cambió la posición o la sede
+        if not self.posicion_id or not (self.campo_modificado('posicion_id') or self.campo_modificado('sede_id')):
+            return
+
         # Validación para asegurar que la sede del dispositivo coincida con la sede de la posición
-        if self.posicion and self.sede and self.posicion.sede != self.sede:
+        if self.sede_id and self.posicion.sede_id != self.sede_id:
             raise ValidationError(
                 f"La posición seleccionada pertenece a la sede {self.posicion.sede.nombre}, "
                 f"pero el dispositivo está asignado a la sede {self.sede.nombre}. "
@@ -307,21 +506,35 @@ class Dispositivo(models.Model):
             )
         
         # Validación para asegurar que la posición no tenga demasiados dispositivos
-        if self.posicion and self.posicion.dispositivos.count() >= Posicion.MAX_DISPOSITIVOS:
+        if self.campo_modificado('posicion_id') and self.posicion.ocupacion >= Posicion.MAX_DISPOSITIVOS:
             raise ValidationError(
                 f"Esta posición ya tiene el máximo de {Posicion.MAX_DISPOSITIVOS} dispositivos asignados."
             )
 
     def save(self, *args, **kwargs):
+        self._cargar_valores_previos(kwargs.get('force_insert'))
         # Si se asigna una posición, asegurarse de que la sede coincida
-        if self.posicion and not self.sede:
-            self.sede = self.posicion.sede
-        elif self.posicion and self.sede and self.posicion.sede != self.sede:
+        if self.posicion_id and not self.sede_id:
+            self.sede_id = self.posicion.sede_id
+        elif (self.posicion_id and self.sede_id
+              and (self.campo_modificado('posicion_id') or self.campo_modificado('sede_id'))
+              and self.posicion.sede_id != self.sede_id):
             # Esto debería ser manejado por clean(), pero por si acaso
             raise ValidationError("La sede del dispositivo no coincide con la sede de la posición")
         
         self.clean()
-        super().save(*args, **kwargs)
+
+        update_fields = kwargs.get('update_fields')
+        cambia_posicion = update_fields is None or 'posicion' in update_fields or 'posicion_id' in update_fields
+        anterior = None if self._state.adding else self.valor_anterior('posicion_id')
+        if not cambia_posicion or anterior == self.posicion_id:
+            super().save(*args, **kwargs)
+            return
+
+        # El contador de la posición y el dispositivo se guardan juntos
+        with transaction.atomic():
+            Posicion.ajustar_ocupacion({anterior: -1, self.posicion_id: 1})
+            super().save(*args, **kwargs)
 
     def is_operativo(self):
         return self.estado_uso == 'EN_USO' and self.estado == 'BUENO'
@@ -355,6 +568,13 @@ class Historial(models.Model):
         ordering = ['-fecha_modificacion']
         verbose_name = "Historial"
         verbose_name_plural = "Historiales"
+        # En PostgreSQL la tabla está particionada por mes sobre fecha_modificacion (ver particiones.py)
+        indexes = [
+            models.Index(fields=['-fecha_modificacion']),
+            models.Index(fields=['tipo_cambio', '-fecha_modificacion']),
+            models.Index(fields=['dispositivo', '-fecha_modificacion']),
+            models.Index(fields=['usuario', 'tipo_cambio', '-fecha_modificacion']),
+        ]
 
 
 from django.db import models # type: ignore
@@ -364,6 +584,7 @@ from django.db.models.signals import pre_save, post_save # type: ignore
 from django.dispatch import receiver # type: ignore
 from django.db import transaction # type: ignore
 import logging
+from .historial import registrar_historial
 
 logger = logging.getLogger(__name__)
 class Movimiento(models.Model):
@@ -452,11 +673,11 @@ class Movimiento(models.Model):
 
     def save(self, *args, **kwargs):
         # Autocompletar sede si no está especificada
-        if not self.sede:
-            if self.dispositivo and self.dispositivo.sede:
-                self.sede = self.dispositivo.sede
-            elif self.posicion_destino and self.posicion_destino.sede:
-                self.sede = self.posicion_destino.sede
+        if not self.sede_id:
+            if self.dispositivo and self.dispositivo.sede_id:
+                self.sede_id = self.dispositivo.sede_id
+            elif self.posicion_destino and self.posicion_destino.sede_id:
+                self.sede_id = self.posicion_destino.sede_id
         
         # Autogenerar observación si está vacía
         if not self.observacion:
@@ -483,45 +704,35 @@ class Movimiento(models.Model):
         return " | ".join(partes)
 
 # Señales
-@receiver(pre_save, sender='dispositivos.Dispositivo')
-def capturar_posicion_anterior(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            original = sender.objects.get(pk=instance.pk)
-            instance._posicion_anterior = original.posicion
-        except sender.DoesNotExist:
-            instance._posicion_anterior = None
-
+# El estado previo del dispositivo sale de la instantánea tomada al leerlo
+# (SeguimientoCambiosMixin), así que no se consulta la base antes de guardar.
 @receiver(post_save, sender='dispositivos.Dispositivo')
 def registrar_movimiento_automatico(sender, instance, created, **kwargs):
-    if created or not hasattr(instance, '_posicion_anterior'):
+    if created or not instance.campo_modificado('posicion_id'):
         return
     
-    if instance._posicion_anterior != instance.posicion:
-        try:
-            request = kwargs.get('request')
-            user = getattr(request, 'user', None) if request else None
-            encargado = user.roluser if (user and hasattr(user, 'roluser')) else None
-            
-            with transaction.atomic():
-                Movimiento.objects.create(
-                    dispositivo=instance,
-                    posicion_origen=instance._posicion_anterior,
-                    posicion_destino=instance.posicion,
-                    encargado=encargado,
-                    observacion="Movimiento automático por cambio de posición",
-                    sede=instance.sede
-                )
-        except Exception as e:
-            logger.error(f"Error al registrar movimiento automático: {str(e)}")
+    try:
+        request = kwargs.get('request')
+        user = getattr(request, 'user', None) if request else None
+        encargado = user.roluser if (user and hasattr(user, 'roluser')) else None
+        
+        with transaction.atomic():
+            Movimiento.objects.create(
+                dispositivo=instance,
+                posicion_origen_id=instance.valor_anterior('posicion_id'),
+                posicion_destino=instance.posicion,
+                encargado=encargado,
+                observacion="Movimiento automático por cambio de posición",
+                sede_id=instance.sede_id
+            )
+    except Exception as e:
+        logger.error(f"Error al registrar movimiento automático: {str(e)}")
 
-@receiver(pre_save, sender=Dispositivo)
-def guardar_estado_anterior(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            instance._estado_anterior = Dispositivo.objects.get(pk=instance.pk)
-        except Dispositivo.DoesNotExist:
-            instance._estado_anterior = None
+def _valor_historial(field, valor):
+    # Las FK se muestran con el __str__ del objeto, igual que al comparar instancias
+    if field.is_relation and valor is not None:
+        valor = field.related_model._base_manager.filter(pk=valor).first()
+    return str(valor)
 
 @receiver(post_save, sender=Dispositivo)
 def registrar_cambios_historial(sender, instance, created, **kwargs):
@@ -538,7 +749,6 @@ def registrar_cambios_historial(sender, instance, created, **kwargs):
         usuario_actual = None
 
     cambios = {}
-    estado_anterior = getattr(instance, '_estado_anterior', None)
     sede = instance.posicion.sede.nombre if instance.posicion and instance.posicion.sede else None
 
     if created:
@@ -547,7 +757,7 @@ def registrar_cambios_historial(sender, instance, created, **kwargs):
             valor = getattr(instance, nombre)
             cambios[nombre] = {"antes": None, "despues": str(valor)}
 
-        Historial.objects.create(
+        registrar_historial(
             dispositivo=instance,
             usuario=usuario_actual,
             cambios=cambios,
@@ -559,17 +769,17 @@ def registrar_cambios_historial(sender, instance, created, **kwargs):
         )
         return
 
-    if estado_anterior:
-        for field in instance._meta.fields:
-            nombre = field.name
-            valor_anterior = getattr(estado_anterior, nombre)
-            valor_nuevo = getattr(instance, nombre)
-
-            if valor_anterior != valor_nuevo:
-                cambios[nombre] = {"antes": str(valor_anterior), "despues": str(valor_nuevo)}
+    modificados = instance.campos_modificados()
+    for field in instance._meta.fields:
+        if field.attname in modificados:
+            antes, _ = modificados[field.attname]
+            cambios[field.name] = {
+                "antes": _valor_historial(field, antes),
+                "despues": str(getattr(instance, field.name))
+            }
 
     if cambios:
-        Historial.objects.create(
+        registrar_historial(
             dispositivo=instance,
             usuario=usuario_actual,
             cambios=cambios,
@@ -593,7 +803,7 @@ def registrar_login(sender, request, user, **kwargs):
     ).exists():
         return
 
-    Historial.objects.create(
+    registrar_historial(
         usuario=user,
         cambios={"mensaje": "Inicio de sesión exitoso"},
         tipo_cambio=Historial.TipoCambio.LOGIN,
@@ -611,7 +821,7 @@ def registrar_eliminacion(sender, instance, **kwargs):
         if hasattr(instance, 'posicion') and instance.posicion and instance.posicion.sede:
             sede = instance.posicion.sede.nombre
 
-        Historial.objects.create(
+        registrar_historial(
             cambios={"mensaje": f"Instancia de {sender.__name__} eliminada", "valores": str(instance)},
             tipo_cambio=Historial.TipoCambio.ELIMINACION,
             modelo_afectado=sender.__name__,
@@ -629,20 +839,13 @@ def actualizar_posicion_despues_movimiento(sender, instance, created, **kwargs):
         dispositivo = instance.dispositivo
         posicion_anterior = dispositivo.posicion
         
-        # Remover de posición anterior si existe
-        if posicion_anterior:
-            posicion_anterior.dispositivos.remove(dispositivo)
-        
-        # Agregar a nueva posición
-        instance.posicion_destino.dispositivos.add(dispositivo)
-        
         # Actualizar dispositivo
         dispositivo.posicion = instance.posicion_destino
         dispositivo.sede = instance.posicion_destino.sede if instance.posicion_destino.sede else instance.sede
         dispositivo.save()
         
         # Registrar en el historial
-        Historial.objects.create(
+        registrar_historial(
             dispositivo=dispositivo,
             usuario=instance.encargado,
             tipo_cambio=Historial.TipoCambio.MOVIMIENTO,
@@ -804,4 +1007,94 @@ def actualizar_estado_dispositivo(sender, instance, **kwargs):
     elif instance.estado in ['DEVUELTO', 'VENCIDO']:
         instance.dispositivo.ubicacion = 'SEDE'
         instance.dispositivo.estado_uso = 'DISPONIBLE'
-        instance.dispositivo.save()
\ No newline at end of file
+        instance.dispositivo.save()
+
+class TrabajoImportacion(models.Model):
+    """Importación de Excel ejecutada en segundo plano, con avance por lotes confirmados"""
+    ESTADOS = [
+        ('PENDIENTE', 'Pendiente'),
+        ('PROCESANDO', 'Procesando'),
+        ('COMPLETADO', 'Completado'),
+        ('FALLIDO', 'Fallido'),
+    ]
+
+    archivo = models.FileField(upload_to='importaciones/')
+    sede = models.ForeignKey('Sede', on_delete=models.CASCADE, related_name='importaciones')
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    estado = models.CharField(max_length=10, choices=ESTADOS, default='PENDIENTE')
+    total_filas = models.PositiveIntegerField(default=0)
+    filas_procesadas = models.PositiveIntegerField(default=0)  # Punto de control: filas ya confirmadas
+    creados = models.PositiveIntegerField(default=0)
+    actualizados = models.PositiveIntegerField(default=0)
+    errores = models.JSONField(default=list, blank=True)
+    mensaje_error = models.TextField(blank=True, null=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    ultimo_avance = models.DateTimeField(null=True, blank=True)  # Se actualiza con cada lote confirmado
+    segundos_procesando = models.FloatField(default=0)
+
+    class Meta:
+        verbose_name = 'Trabajo de importación'
+        verbose_name_plural = 'Trabajos de importación'
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Importación #{self.id} - {self.get_estado_display()} ({self.filas_procesadas}/{self.total_filas})"
+
+    def progreso(self):
+        return round(self.filas_procesadas * 100 / self.total_filas, 1) if self.total_filas else 0
+
+    def filas_por_segundo(self):
+        return round(self.filas_procesadas / self.segundos_procesando, 1) if self.segundos_procesando else None
+
+    def detenido(self):
+        """En curso según su estado, pero sin avanzar hace rato (p. ej. el worker murió con un reinicio)."""
+        if self.estado not in ('PENDIENTE', 'PROCESANDO'):
+            return False
+        limite = now() - timedelta(seconds=getattr(settings, 'IMPORTACION_SEGUNDOS_SIN_AVANCE', 600))
+        return (self.ultimo_avance or self.fecha_creacion) < limite
+
+
+class EstadisticaDispositivos(models.Model):
+    """Contador de dispositivos por sede, tipo, estado y estado de uso, mantenido por señales"""
+    sede = models.ForeignKey('Sede', on_delete=models.CASCADE, null=True, blank=True, related_name='estadisticas_dispositivos')
+    tipo = models.CharField(max_length=20)
+    estado = models.CharField(max_length=18, null=True, blank=True)
+    estado_uso = models.CharField(max_length=100, null=True, blank=True)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Estadística de dispositivos'
+        verbose_name_plural = 'Estadísticas de dispositivos'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sede', 'tipo', 'estado', 'estado_uso'],
+                name='unique_estadistica_dispositivos',
+                nulls_distinct=False
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.sede} | {self.tipo} | {self.estado} | {self.estado_uso}: {self.total}"
+
+
+class EstadisticaMovimientos(models.Model):
+    """Contador de movimientos por sede y día, mantenido por señales"""
+    sede = models.ForeignKey('Sede', on_delete=models.CASCADE, null=True, blank=True, related_name='estadisticas_movimientos')
+    fecha = models.DateField()
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Estadística de movimientos'
+        verbose_name_plural = 'Estadísticas de movimientos'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['sede', 'fecha'],
+                name='unique_estadistica_movimientos',
+                nulls_distinct=False
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.sede} | {self.fecha}: {self.total}"
@@ -1,7 +1,26 @@
 # dispositivos/pagination.py
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 
 class StandardPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+class DispositivoCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) para el listado de dispositivos.
+    Cada página filtra por el último id visto en lugar de usar OFFSET,
+    por lo que el costo es constante sin importar el tamaño del inventario.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = 'id'
+    ordering_options = ('id', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        # Solo se permite ordenar por columnas indexadas y únicas
+        ordering = request.query_params.get('ordering', self.ordering)
+        if ordering not in self.ordering_options:
+            ordering = self.ordering
+        return (ordering,)
@@ -0,0 +1,151 @@
+"""
+Particionado mensual de la tabla de historial (solo PostgreSQL).
+
+dispositivos_historial se guarda como tabla particionada por rango sobre
+fecha_modificacion, con una partición por mes (dispositivos_historial_pAAAA_MM)
+y una partición por defecto para las fechas que aún no tienen la suya. Así las
+consultas por rango de fechas solo recorren los meses implicados y los meses
+antiguos se pueden desprender y archivar sin borrar fila por fila.
+
+Las particiones futuras se crean por adelantado con el comando
+particionar_historial; las antiguas se archivan con archivar_historial.
+"""
+import datetime
+import gzip
+import os
+import re
+from django.db import connection, transaction # type: ignore
+
+TABLA = 'dispositivos_historial'
+PARTICION_DEFECTO = f'{TABLA}_default'
+PATRON_PARTICION = re.compile(rf'^{TABLA}_p(\d{{4}})_(\d{{2}})$')
+
+
+def inicio_mes(fecha):
+    return datetime.date(fecha.year, fecha.month, 1)
+
+
+def sumar_meses(fecha, meses):
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return datetime.date(indice // 12, indice % 12 + 1, 1)
+
+
+def nombre_particion(mes):
+    return f'{TABLA}_p{mes:%Y_%m}'
+
+
+def es_particionada(conexion=connection):
+    if conexion.vendor != 'postgresql':
+        return False
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid))",
+            [TABLA]
+        )
+        return cursor.fetchone()[0]
+
+
+def particiones(conexion=connection):
+    """Particiones mensuales adjuntas como [(nombre, desde, hasta)], de la más antigua a la más nueva."""
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [TABLA]
+        )
+        nombres = [fila[0] for fila in cursor.fetchall()]
+
+    resultado = []
+    for nombre in nombres:
+        coincidencia = PATRON_PARTICION.match(nombre)
+        if coincidencia:
+            desde = datetime.date(int(coincidencia.group(1)), int(coincidencia.group(2)), 1)
+            resultado.append((nombre, desde, sumar_meses(desde, 1)))
+    return sorted(resultado, key=lambda p: p[1])
+
+
+def particiones_desprendidas(conexion=connection):
+    """Tablas de particiones mensuales que ya no están adjuntas (p. ej. un archivado interrumpido)."""
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_class c "
+            "WHERE c.relkind = 'r' AND c.relname LIKE %s AND pg_table_is_visible(c.oid) "
+            "AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)",
+            [f'{TABLA}_p%']
+        )
+        return sorted(fila[0] for fila in cursor.fetchall() if PATRON_PARTICION.match(fila[0]))
+
+
+def crear_particion_defecto(conexion=connection):
+    with conexion.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {PARTICION_DEFECTO} PARTITION OF {TABLA} DEFAULT')
+
+
+def crear_particiones(desde, hasta, conexion=connection):
+    """
+    Crea las particiones mensuales que falten entre los meses de `desde` y
+    `hasta` (ambos incluidos). Las filas de ese mes que hubieran caído en la
+    partición por defecto se trasladan a la nueva partición.
+    """
+    existentes = {nombre for nombre, _, _ in particiones(conexion)}
+    creadas = []
+    mes = inicio_mes(desde)
+    while mes <= inicio_mes(hasta):
+        nombre = nombre_particion(mes)
+        if nombre not in existentes:
+            rango = [mes.isoformat(), sumar_meses(mes, 1).isoformat()]
+            with transaction.atomic(using=conexion.alias), conexion.cursor() as cursor:
+                # PostgreSQL no permite crear la partición si la de defecto
+                # tiene filas de ese rango: se crea suelta, se mueven y se adjunta
+                cursor.execute(f'CREATE TABLE {nombre} (LIKE {TABLA} INCLUDING DEFAULTS)')
+                cursor.execute(
+                    f'WITH movidas AS ('
+                    f'DELETE FROM {PARTICION_DEFECTO} '
+                    f'WHERE fecha_modificacion >= %s AND fecha_modificacion < %s RETURNING *'
+                    f') INSERT INTO {nombre} SELECT * FROM movidas',
+                    rango
+                )
+                cursor.execute(
+                    f'ALTER TABLE {TABLA} ATTACH PARTITION {nombre} FOR VALUES FROM (%s) TO (%s)',
+                    rango
+                )
+            creadas.append(nombre)
+        mes = sumar_meses(mes, 1)
+    return creadas
+
+
+def desprender_particion(nombre, conexion=connection):
+    with conexion.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {TABLA} DETACH PARTITION {nombre}')
+
+
+def archivar_particion(nombre, directorio, conexion=connection):
+    """
+    Vuelca una partición a un CSV comprimido y devuelve su ruta. Se escribe en un
+    archivo temporal que solo se renombra al terminar, así que un volcado
+    interrumpido nunca deja un archivo que parezca completo.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    ruta = os.path.join(directorio, f'{nombre}.csv.gz')
+    temporal = f'{ruta}.tmp'
+    sql = f'COPY {nombre} TO STDOUT WITH (FORMAT csv, HEADER)'
+
+    with gzip.open(temporal, 'wb') as destino, conexion.cursor() as cursor:
+        if hasattr(cursor, 'copy_expert'):
+            # psycopg2
+            cursor.copy_expert(sql, destino)
+        else:
+            # psycopg 3
+            with cursor.copy(sql) as copia:
+                for bloque in copia:
+                    destino.write(bloque)
+    os.replace(temporal, ruta)
+    return ruta
+
+
+def eliminar_particion(nombre, conexion=connection):
+    with conexion.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {nombre}')
@@ -0,0 +1,110 @@
+"""
+Perfilado de consultas SQL por petición (opcional, PERFILADO_CONSULTAS).
+
+PerfilConsultasMiddleware (middlewares.py) envuelve las conexiones con
+execute_wrapper y anota en cada respuesta cuántas consultas hizo, cuánto
+tardaron, cuánto tardó el renderizado (serialización a JSON) y cuántas
+consultas repetidas hubo. Dos consultas son "la misma" si coinciden una vez
+quitados los literales, que es la forma típica de un N+1 (un
+SELECT ... WHERE id = %s por fila).
+
+Las cifras se exponen en las cabeceras Server-Timing / X-Query-Count y se
+acumulan por endpoint en memoria del proceso (últimas PERFILADO_MUESTRAS
+peticiones de cada uno) para la vista /api/perfilado/.
+"""
+import re
+import threading
+import time
+from collections import Counter, deque
+from django.conf import settings # type: ignore
+
+_LITERALES = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def huella(sql):
+    """SQL sin literales ni listas IN, para agrupar consultas equivalentes."""
+    for patron, reemplazo in _LITERALES:
+        sql = patron.sub(reemplazo, sql)
+    return sql.strip()
+
+
+class RegistroConsultas:
+    """execute_wrapper que cuenta las consultas de una petición y su duración."""
+
+    def __init__(self):
+        self.total = 0
+        self.duracion = 0.0
+        self.huellas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duracion += time.perf_counter() - inicio
+            self.total += 1
+            self.huellas[huella(sql)] += 1
+
+    def duplicadas(self):
+        """{huella: repeticiones} de las consultas ejecutadas más de una vez."""
+        return {sql: n for sql, n in self.huellas.items() if n > 1}
+
+
+class EstadisticasEndpoints:
+    """Ventana móvil de mediciones por endpoint, compartida por los hilos del proceso."""
+
+    def __init__(self, muestras=200):
+        self.muestras = muestras
+        self._datos = {}
+        self._bloqueo = threading.Lock()
+
+    def registrar(self, endpoint, medicion):
+        with self._bloqueo:
+            ventana = self._datos.get(endpoint)
+            if ventana is None:
+                ventana = self._datos[endpoint] = deque(maxlen=self.muestras)
+            ventana.append(medicion)
+
+    def limpiar(self):
+        with self._bloqueo:
+            self._datos.clear()
+
+    def resumen(self):
+        with self._bloqueo:
+            datos = {endpoint: list(ventana) for endpoint, ventana in self._datos.items()}
+
+        resultado = []
+        for endpoint, mediciones in datos.items():
+            consultas = sorted(m['consultas'] for m in mediciones)
+            repetidas = Counter()
+            for m in mediciones:
+                repetidas.update(m['duplicadas'])
+            resultado.append({
+                'endpoint': endpoint,
+                'peticiones': len(mediciones),
+                'consultas_promedio': round(sum(consultas) / len(consultas), 1),
+                'consultas_p95': consultas[min(len(consultas) - 1, int(len(consultas) * 0.95))],
+                'consultas_max': consultas[-1],
+                'db_ms_promedio': round(sum(m['db_ms'] for m in mediciones) / len(mediciones), 2),
+                'render_ms_promedio': round(sum(m['render_ms'] for m in mediciones) / len(mediciones), 2),
+                'total_ms_promedio': round(sum(m['total_ms'] for m in mediciones) / len(mediciones), 2),
+                'duplicadas': [
+                    {'sql': sql, 'repeticiones': n} for sql, n in repetidas.most_common(5)
+                ],
+            })
+        return sorted(resultado, key=lambda e: -e['consultas_promedio'])
+
+
+estadisticas = EstadisticasEndpoints(getattr(settings, 'PERFILADO_MUESTRAS', 200))
+
+
+def nombre_endpoint(request):
+    """Método y patrón de la ruta ("GET api/sedes/<int:sede_id>/"), no la URL concreta."""
+    coincidencia = getattr(request, 'resolver_match', None)
+    ruta = coincidencia.route if coincidencia is not None else request.path
+    return f'{request.method} {ruta}'
@@ -0,0 +1,67 @@
+"""
+Plano de un piso: las posiciones de una sede y piso como una cuadrícula
+compacta (fila -> columna -> celda) que el frontend pinta sin más peticiones.
+
+Se obtiene con una sola consulta (posición + servicio; la cantidad de
+dispositivos es la columna `ocupacion`). Su ETag se calcula solo con las versiones de cache de
+posiciones y servicios, así que una petición con If-None-Match vigente se
+responde con 304 sin tocar la base.
+"""
+from django.db.models import F # type: ignore
+from .models import Posicion
+from .cache import POSICIONES, SERVICIOS, etag
+
+GRUPOS_PLANO = (POSICIONES, SERVICIOS)
+
+CAMPOS_CELDA = (
+    'id', 'nombre', 'tipo', 'estado', 'color', 'colorFuente', 'borde', 'bordeDoble',
+    'bordeDetalle', 'mergedCells',
+)
+
+
+def etag_plano(sede_id, piso):
+    return etag('plano', GRUPOS_PLANO, sede_id, piso)
+
+
+def _orden_columna(columna):
+    # A, B, ..., Z, AA, AB...
+    return (len(columna), columna)
+
+
+def plano_piso(sede_id, piso):
+    filas = (
+        Posicion.objects.filter(sede_id=sede_id, piso=piso)
+        .annotate(cantidad_dispositivos=F('ocupacion'))
+        .values(
+            'fila', 'columna', 'cantidad_dispositivos', *CAMPOS_CELDA,
+            'servicio_id', 'servicio__nombre', 'servicio__color'
+        )
+        .order_by('fila', 'columna', 'id')
+    )
+
+    celdas = {}
+    columnas = set()
+    max_fila = 0
+    for fila in filas:
+        numero, columna = fila.pop('fila'), fila.pop('columna').upper()
+        servicio_id = fila.pop('servicio_id')
+        nombre_servicio, color_servicio = fila.pop('servicio__nombre'), fila.pop('servicio__color')
+        fila['servicio'] = (
+            {'id': servicio_id, 'nombre': nombre_servicio, 'color': color_servicio}
+            if servicio_id else None
+        )
+        celdas.setdefault(str(numero), {})[columna] = fila
+
+        columnas.add(columna)
+        max_fila = max(max_fila, numero)
+        for celda in fila['mergedCells'] or []:
+            if isinstance(celda.get('row'), int):
+                max_fila = max(max_fila, celda['row'])
+
+    return {
+        'sede_id': sede_id,
+        'piso': piso,
+        'filas': max_fila,
+        'columnas': sorted(columnas, key=_orden_columna),
+        'celdas': celdas,
+    }
@@ -3,7 +3,8 @@ from django.contrib.auth import authenticate # type: ignore
 from django.contrib.auth.hashers import make_password # type: ignore
 from django.utils.translation import gettext_lazy as _ # type: ignore
 from django.db import transaction # type: ignore
-from .models import RolUser, Sede, Dispositivo, Servicios, Posicion, Historial, Movimiento
+from django.db.models import F, Prefetch # type: ignore
+from .models import RolUser, Sede, Dispositivo, Servicios, Posicion, Historial, Movimiento, TrabajoImportacion
 
 class RolUserSerializer(serializers.ModelSerializer):
     sedes = serializers.PrimaryKeyRelatedField(queryset=Sede.objects.all(), many=True, required=False)
@@ -80,6 +81,53 @@ class DispositivoSerializer(serializers.ModelSerializer):
     TIPOS_CON_REQUISITOS = ['COMPUTADOR', 'PORTATIL', 'DESKTOP', 'TODO_EN_UNO']
     ESTADOS_INVALIDOS = ['MALO', 'PERDIDO_ROBADO', 'PENDIENTE_BAJA']
 
+    # Columnas que necesita cada campo calculado, para poder reducir el SELECT
+    # cuando el cliente pide solo algunos campos (?fields=)
+    DEPENDENCIAS_CAMPOS = {
+        'nombre_sede': ['sede__nombre'],
+        'posicion_nombre': ['posicion__nombre'],
+        'servicio_nombre': [],
+        'codigo_analitico': [],
+        'tipo_display': ['tipo'],
+        'estado_display': ['estado'],
+        'marca_display': ['marca'],
+        'sistema_operativo_display': ['sistema_operativo'],
+        'is_operativo': ['estado', 'estado_uso'],
+    }
+
+    # Campos del servicio que se resuelven como anotaciones en la misma consulta
+    # en lugar de recorrer posicion.servicio por cada dispositivo
+    ANOTACIONES_CAMPOS = {
+        'servicio_nombre': F('posicion__servicio__nombre'),
+        'codigo_analitico': F('posicion__servicio__codigo_analitico'),
+    }
+
+    def __init__(self, *args, **kwargs):
+        # Permite limitar los campos serializados: DispositivoSerializer(qs, fields=[...])
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for nombre in set(self.fields) - set(fields):
+                self.fields.pop(nombre)
+
+    @classmethod
+    def optimizar_queryset(cls, queryset, fields=None):
+        """
+        Aplica al queryset solo las columnas, joins y anotaciones que necesitan
+        los campos pedidos. Sin `fields` se cargan todas las columnas con sus
+        relaciones. El número de consultas no depende de la cantidad de filas.
+        """
+        if not fields:
+            return queryset.select_related('posicion', 'sede').annotate(**cls.ANOTACIONES_CAMPOS)
+
+        columnas = {'id'}
+        for campo in fields:
+            columnas.update(cls.DEPENDENCIAS_CAMPOS.get(campo, [campo]))
+
+        relaciones = {c.rsplit('__', 1)[0] for c in columnas if '__' in c}
+        anotaciones = {c: expr for c, expr in cls.ANOTACIONES_CAMPOS.items() if c in fields}
+        return queryset.select_related(*relaciones).only(*columnas).annotate(**anotaciones)
+
     class Meta:
         model = Dispositivo
         fields = '__all__'
@@ -96,9 +144,14 @@ class DispositivoSerializer(serializers.ModelSerializer):
         return obj.posicion.nombre if obj.posicion else None
     
     def get_servicio_nombre(self, obj):
+        # Usa la anotación de optimizar_queryset si existe
+        if hasattr(obj, 'servicio_nombre'):
+            return obj.servicio_nombre
         return obj.posicion.servicio.nombre if obj.posicion and obj.posicion.servicio else None
     
     def get_codigo_analitico(self, obj):
+        if hasattr(obj, 'codigo_analitico'):
+            return obj.codigo_analitico
         return obj.posicion.servicio.codigo_analitico if obj.posicion and obj.posicion.servicio else None
     
     def get_nombre_sede(self, obj):
@@ -137,9 +190,8 @@ class DispositivoSerializer(serializers.ModelSerializer):
 
         # Validar límite de dispositivos en posición
         if posicion:
-            dispositivos_count = posicion.dispositivos_relacionados.count()
             if not instance or (instance and instance.posicion != posicion):
-                if dispositivos_count >= Posicion.MAX_DISPOSITIVOS:
+                if posicion.ocupacion >= Posicion.MAX_DISPOSITIVOS:
                     raise serializers.ValidationError({
                         'posicion': f'Esta posición ya tiene el máximo de {Posicion.MAX_DISPOSITIVOS} dispositivos'
                     })
@@ -172,7 +224,7 @@ class DispositivoSerializer(serializers.ModelSerializer):
         try:
             with transaction.atomic():
                 posicion = validated_data.get('posicion')
-                if posicion and posicion.dispositivos_relacionados.count() >= Posicion.MAX_DISPOSITIVOS:
+                if posicion and posicion.ocupacion >= Posicion.MAX_DISPOSITIVOS:
                     raise serializers.ValidationError({
                         'posicion': f'No se puede agregar más dispositivos. Límite de {Posicion.MAX_DISPOSITIVOS} alcanzado'
                     })
@@ -183,7 +235,6 @@ class DispositivoSerializer(serializers.ModelSerializer):
                 dispositivo = super().create(validated_data)
                 
                 if posicion:
-                    posicion.dispositivos.add(dispositivo)
                     Movimiento.objects.create(
                         dispositivo=dispositivo,
                         posicion_origen=None,
@@ -214,31 +265,22 @@ class DispositivoSerializer(serializers.ModelSerializer):
                 
                 # 2. Verificar límite en nueva posición
                 if nueva_posicion and nueva_posicion != posicion_anterior:
-                    if nueva_posicion.dispositivos.count() >= Posicion.MAX_DISPOSITIVOS:
+                    if nueva_posicion.ocupacion >= Posicion.MAX_DISPOSITIVOS:
                         raise serializers.ValidationError({
                             'posicion': f'No se puede mover. La posición ya tiene {Posicion.MAX_DISPOSITIVOS} dispositivos.'
                         })
                 
-                # 3. Remover de TODAS las posiciones anteriores (por si estaba en múltiples)
-                if 'posicion' in validated_data:
-                    for pos in instance.posiciones.all():
-                        pos.dispositivos.remove(instance)
-                
-                # 4. Actualizar campos normales
+                # 3. Actualizar campos normales (la posición es la FK del dispositivo)
                 for attr, value in validated_data.items():
                     setattr(instance, attr, value)
                 
-                # 5. Actualizar piso según nueva posición
+                # 4. Actualizar piso según nueva posición
                 if 'posicion' in validated_data:
                     instance.piso = nueva_posicion.piso if nueva_posicion else None
                 
                 instance.save()
                 
-                # 6. Agregar a nueva posición si existe
-                if nueva_posicion:
-                    nueva_posicion.dispositivos.add(instance)
-                
-                # 7. Registrar movimiento con observación detallada
+                # 5. Registrar movimiento con observación detallada
                 if posicion_anterior != nueva_posicion:
                     observacion = (
                         f"Reasignación completa de posición | "
@@ -277,7 +319,7 @@ class ServiciosSerializer(serializers.ModelSerializer):
 
 from rest_framework import serializers # type: ignore # type: ignore
 from django.db import transaction # type: ignore
-from .models import Posicion, Dispositivo, Movimiento
+from .models import Posicion, Dispositivo, Movimiento, CeldaPosicion, calcular_celdas
 from django.contrib.auth import get_user_model # type: ignore
 
 User = get_user_model()
@@ -312,33 +354,27 @@ class PosicionSerializer(serializers.ModelSerializer):
 
     def get_cantidad_dispositivos(self, obj):
         """Obtiene la cantidad de dispositivos asociados a la posición"""
-        return obj.dispositivos.count()
+        return obj.ocupacion
 
     def validate(self, data):
         """Validación personalizada para los datos de la posición"""
         instance = self.instance
         
-        # Validación de celdas combinadas
+        # Validación de celdas combinadas: una sola consulta a CeldaPosicion para toda la región
         merged_cells = data.get('mergedCells', [])
-        for cell in merged_cells:
-            row = cell.get('row')
-            col = cell.get('col')
-            
-            # Obtener los valores de sede y piso
+        if merged_cells:
             piso = data.get('piso', instance.piso if instance else None)
             sede = data.get('sede', instance.sede if instance else None)
-            
-            # Filtrar por piso, sede y celda combinada
-            query = Posicion.objects.filter(
-                piso=piso,
-                sede=sede,
-                mergedCells__contains=[{'row': row, 'col': col}]
+            celdas = calcular_celdas(
+                data.get('fila', instance.fila if instance else None),
+                data.get('columna', instance.columna if instance else None),
+                merged_cells
             )
-            
-            if instance:
-                query = query.exclude(id=instance.id)
-            
-            if query.exists():
+            ocupadas = CeldaPosicion.ocupadas(
+                getattr(sede, 'pk', sede), piso, celdas, excluir_posicion=instance.pk if instance else None
+            )
+            if ocupadas:
+                row, col = ocupadas[0]
                 raise serializers.ValidationError(f"La celda {row}-{col} ya está ocupada en el piso {piso} de la sede seleccionada.")
         
         # Validación de fila y columna
@@ -393,7 +429,7 @@ class PosicionSerializer(serializers.ModelSerializer):
                 # Asignar dispositivos si se proporcionaron
                 if dispositivos_data:
                     dispositivos_ids = [d.id if isinstance(d, Dispositivo) else d for d in dispositivos_data]
-                    dispositivos = Dispositivo.objects.filter(id__in=dispositivos_ids).select_related('sede')
+                    dispositivos = Dispositivo.objects.filter(id__in=dispositivos_ids).select_related('sede', 'posicion__sede')
                     
                     for dispositivo in dispositivos:
                         # Validar sede
@@ -402,28 +438,21 @@ class PosicionSerializer(serializers.ModelSerializer):
                                 'dispositivos': f'El dispositivo {dispositivo.serial} pertenece a la sede {dispositivo.sede.nombre}, no coincide con {instance.sede.nombre}'
                             })
                         
-                        # Remover de posiciones anteriores
-                        posiciones_anteriores = list(dispositivo.posiciones.all())
-                        for pos in posiciones_anteriores:
-                            pos.dispositivos.remove(dispositivo)
-                            
-                            # Registrar movimiento de salida
-                            if user:
-                                Movimiento.objects.create(
-                                    dispositivo=dispositivo,
-                                    posicion_origen=pos,
-                                    posicion_destino=None,
-                                    encargado=user,
-                                    sede=pos.sede,
-                                    observacion=(
-                                        f"Removido para reasignación | "
-                                        f"Destino: {instance.nombre} | "
-                                        f"Por: {user.username if user else 'Sistema'}"
-                                    )
+                        # Registrar la salida de la posición anterior
+                        pos = dispositivo.posicion
+                        if pos and user:
+                            Movimiento.objects.create(
+                                dispositivo=dispositivo,
+                                posicion_origen=pos,
+                                posicion_destino=None,
+                                encargado=user,
+                                sede=pos.sede,
+                                observacion=(
+                                    f"Removido para reasignación | "
+                                    f"Destino: {instance.nombre} | "
+                                    f"Por: {user.username if user else 'Sistema'}"
                                 )
-                        
-                        # Agregar a nueva posición
-                        instance.dispositivos.add(dispositivo)
+                            )
                         
                         # Registrar movimiento de entrada
                         if user:
@@ -496,8 +525,6 @@ class PosicionSerializer(serializers.ModelSerializer):
                         dispositivos_remover = Dispositivo.objects.filter(id__in=dispositivos_a_remover)
                         
                         for dispositivo in dispositivos_remover:
-                            instance.dispositivos.remove(dispositivo)
-                            
                             # Registrar movimiento
                             if user:
                                 Movimiento.objects.create(
@@ -521,7 +548,7 @@ class PosicionSerializer(serializers.ModelSerializer):
                     # Dispositivos a agregar
                     dispositivos_a_agregar = nuevos_dispositivos - dispositivos_actuales
                     if dispositivos_a_agregar:
-                        dispositivos_agregar = Dispositivo.objects.filter(id__in=dispositivos_a_agregar).select_related('sede')
+                        dispositivos_agregar = Dispositivo.objects.filter(id__in=dispositivos_a_agregar).select_related('sede', 'posicion__sede')
                         
                         for dispositivo in dispositivos_agregar:
                             # Validar que la sede del dispositivo coincida
@@ -530,28 +557,21 @@ class PosicionSerializer(serializers.ModelSerializer):
                                     'dispositivos': f'El dispositivo {dispositivo.serial} pertenece a la sede {dispositivo.sede.nombre}, no coincide con {instance.sede.nombre}'
                                 })
                             
-                            # Remover de cualquier posición anterior
-                            posiciones_anteriores = list(dispositivo.posiciones.all())
-                            for pos in posiciones_anteriores:
-                                pos.dispositivos.remove(dispositivo)
-                                
-                                # Registrar movimiento de salida
-                                if user:
-                                    Movimiento.objects.create(
-                                        dispositivo=dispositivo,
-                                        posicion_origen=pos,
-                                        posicion_destino=None,
-                                        encargado=user,
-                                        sede=pos.sede,
-                                        observacion=(
-                                            f"Removido para reasignación | "
-                                            f"Destino: {instance.nombre} | "
-                                            f"Por: {user.username if user else 'Sistema'}"
-                                        )
+                            # Registrar la salida de la posición anterior
+                            pos = dispositivo.posicion
+                            if pos and user:
+                                Movimiento.objects.create(
+                                    dispositivo=dispositivo,
+                                    posicion_origen=pos,
+                                    posicion_destino=None,
+                                    encargado=user,
+                                    sede=pos.sede,
+                                    observacion=(
+                                        f"Removido para reasignación | "
+                                        f"Destino: {instance.nombre} | "
+                                        f"Por: {user.username if user else 'Sistema'}"
                                     )
-                            
-                            # Agregar a nueva posición
-                            instance.dispositivos.add(dispositivo)
+                                )
                             
                             # Registrar movimiento de entrada
                             if user:
@@ -583,15 +603,68 @@ class PosicionSerializer(serializers.ModelSerializer):
 
 
 class HistorialSerializer(serializers.ModelSerializer):
-    dispositivo = DispositivoSerializer(read_only=True)
-    usuario = RolUserSerializer(read_only=True)
+    """
+    Historial compacto: el dispositivo y el usuario se devuelven como resúmenes
+    planos. Con expand (contexto o ?expand=dispositivo,usuario) se incluyen los
+    objetos completos, precargados por optimizar_queryset.
+    """
+    dispositivo = serializers.SerializerMethodField()
+    usuario = serializers.SerializerMethodField()
     tipo_cambio_display = serializers.CharField(source='get_tipo_cambio_display', read_only=True)
     fecha_formateada = serializers.SerializerMethodField()
-    
+
+    EXPANSIBLES = ('dispositivo', 'usuario')
+
+    # Columnas de las relaciones que usan los resúmenes
+    CAMPOS_RESUMEN = {
+        'dispositivo': ['id', 'serial', 'tipo', 'marca', 'modelo', 'placa_cu'],
+        'usuario': ['id', 'username', 'nombre', 'email'],
+    }
+
     class Meta:
         model = Historial
         fields = '__all__'
-    
+
+    @classmethod
+    def optimizar_queryset(cls, queryset, expand=()):
+        """Carga las relaciones en la misma consulta (resumen) o con un prefetch por relación (expand)."""
+        columnas = [f.name for f in Historial._meta.concrete_fields]
+        relacionadas = []
+        for relacion, campos in cls.CAMPOS_RESUMEN.items():
+            if relacion not in expand:
+                relacionadas.append(relacion)
+                columnas.extend(f'{relacion}__{campo}' for campo in campos)
+
+        queryset = queryset.select_related(*relacionadas).only(*columnas)
+        if 'dispositivo' in expand:
+            queryset = queryset.prefetch_related(Prefetch(
+                'dispositivo', queryset=DispositivoSerializer.optimizar_queryset(Dispositivo.objects.all())
+            ))
+        if 'usuario' in expand:
+            queryset = queryset.prefetch_related(Prefetch(
+                'usuario', queryset=RolUser.objects.prefetch_related('sedes')
+            ))
+        return queryset
+
+    def _expandir(self, relacion):
+        return relacion in self.context.get('expand', ())
+
+    def get_dispositivo(self, obj):
+        if obj.dispositivo_id is None:
+            return None
+        if self._expandir('dispositivo'):
+            return DispositivoSerializer(obj.dispositivo, context=self.context).data
+        dispositivo = obj.dispositivo
+        return {campo: getattr(dispositivo, campo) for campo in self.CAMPOS_RESUMEN['dispositivo']}
+
+    def get_usuario(self, obj):
+        if obj.usuario_id is None:
+            return None
+        if self._expandir('usuario'):
+            return RolUserSerializer(obj.usuario, context=self.context).data
+        usuario = obj.usuario
+        return {campo: getattr(usuario, campo) for campo in self.CAMPOS_RESUMEN['usuario']}
+
     def get_fecha_formateada(self, obj):
         return obj.fecha_modificacion.strftime("%d/%m/%Y %H:%M")
 
@@ -668,7 +741,7 @@ class MovimientoSerializer(serializers.ModelSerializer):
         
         if pos_destino:
             # Verificar que la posición destino no esté llena
-            if pos_destino.dispositivos.count() >= Posicion.MAX_DISPOSITIVOS:
+            if pos_destino.ocupacion >= Posicion.MAX_DISPOSITIVOS:
                 raise serializers.ValidationError(
                     {'posicion_destino': f'La posición ya tiene el máximo de {Posicion.MAX_DISPOSITIVOS} dispositivos'}
                 )
@@ -693,7 +766,18 @@ class MovimientoSerializer(serializers.ModelSerializer):
                 validated_data['encargado'] = user.roluser
         
         return super().create(validated_data)
-    
-    
-    
-    
\ No newline at end of file
+
+
+class TrabajoImportacionSerializer(serializers.ModelSerializer):
+    sede_nombre = serializers.CharField(source='sede.nombre', read_only=True)
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    progreso = serializers.FloatField(read_only=True)
+    filas_por_segundo = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = TrabajoImportacion
+        fields = [
+            'id', 'sede', 'sede_nombre', 'estado', 'estado_display', 'total_filas',
+            'filas_procesadas', 'progreso', 'filas_por_segundo', 'creados', 'actualizados',
+            'errores', 'mensaje_error', 'fecha_creacion', 'fecha_inicio', 'fecha_fin', 'ultimo_avance'
+        ]
@@ -0,0 +1,38 @@
+"""
+Sesiones en cache con renovación espaciada (SESSION_ENGINE = 'dispositivos.sesiones').
+
+Con SESSION_SAVE_EVERY_REQUEST Django guarda la sesión en cada petición para
+extender su vencimiento. Este backend la guarda en la cache SESSION_CACHE_ALIAS
+(en archivos por defecto: compartida por los workers del servidor y
+persistente entre reinicios, sin escribir en django_session) y solo la
+reescribe si cambió su contenido o si ya pasó SESION_FRACCION_RENOVACION de
+SESSION_COOKIE_AGE desde la última escritura. Con 300 s y 0.5 una sesión
+activa se escribe como mucho cada 150 s en lugar de en cada petición; a
+cambio, una sesión sin actividad vence entre 150 y 300 s después de la
+última petición.
+"""
+import time
+from datetime import datetime, timezone
+from django.conf import settings # type: ignore
+from django.contrib.sessions.backends.cache import SessionStore as CacheSessionStore # type: ignore
+
+RENOVADA = '_renovada'
+
+
+class SessionStore(CacheSessionStore):
+
+    def _intervalo_renovacion(self):
+        return self.get_session_cookie_age() * getattr(settings, 'SESION_FRACCION_RENOVACION', 0.5)
+
+    def save(self, must_create=False):
+        if not must_create and not self.modified and self.session_key is not None:
+            renovada = self._get_session().get(RENOVADA)
+            if renovada is not None and time.time() - renovada < self._intervalo_renovacion():
+                return
+        self._get_session(no_load=must_create)[RENOVADA] = time.time()
+        super().save(must_create)
+
+    def fecha_expiracion(self):
+        """Vencimiento real: última escritura más la duración de la sesión."""
+        renovada = self._get_session().get(RENOVADA, time.time())
+        return datetime.fromtimestamp(renovada + self.get_session_cookie_age(), tz=timezone.utc)
@@ -0,0 +1,118 @@
+"""
+Receptores que mantienen coherentes las estructuras derivadas (caches,
+estadísticas, índice de autocompletado, usuarios vigentes para los JWT)
+cuando cambian los datos.
+"""
+from collections import Counter
+from django.db import transaction # type: ignore
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete # type: ignore
+from django.dispatch import receiver # type: ignore
+from .models import Dispositivo, Movimiento, Posicion, RolUser, Sede, Servicios
+from .estadisticas import (
+    aplicar_deltas_dispositivos, aplicar_deltas_movimientos, clave_dispositivo,
+    clave_movimiento, invalidar_dashboard, trasladar_estadisticas_sede
+)
+from .autocompletado import actualizar_dispositivos, quitar_dispositivo
+from .autenticacion import actualizar_usuario
+from .cache import POSICIONES, SEDES, SERVICIOS, invalidar
+
+
+@receiver(post_save, sender=Dispositivo)
+@receiver(post_delete, sender=Dispositivo)
+def invalidar_estadisticas_dispositivo(sender, instance, **kwargs):
+    # Se invalida al confirmar para no cachear datos de una transacción que puede revertirse
+    transaction.on_commit(invalidar_dashboard)
+
+
+@receiver(post_save, sender=Dispositivo)
+def actualizar_estadisticas_dispositivo(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    actual = clave_dispositivo(instance)
+    deltas = Counter({actual: 1})
+    if not created:
+        # Estado previo tomado de la instantánea de from_db, sin consultar la base
+        anterior = clave_dispositivo(instance, anterior=True)
+        if anterior == actual:
+            return
+        deltas[anterior] -= 1
+    aplicar_deltas_dispositivos(deltas)
+
+
+@receiver(post_save, sender=Dispositivo)
+def indexar_autocompletado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(lambda: actualizar_dispositivos([instance]))
+
+
+@receiver(post_delete, sender=Dispositivo)
+def desindexar_autocompletado(sender, instance, **kwargs):
+    dispositivo_id = instance.pk
+    transaction.on_commit(lambda: quitar_dispositivo(dispositivo_id))
+
+
+@receiver(post_delete, sender=Dispositivo)
+def descontar_estadisticas_dispositivo(sender, instance, **kwargs):
+    aplicar_deltas_dispositivos(Counter({clave_dispositivo(instance, anterior=True): -1}))
+
+
+@receiver(post_delete, sender=Dispositivo)
+def liberar_ocupacion_posicion(sender, instance, **kwargs):
+    Posicion.ajustar_ocupacion({instance.valor_anterior('posicion_id'): -1})
+
+
+@receiver(post_save, sender=Movimiento)
+def contar_movimiento(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        aplicar_deltas_movimientos(Counter({clave_movimiento(instance): 1}))
+
+
+@receiver(post_delete, sender=Movimiento)
+def descontar_movimiento(sender, instance, **kwargs):
+    aplicar_deltas_movimientos(Counter({clave_movimiento(instance): -1}))
+
+
+@receiver(pre_delete, sender=Sede)
+def liberar_estadisticas_sede(sender, instance, **kwargs):
+    trasladar_estadisticas_sede(instance.pk)
+
+
+@receiver(post_save, sender=Sede)
+@receiver(post_delete, sender=Sede)
+def invalidar_cache_sedes(sender, **kwargs):
+    transaction.on_commit(lambda: invalidar(SEDES))
+
+
+@receiver(post_save, sender=Servicios)
+@receiver(post_delete, sender=Servicios)
+@receiver(m2m_changed, sender=Servicios.sedes.through)
+def invalidar_cache_servicios(sender, **kwargs):
+    transaction.on_commit(lambda: invalidar(SERVICIOS))
+
+
+@receiver(post_save, sender=Posicion)
+@receiver(post_delete, sender=Posicion)
+@receiver(post_delete, sender=Dispositivo)  # libera un lugar en su posición
+def invalidar_cache_posiciones(sender, **kwargs):
+    transaction.on_commit(lambda: invalidar(POSICIONES))
+
+
+@receiver(post_save, sender=Dispositivo)
+def invalidar_cache_ocupacion(sender, instance, raw=False, **kwargs):
+    # Cambiar la posición del dispositivo cambia la ocupación que muestran plano y listados
+    if not raw and instance.campo_modificado('posicion_id'):
+        transaction.on_commit(lambda: invalidar(POSICIONES))
+
+
+@receiver(post_save, sender=RolUser)
+def actualizar_usuario_vigente(sender, instance, raw=False, **kwargs):
+    # Una desactivación invalida de inmediato los tokens del usuario en este proceso
+    if not raw:
+        usuario_id, activo = instance.pk, instance.is_active
+        transaction.on_commit(lambda: actualizar_usuario(usuario_id, activo))
+
+
+@receiver(post_delete, sender=RolUser)
+def revocar_usuario_eliminado(sender, instance, **kwargs):
+    usuario_id = instance.pk
+    transaction.on_commit(lambda: actualizar_usuario(usuario_id, False))
@@ -1,3 +1,1060 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import os
+import tempfile
+import time
+from unittest import mock, skipUnless
+import pandas as pd # type: ignore
+from openpyxl import load_workbook # type: ignore
+from django.core.exceptions import ValidationError # type: ignore
+from django.core.cache import cache # type: ignore
+from django.core.files.uploadedfile import SimpleUploadedFile # type: ignore
+from django.core.management import CommandError, call_command # type: ignore
+from django.db import connection, transaction # type: ignore
+from django.db.models import Count, F, Sum # type: ignore
+from django.test import LiveServerTestCase, TestCase, override_settings # type: ignore
+from django.utils import timezone # type: ignore
+from django.test.utils import CaptureQueriesContext # type: ignore
+from rest_framework.test import APIClient # type: ignore
+from .models import (
+    Sede, Servicios, Posicion, Dispositivo, CeldaPosicion, EstadisticaDispositivos, Historial, Movimiento, RolUser,
+    TrabajoImportacion
+)
+from .serializers import DispositivoSerializer, HistorialSerializer, PosicionSerializer
+from .estadisticas import calcular_tarjetas, recalcular_estadisticas
+from .historial import registrar_historial
+from .importacion import ImportadorDispositivos
+from .perfilado import RegistroConsultas, estadisticas as estadisticas_perfilado
+from .benchmarks import Escenario, comparar, medir
+from .carga import ErrorCarga, ejecutar_carga
+from .autenticacion import usuario_vigente
+from .sesiones import RENOVADA, SessionStore
+from . import autocompletado
 
-# Create your tests here.
+CACHES_LOCALES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'sesiones': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'sesiones'},
+}
+
+
+class ConsultasConstantesMixin:
+    """
+    Utilidades para comprobar que un endpoint o serializer ejecuta el mismo
+    número de consultas sin importar cuántas filas devuelve.
+    """
+
+    def contar_consultas(self, funcion):
+        with CaptureQueriesContext(connection) as contexto:
+            funcion()
+        return len(contexto.captured_queries)
+
+    def assertConsultasConstantes(self, funcion, crear_filas, tamanos=(1, 10)):
+        conteos = []
+        for cantidad in tamanos:
+            crear_filas(cantidad)
+            conteos.append(self.contar_consultas(funcion))
+        self.assertEqual(
+            len(set(conteos)), 1,
+            f"El número de consultas varía con la cantidad de filas: {dict(zip(tamanos, conteos))}"
+        )
+        return conteos[0]
+
+
+class DispositivoListadoConsultasTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.sede = Sede.objects.create(nombre='Sede Test', ciudad='Bogotá', direccion='Calle 1')
+        self.servicio = Servicios.objects.create(nombre='Servicio Test', codigo_analitico='ST-001')
+        self.creados = 0
+
+    def crear_dispositivos(self, cantidad):
+        for _ in range(cantidad):
+            self.creados += 1
+            posicion = Posicion.objects.create(
+                nombre=f'P{self.creados}', fila=self.creados, columna='A',
+                piso='PISO1', sede=self.sede, servicio=self.servicio
+            )
+            Dispositivo.objects.create(
+                tipo='MONITOR', marca='HP', modelo='P201', serial=f'SN{self.creados}',
+                sede=self.sede, posicion=posicion
+            )
+
+    def test_serializer_sin_consultas_por_fila(self):
+        def serializar():
+            queryset = DispositivoSerializer.optimizar_queryset(Dispositivo.objects.all())
+            datos = DispositivoSerializer(queryset, many=True).data
+            self.assertTrue(all(d['servicio_nombre'] == 'Servicio Test' for d in datos))
+
+        consultas = self.assertConsultasConstantes(serializar, self.crear_dispositivos)
+        self.assertEqual(consultas, 1)
+
+    def test_listado_consultas_constantes(self):
+        consultas = self.assertConsultasConstantes(
+            lambda: self.client.get('/api/dispositivos/'), self.crear_dispositivos
+        )
+        self.assertEqual(consultas, 1)
+
+    def test_listado_paginado_consultas_constantes(self):
+        self.assertConsultasConstantes(
+            lambda: self.client.get('/api/dispositivos/?page_size=5&fields=id,serial,servicio_nombre'),
+            self.crear_dispositivos
+        )
+
+
+class ImportadorConCarrera(ImportadorDispositivos):
+    """Otra importación crea el serial CARRERA mientras se procesa el lote."""
+
+    def _validar_longitudes(self, datos):
+        super()._validar_longitudes(datos)
+        if datos.get('serial') == 'CARRERA' and not Dispositivo.objects.filter(serial='CARRERA').exists():
+            Dispositivo.objects.bulk_create([
+                Dispositivo(tipo='MONITOR', marca='HP', modelo='E24', serial='CARRERA', sede=self.sede)
+            ])
+
+
+class ImportacionDispositivosTest(TestCase):
+
+    def setUp(self):
+        self.sede = Sede.objects.create(nombre='Sede A', ciudad='Bogotá', direccion='Calle 1')
+        self.otra_sede = Sede.objects.create(nombre='Sede B', ciudad='Cali', direccion='Calle 2')
+        self.posicion = Posicion.objects.create(nombre='P1', fila=1, columna='A', piso='PISO1', sede=self.sede)
+        self.posicion_otra_sede = Posicion.objects.create(
+            nombre='P9', fila=1, columna='A', piso='PISO1', sede=self.otra_sede
+        )
+
+    def importar(self, filas, importador=ImportadorDispositivos):
+        df = pd.DataFrame([
+            {'TIPO_DISPOSITIVO': 'MONITOR', 'FABRICANTE': 'HP', 'MODELO': 'E24', 'ESTADO': 'BUENO', **fila}
+            for fila in filas
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            return importador(self.sede).importar(df)
+
+    def test_crear_actualizar_y_ubicar(self):
+        existente = Dispositivo.objects.create(tipo='MONITOR', marca='HP', modelo='E24', serial='SN1', sede=self.sede)
+        resultado = self.importar([
+            {'SERIAL': 'SN1', 'FABRICANTE': 'LENOVO', 'POSICION': 'P1', 'PISO': 'PISO1'},
+            {'SERIAL': 'SN2', 'POSICION': 'P1'},
+        ])
+        self.assertEqual((resultado['created'], resultado['updated'], resultado['errors']), (1, 1, []))
+
+        existente.refresh_from_db()
+        self.assertEqual((existente.marca, existente.posicion_id), ('LENOVO', self.posicion.id))
+        self.posicion.refresh_from_db()
+        self.assertEqual(self.posicion.ocupacion, 2)
+        movimiento = Movimiento.objects.get(dispositivo=existente)
+        movimiento.full_clean()
+        self.assertEqual((movimiento.ubicacion_origen, movimiento.posicion_destino_id), ('BODEGA', self.posicion.id))
+
+    def test_dispositivo_de_otra_sede(self):
+        dispositivo = Dispositivo.objects.create(
+            tipo='MONITOR', marca='HP', modelo='E24', serial='SN1', sede=self.otra_sede,
+            posicion=self.posicion_otra_sede
+        )
+        # P9 no existe en la sede importada: el dispositivo llega sin posición
+        resultado = self.importar([{'SERIAL': 'SN1', 'POSICION': 'P9'}])
+        self.assertEqual((resultado['updated'], resultado['errors']), (1, []))
+
+        dispositivo.refresh_from_db()
+        self.assertEqual((dispositivo.sede_id, dispositivo.posicion_id), (self.sede.id, None))
+        self.posicion_otra_sede.refresh_from_db()
+        self.assertEqual(self.posicion_otra_sede.ocupacion, 0)
+        movimiento = Movimiento.objects.get(dispositivo=dispositivo)
+        movimiento.full_clean()
+        self.assertEqual(movimiento.ubicacion_destino, 'SEDE')
+
+    def test_fila_rechazada_por_la_base(self):
+        resultado = self.importar([{'SERIAL': 'SN1'}, {'SERIAL': 'CARRERA'}, {'SERIAL': 'SN3'}], ImportadorConCarrera)
+        self.assertEqual(resultado['created'], 2)
+        self.assertEqual(len(resultado['errors']), 1)
+        self.assertTrue(resultado['errors'][0].startswith('Fila 3:'))
+        self.assertEqual(
+            set(Dispositivo.objects.values_list('serial', flat=True)), {'SN1', 'CARRERA', 'SN3'}
+        )
+        self.assertEqual(Historial.objects.filter(tipo_cambio=Historial.TipoCambio.CREACION).count(), 2)
+
+
+def excel(filas):
+    salida = io.BytesIO()
+    pd.DataFrame(filas).to_excel(salida, index=False, engine='openpyxl')
+    return SimpleUploadedFile('dispositivos.xlsx', salida.getvalue())
+
+
+@override_settings(IMPORTACION_EN_SEGUNDO_PLANO=False, MEDIA_ROOT=tempfile.mkdtemp())
+class TrabajoImportacionTest(TestCase):
+
+    def setUp(self):
+        self.sede = Sede.objects.create(nombre='Sede A', ciudad='Bogotá', direccion='Calle 1')
+        self.usuario = RolUser.objects.create_user(
+            username='coordinador', email='coordinador@test.com', password='clave-segura-1', rol='coordinador'
+        )
+        self.usuario.sedes.add(self.sede)
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+
+    def subir(self, archivo):
+        return self.client.post(
+            '/api/importar-dispositivos/', {'file': archivo, 'sede_id': self.sede.id}, format='multipart'
+        )
+
+    def test_importacion_completa_borra_el_archivo(self):
+        respuesta = self.subir(excel([{'TIPO_DISPOSITIVO': 'MONITOR', 'FABRICANTE': 'HP', 'SERIAL': 'SN1'}]))
+        self.assertEqual(respuesta.status_code, 202)
+        trabajo = TrabajoImportacion.objects.get(pk=respuesta.data['trabajo_id'])
+        self.assertEqual((trabajo.estado, trabajo.creados), ('COMPLETADO', 1))
+        self.assertFalse(trabajo.archivo)
+
+    def test_archivo_ilegible(self):
+        respuesta = self.subir(SimpleUploadedFile('dispositivos.xlsx', b'no es un excel'))
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(TrabajoImportacion.objects.exists())
+
+    def test_reanudar_trabajo_detenido(self):
+        trabajo = TrabajoImportacion.objects.create(
+            archivo=excel([{'SERIAL': 'SN1'}, {'SERIAL': 'SN2'}]), sede=self.sede, usuario=self.usuario,
+            estado='PROCESANDO', ultimo_avance=timezone.now()
+        )
+        url = f'/api/importaciones/{trabajo.id}/reanudar/'
+        self.assertEqual(self.client.post(url).status_code, 400)
+
+        # El worker murió: sin avance desde hace una hora
+        TrabajoImportacion.objects.filter(pk=trabajo.pk).update(
+            ultimo_avance=timezone.now() - datetime.timedelta(hours=1)
+        )
+        respuesta = self.client.post(url)
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual((respuesta.data['estado'], respuesta.data['creados']), ('COMPLETADO', 2))
+
+    def test_trabajo_de_otra_sede(self):
+        trabajo = TrabajoImportacion.objects.create(archivo=excel([{'SERIAL': 'SN1'}]), sede=self.sede)
+        ajeno = RolUser.objects.create_user(
+            username='otro', email='otro@test.com', password='clave-segura-1', rol='coordinador'
+        )
+        cliente = APIClient()
+        cliente.force_authenticate(ajeno)
+        self.assertEqual(cliente.get(f'/api/importaciones/{trabajo.id}/').status_code, 404)
+        self.assertEqual(cliente.post(f'/api/importaciones/{trabajo.id}/reanudar/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/importaciones/{trabajo.id}/').status_code, 200)
+
+
+class ExportacionDispositivosTest(TestCase):
+
+    def setUp(self):
+        self.sede = Sede.objects.create(nombre='Sede A', ciudad='Bogotá', direccion='Calle 1')
+        otra = Sede.objects.create(nombre='Sede B', ciudad='Cali', direccion='Calle 2')
+        for i, sede in enumerate([self.sede, self.sede, otra]):
+            Dispositivo.objects.create(tipo='MONITOR', marca='HP', modelo='E24', serial=f'SN{i}', sede=sede)
+
+    def descargar(self, **params):
+        respuesta = self.client.get('/exportar-excel/', {'sede': self.sede.id, **params})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.streaming)
+        return b''.join(respuesta.streaming_content)
+
+    def test_csv(self):
+        contenido = self.descargar(formato='csv', columnas='serial,sede__nombre').decode('utf-8-sig')
+        self.assertEqual(
+            list(csv.reader(io.StringIO(contenido))),
+            [['serial', 'sede__nombre'], ['SN0', 'Sede A'], ['SN1', 'Sede A']]
+        )
+
+    def test_xlsx(self):
+        libro = load_workbook(io.BytesIO(self.descargar(columnas='serial,tipo')), read_only=True)
+        self.assertEqual(
+            [list(fila) for fila in libro['Dispositivos'].iter_rows(values_only=True)],
+            [['serial', 'tipo'], ['SN0', 'MONITOR'], ['SN1', 'MONITOR']]
+        )
+
+    def test_columna_invalida(self):
+        self.assertEqual(self.client.get('/exportar-excel/', {'columnas': 'clave'}).status_code, 400)
+
+
+class EstadisticasIncrementalesTest(TestCase):
+
+    def contadores(self):
+        return sorted(
+            EstadisticaDispositivos.objects.exclude(total=0)
+            .values_list('sede_id', 'tipo', 'estado', 'estado_uso', 'total'),
+            key=repr
+        )
+
+    def test_contadores_coinciden_con_recalculo(self):
+        sede = Sede.objects.create(nombre='Sede A', ciudad='Bogotá', direccion='Calle 1')
+        otra = Sede.objects.create(nombre='Sede B', ciudad='Cali', direccion='Calle 2')
+        dispositivos = [
+            Dispositivo.objects.create(
+                tipo='MONITOR', marca='HP', modelo='P201', serial=f'SN{i}',
+                sede=sede, estado='BUENO', estado_uso='DISPONIBLE'
+            )
+            for i in range(4)
+        ]
+        dispositivos[0].estado = 'MALO'
+        dispositivos[0].sede = otra
+        dispositivos[0].save()
+        dispositivos[1].delete()
+        Movimiento.objects.create(dispositivo=dispositivos[2], sede=sede)
+        otra.delete()
+
+        incrementales = self.contadores()
+        recalcular_estadisticas()
+        self.assertEqual(incrementales, self.contadores())
+
+        tarjetas = {t['title']: t['value'] for t in calcular_tarjetas(sede.id)}
+        self.assertEqual(tarjetas['Total dispositivos'], 2)
+        self.assertEqual(tarjetas['Buen estado'], 2)
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class TarjetasDashboardTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.sede = Sede.objects.create(nombre='Sede A', ciudad='Bogotá', direccion='Calle 1')
+
+    def tarjetas(self):
+        respuesta = self.client.get(f'/api/dashboard/?sede={self.sede.id}')
+        self.assertEqual(respuesta.status_code, 200)
+        return {t['title']: t['value'] for t in respuesta.json()['cardsData']}
+
+    def test_tarjetas_cacheadas_siguen_los_cambios(self):
+        self.assertEqual(self.tarjetas()['Total dispositivos'], 0)
+        with self.assertNumQueries(0):
+            self.tarjetas()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dispositivo = Dispositivo.objects.create(
+                tipo='MONITOR', marca='HP', modelo='E24', serial='SN1', sede=self.sede,
+                estado='BUENO', estado_uso='DISPONIBLE'
+            )
+        self.assertEqual((self.tarjetas()['Total dispositivos'], self.tarjetas()['Buen estado']), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dispositivo.estado = 'MALO'
+            dispositivo.save()
+        self.assertEqual((self.tarjetas()['Total dispositivos'], self.tarjetas()['Buen estado']), (1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dispositivo.delete()
+        self.assertEqual(self.tarjetas()['Total dispositivos'], 0)
+
+
+class SeguimientoCambiosTest(TestCase):
+
+    def test_actualizacion_sin_select_previo(self):
+        sede = Sede.objects.create(nombre='Sede A', ciudad='Bogotá', direccion='Calle 1')
+        with self.captureOnCommitCallbacks(execute=True):
+            Dispositivo.objects.create(tipo='MONITOR', marca='HP', modelo='P201', serial='SN1', sede=sede)
+        dispositivo = Dispositivo.objects.get(serial='SN1')
+        dispositivo.marca = 'Dell'
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as contexto:
+                dispositivo.save()
+
+        self.assertTrue(contexto.captured_queries[0]['sql'].startswith('UPDATE'))
+        historial = dispositivo.historial.filter(tipo_cambio='MODIFICACION').get()
+        self.assertEqual(historial.cambios, {'marca': {'antes': 'HP', 'despues': 'Dell'}})
+
+    def test_campos_diferidos(self):
+        sede = Sede.objects.create(nombre='Sede A', ciudad='Bogotá', direccion='Calle 1')
+        with self.captureOnCommitCallbacks(execute=True):
+            Dispositivo.objects.create(tipo='MONITOR', marca='HP', modelo='P201', serial='SN1', sede=sede)
+        # Un campo diferido se lee de la base en lugar de darse por no modificado
+        dispositivo = Dispositivo.objects.only('id', 'serial').get(serial='SN1')
+        dispositivo.marca = 'Dell'
+        self.assertEqual(dispositivo.valor_anterior('marca'), 'HP')
+        self.assertTrue(dispositivo.campo_modificado('marca'))
+        self.assertFalse(dispositivo.campo_modificado('modelo'))
+
+
+class ArchivarHistorialTest(TestCase):
+    """El comando requiere PostgreSQL: se reemplazan las operaciones sobre las particiones."""
+    MODULO = 'dispositivos.management.commands.archivar_historial'
+
+    def ejecutar(self, adjuntas=(), desprendidas=(), falla=None):
+        self.acciones = []
+
+        def archivar(nombre, directorio):
+            if nombre == falla:
+                raise OSError('Disco lleno')
+            self.acciones.append(('archivar', nombre))
+            return f'{directorio}/{nombre}.csv.gz'
+
+        vencidas = [(nombre, datetime.date(2000, 1, 1), datetime.date(2000, 2, 1)) for nombre in adjuntas]
+        with mock.patch(f'{self.MODULO}.es_particionada', return_value=True), \
+                mock.patch(f'{self.MODULO}.particiones', return_value=vencidas), \
+                mock.patch(f'{self.MODULO}.particiones_desprendidas', return_value=list(desprendidas)), \
+                mock.patch(f'{self.MODULO}.archivar_particion', side_effect=archivar), \
+                mock.patch(f'{self.MODULO}.desprender_particion', side_effect=lambda n: self.acciones.append(('desprender', n))), \
+                mock.patch(f'{self.MODULO}.eliminar_particion', side_effect=lambda n: self.acciones.append(('eliminar', n))):
+            call_command('archivar_historial', directorio='archivo', stdout=io.StringIO())
+
+    def test_archiva_antes_de_desprender(self):
+        self.ejecutar(adjuntas=['dispositivos_historial_p2000_01'])
+        self.assertEqual([accion for accion, _ in self.acciones], ['archivar', 'desprender', 'eliminar'])
+
+    def test_volcado_fallido_no_desprende(self):
+        with self.assertRaises(OSError):
+            self.ejecutar(adjuntas=['dispositivos_historial_p2000_01'], falla='dispositivos_historial_p2000_01')
+        self.assertEqual(self.acciones, [])
+
+    def test_retoma_tablas_desprendidas(self):
+        self.ejecutar(desprendidas=['dispositivos_historial_p1999_12'])
+        self.assertEqual(self.acciones, [
+            ('archivar', 'dispositivos_historial_p1999_12'), ('eliminar', 'dispositivos_historial_p1999_12')
+        ])
+
+
+class HistorialDiferidoTest(TestCase):
+
+    def test_eventos_en_un_solo_insert_al_confirmar(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for i in range(5):
+                registrar_historial(cambios={'evento': i}, tipo_cambio=Historial.TipoCambio.OTRO)
+            try:
+                with transaction.atomic():
+                    registrar_historial(cambios={'evento': 'revertido'}, tipo_cambio=Historial.TipoCambio.OTRO)
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertFalse(Historial.objects.exists())
+
+        with CaptureQueriesContext(connection) as contexto:
+            for callback in callbacks:
+                callback()
+
+        inserts = [q for q in contexto.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            sorted(Historial.objects.values_list('cambios__evento', flat=True)), list(range(5))
+        )
+
+    def test_lote_nuevo_tras_revertir(self):
+        # El lote de un savepoint revertido no se reutiliza en el siguiente
+        with self.captureOnCommitCallbacks(execute=True):
+            for intento in range(2):
+                try:
+                    with transaction.atomic():
+                        registrar_historial(cambios={'evento': intento}, tipo_cambio=Historial.TipoCambio.OTRO)
+                        if intento == 0:
+                            raise ValueError
+                except ValueError:
+                    pass
+        self.assertEqual(list(Historial.objects.values_list('cambios__evento', flat=True)), [1])
+
+    def test_evento_invalido_no_descarta_el_lote(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_historial(cambios={'evento': 0}, tipo_cambio=Historial.TipoCambio.OTRO)
+            registrar_historial(cambios={'evento': 1}, tipo_cambio=None)
+            registrar_historial(cambios={'evento': 2}, tipo_cambio=Historial.TipoCambio.OTRO)
+        self.assertEqual(sorted(Historial.objects.values_list('cambios__evento', flat=True)), [0, 2])
+
+
+class HistorialListadoConsultasTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.sede = Sede.objects.create(nombre='Sede Test', ciudad='Bogotá', direccion='Calle 1')
+        self.usuario = RolUser.objects.create_user(
+            username='auditor', email='auditor@test.com', password='clave-segura-1'
+        )
+        self.creados = 0
+
+    def crear_eventos(self, cantidad):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(cantidad):
+                self.creados += 1
+                dispositivo = Dispositivo.objects.create(
+                    tipo='MONITOR', marca='HP', modelo='P201', serial=f'SN{self.creados}', sede=self.sede
+                )
+                registrar_historial(
+                    dispositivo=dispositivo, usuario=self.usuario,
+                    cambios={'evento': self.creados}, tipo_cambio=Historial.TipoCambio.OTRO
+                )
+
+    def test_listado_compacto(self):
+        self.assertConsultasConstantes(lambda: self.client.get('/api/historial/'), self.crear_eventos)
+        fila = self.client.get('/api/historial/').json()['results'][0]
+        self.assertEqual(set(fila['dispositivo']), set(HistorialSerializer.CAMPOS_RESUMEN['dispositivo']))
+        self.assertEqual(set(fila['usuario']), set(HistorialSerializer.CAMPOS_RESUMEN['usuario']))
+
+    def test_listado_expandido(self):
+        self.assertConsultasConstantes(
+            lambda: self.client.get('/api/historial/?expand=dispositivo,usuario'), self.crear_eventos
+        )
+        self.assertEqual(self.client.get('/api/historial/?expand=otro').status_code, 400)
+
+
+class BusquedaDispositivosTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.sede = Sede.objects.create(nombre='Sede Test', ciudad='Bogotá', direccion='Calle 1')
+        with self.captureOnCommitCallbacks(execute=True):
+            for serial, marca, modelo in [
+                ('XAB123', 'HP', 'ProDesk 400'),
+                ('AB123', 'Lenovo', 'ThinkCentre'),
+                ('ZZ9', 'HP', 'AB123 Mini'),
+                ('QQ1', 'Dell', 'Optiplex'),
+            ]:
+                Dispositivo.objects.create(tipo='COMPUTADOR', marca=marca, modelo=modelo, serial=serial, sede=self.sede)
+
+    def test_orden_por_relevancia(self):
+        respuesta = self.client.get('/api/dispositivos/search/?q=ab123')
+        self.assertEqual(respuesta.status_code, 200)
+        seriales = [d['serial'] for d in respuesta.json()['data']]
+        self.assertEqual(seriales, ['AB123', 'XAB123', 'ZZ9'])
+
+    def test_todos_los_terminos(self):
+        respuesta = self.client.get('/api/dispositivos/search/?q=hp%20prodesk')
+        self.assertEqual([d['serial'] for d in respuesta.json()['data']], ['XAB123'])
+
+    def test_sin_texto(self):
+        self.assertEqual(self.client.get('/api/dispositivos/search/').status_code, 400)
+
+    def test_historial_por_dispositivo(self):
+        dispositivo = Dispositivo.objects.get(serial='QQ1')
+        respuesta = self.client.get('/api/historial/?search=optiplex')
+        self.assertTrue(respuesta.json()['results'])
+        self.assertEqual({f['dispositivo']['id'] for f in respuesta.json()['results']}, {dispositivo.id})
+
+
+class AutocompletadoTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.sede = Sede.objects.create(nombre='Sede Test', ciudad='Bogotá', direccion='Calle 1')
+        self.monitor = Dispositivo.objects.create(
+            tipo='MONITOR', marca='HP', modelo='ProDesk 400', serial='HP400X', placa_cu='CU-77', sede=self.sede
+        )
+        Dispositivo.objects.create(tipo='MONITOR', marca='HP', modelo='E24', serial='HP4', sede=self.sede)
+        autocompletado.construir_indice()
+
+    def tearDown(self):
+        autocompletado._indice = None
+
+    def seriales(self, q):
+        respuesta = self.client.get(f'/api/dispositivos/autocomplete/?q={q}')
+        self.assertEqual(respuesta.status_code, 200)
+        return [d['serial'] for d in respuesta.json()['data']], respuesta.json()['fuente']
+
+    def test_prefijos_desde_el_indice(self):
+        self.assertEqual(self.seriales('hp4'), (['HP4', 'HP400X'], 'indice'))
+        self.assertEqual(self.seriales('cu-7')[0], ['HP400X'])
+        self.assertEqual(self.seriales('400')[0], ['HP400X'])
+
+    def test_senales_actualizan_el_indice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.monitor.serial = 'ZX1'
+            self.monitor.save()
+        self.assertEqual(self.seriales('zx')[0], ['ZX1'])
+        self.assertEqual(self.seriales('hp400')[0], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.monitor.delete()
+        self.assertEqual(self.seriales('zx')[0], [])
+
+    @override_settings(AUTOCOMPLETADO_INDICE=False)
+    def test_consulta_a_la_base(self):
+        self.assertEqual(self.seriales('hp4'), (['HP4', 'HP400X'], 'db'))
+        self.assertEqual(self.client.get('/api/dispositivos/autocomplete/').status_code, 400)
+
+    @skipUnless(hasattr(os, 'fork'), "Requiere fork()")
+    def test_hijo_no_hereda_la_carga_en_curso(self):
+        # Como un worker de gunicorn --preload creado mientras el padre construía el índice
+        autocompletado._cargando.set()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                os._exit(1 if autocompletado._cargando.is_set() or autocompletado._pendientes else 0)
+            _, estado = os.waitpid(pid, 0)
+        finally:
+            autocompletado._cargando.clear()
+        self.assertEqual(os.waitstatus_to_exitcode(estado), 0)
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class CacheVistasTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sede = Sede.objects.create(nombre='Sede Test', ciudad='Bogotá', direccion='Calle 1')
+
+    def test_sedes_cacheadas_e_invalidadas(self):
+        primera = self.client.get('/api/sede/')
+        self.assertEqual(primera['X-Cache'], 'MISS')
+
+        with CaptureQueriesContext(connection) as contexto:
+            segunda = self.client.get('/api/sede/')
+        self.assertEqual(segunda['X-Cache'], 'HIT')
+        self.assertEqual(len(contexto.captured_queries), 0)
+        self.assertEqual(segunda.json(), primera.json())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Sede.objects.create(nombre='Sede Nueva', ciudad='Cali', direccion='Calle 2')
+        tercera = self.client.get('/api/sede/')
+        self.assertEqual(tercera['X-Cache'], 'MISS')
+        self.assertEqual(len(tercera.json()['sedes']), 2)
+
+    def test_clave_por_sede(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            otra = Sede.objects.create(nombre='Sede Dos', ciudad='Cali', direccion='Calle 2')
+            Posicion.objects.create(nombre='P1', fila=1, columna='A', piso='PISO1', sede=self.sede)
+            Posicion.objects.create(nombre='P2', fila=1, columna='A', piso='PISO1', sede=otra)
+        self.client.get(f'/api/sedes/{self.sede.id}/posiciones/')
+        respuesta = self.client.get(f'/api/sedes/{otra.id}/posiciones/')
+        self.assertEqual(respuesta['X-Cache'], 'MISS')
+        self.assertEqual([p['nombre'] for p in respuesta.json()], ['P2'])
+
+    def test_colores_pisos(self):
+        respuesta = self.client.get('/api/posiciones/colores-pisos/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('pisos', respuesta.json())
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class PlanoPisoTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.sede = Sede.objects.create(nombre='Sede Test', ciudad='Bogotá', direccion='Calle 1')
+        self.servicio = Servicios.objects.create(nombre='Servicio Test', codigo_analitico='ST-001', color='#FF0000')
+        self.url = f'/api/sedes/{self.sede.id}/pisos/PISO1/plano/'
+        self.creadas = 0
+
+    def crear_posiciones(self, cantidad):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(cantidad):
+                self.creadas += 1
+                Posicion.objects.create(
+                    nombre=f'P{self.creadas}', fila=self.creadas, columna='B', piso='PISO1',
+                    sede=self.sede, servicio=self.servicio
+                )
+
+    def test_una_consulta(self):
+        def pedir():
+            cache.clear()
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.assertConsultasConstantes(pedir, self.crear_posiciones), 1)
+
+        celda = self.client.get(self.url).json()['celdas']['1']['B']
+        self.assertEqual(celda['servicio']['color'], '#FF0000')
+        self.assertEqual(celda['cantidad_dispositivos'], 0)
+
+    def test_etag(self):
+        self.crear_posiciones(2)
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.json()['filas'], 2)
+
+        with CaptureQueriesContext(connection) as contexto:
+            no_modificado = self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(no_modificado.status_code, 304)
+        self.assertEqual(len(contexto.captured_queries), 0)
+
+        self.crear_posiciones(1)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 200)
+
+
+class CeldasPosicionTest(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.sede = Sede.objects.create(nombre='Sede Test', ciudad='Bogotá', direccion='Calle 1')
+        self.bloque = Posicion.objects.create(
+            nombre='Bloque', fila=1, columna='A', piso='PISO1', sede=self.sede,
+            mergedCells=[{'row': 1, 'col': 'A'}, {'row': 1, 'col': 'B'}, {'row': 2, 'col': 'A'}, {'row': 2, 'col': 'b'}]
+        )
+
+    def celdas(self, posicion):
+        return set(posicion.celdas_ocupadas.values_list('fila', 'columna'))
+
+    def test_celdas_mantenidas_al_guardar(self):
+        self.assertEqual(self.celdas(self.bloque), {(1, 'A'), (1, 'B'), (2, 'A'), (2, 'B')})
+
+        self.bloque.mergedCells = [{'row': 1, 'col': 'A'}, {'row': 1, 'col': 'B'}]
+        self.bloque.save()
+        self.assertEqual(self.celdas(self.bloque), {(1, 'A'), (1, 'B')})
+
+        self.bloque.piso = 'PISO2'
+        self.bloque.save()
+        self.assertEqual(set(CeldaPosicion.objects.values_list('piso', flat=True)), {'PISO2'})
+
+    def test_region_ocupada_una_consulta(self):
+        celdas = [{'row': fila, 'col': col} for fila in range(1, 21) for col in 'BCDEFGHIJK']
+        serializer = PosicionSerializer(data={
+            'nombre': 'Nueva', 'fila': 1, 'columna': 'B', 'piso': 'PISO1', 'sede': self.sede.id,
+            'mergedCells': celdas
+        })
+        with CaptureQueriesContext(connection) as contexto:
+            self.assertFalse(serializer.is_valid())
+        self.assertIn('1-B', str(serializer.errors))
+        consultas = [q['sql'] for q in contexto.captured_queries if 'celdaposicion' in q['sql']]
+        self.assertEqual(len(consultas), 1)
+
+    def test_region_libre(self):
+        serializer = PosicionSerializer(data={
+            'nombre': 'Nueva', 'fila': 3, 'columna': 'A', 'piso': 'PISO1', 'sede': self.sede.id,
+            'mergedCells': [{'row': 3, 'col': 'A'}, {'row': 3, 'col': 'B'}]
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        posicion = serializer.save()
+        self.assertEqual(self.celdas(posicion), {(3, 'A'), (3, 'B')})
+
+
+class TrasladoMasivoTest(ConsultasConstantesMixin, TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.usuario = RolUser.objects.create_user(username='mover', email='mover@test.com', password='clave-segura-1')
+        self.client.force_authenticate(self.usuario)
+        self.sede = Sede.objects.create(nombre='Sede Test', ciudad='Bogotá', direccion='Calle 1')
+        self.otra_sede = Sede.objects.create(nombre='Sede Dos', ciudad='Cali', direccion='Calle 2')
+        self.creados = 0
+
+    def crear_posicion(self, sede=None):
+        self.creados += 1
+        return Posicion.objects.create(
+            nombre=f'P{self.creados}', fila=self.creados, columna='A', piso='PISO1', sede=sede or self.sede
+        )
+
+    def crear_dispositivo(self):
+        self.creados += 1
+        return Dispositivo.objects.create(tipo='MONITOR', marca='HP', modelo='E24', serial=f'SN{self.creados}', sede=self.sede)
+
+    def trasladar(self, pares, **extra):
+        return self.client.post('/api/movimientos/trasladar/', {
+            'movimientos': [{'dispositivo': d, 'posicion_destino': p} for d, p in pares], **extra
+        }, format='json')
+
+    def test_resultados_por_item(self):
+        destino = self.crear_posicion()
+        ajena = self.crear_posicion(self.otra_sede)
+        dispositivos = [self.crear_dispositivo() for _ in range(Posicion.MAX_DISPOSITIVOS + 1)]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.trasladar(
+                [(d.id, destino.id) for d in dispositivos] + [(dispositivos[0].id, ajena.id), (999999, destino.id)]
+            )
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual(datos['movidos'], Posicion.MAX_DISPOSITIVOS)
+        self.assertEqual([r['ok'] for r in datos['resultados']], [True] * 5 + [False] * 3)
+
+        self.assertEqual(destino.dispositivos.count(), Posicion.MAX_DISPOSITIVOS)
+        self.assertEqual(Movimiento.objects.filter(posicion_destino=destino).count(), Posicion.MAX_DISPOSITIVOS)
+        self.assertEqual(Historial.objects.filter(tipo_cambio=Historial.TipoCambio.MOVIMIENTO).count(), Posicion.MAX_DISPOSITIVOS)
+
+        # Ida y vuelta a bodega: los movimientos cumplen Movimiento.clean
+        self.trasladar([(dispositivos[0].id, None)])
+        for movimiento in Movimiento.objects.filter(dispositivo=dispositivos[0]):
+            movimiento.full_clean()
+            self.assertIsNotNone(movimiento.fecha_confirmacion)
+
+    def test_atomico(self):
+        destino = self.crear_posicion()
+        dispositivo = self.crear_dispositivo()
+        respuesta = self.trasladar([(dispositivo.id, destino.id), (999999, destino.id)], atomico=True)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['movidos'], 0)
+        self.assertFalse(destino.dispositivos.exists())
+
+        # "false" como texto no activa el modo atómico
+        respuesta = self.trasladar([(dispositivo.id, destino.id), (999999, destino.id)], atomico='false')
+        self.assertEqual((respuesta.status_code, respuesta.json()['movidos']), (200, 1))
+
+    def test_consultas_constantes(self):
+        pares = []
+
+        def crear(cantidad):
+            for _ in range(cantidad):
+                pares.append((self.crear_dispositivo().id, self.crear_posicion().id))
+
+        def trasladar():
+            # Ida y vuelta a "sin posición" para que cada llamada mueva todos los dispositivos
+            self.assertEqual(self.trasladar(pares).json()['errores'], 0)
+            self.assertEqual(self.trasladar([(d, None) for d, _ in pares]).json()['errores'], 0)
+
+        # La primera llamada crea las filas de contadores del día
+        crear(1)
+        trasladar()
+        self.assertConsultasConstantes(trasladar, crear)
+
+
+class OcupacionPosicionTest(TestCase):
+
+    def setUp(self):
+        self.sede = Sede.objects.create(nombre='Sede Test', ciudad='Bogotá', direccion='Calle 1')
+        self.posicion = Posicion.objects.create(nombre='P1', fila=1, columna='A', piso='PISO1', sede=self.sede)
+        self.otra = Posicion.objects.create(nombre='P2', fila=2, columna='A', piso='PISO1', sede=self.sede)
+
+    def crear_dispositivo(self, numero, posicion=None):
+        return Dispositivo.objects.create(
+            tipo='MONITOR', marca='HP', modelo='E24', serial=f'SN{numero}', sede=self.sede, posicion=posicion
+        )
+
+    def ocupacion(self, posicion):
+        posicion.refresh_from_db(fields=['ocupacion'])
+        return posicion.ocupacion
+
+    def test_contador_sigue_al_dispositivo(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dispositivo = self.crear_dispositivo(1, self.posicion)
+            self.crear_dispositivo(2, self.posicion)
+        self.assertEqual(self.ocupacion(self.posicion), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dispositivo.posicion = self.otra
+            dispositivo.save()
+        self.assertEqual((self.ocupacion(self.posicion), self.ocupacion(self.otra)), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dispositivo.delete()
+        self.assertEqual(self.ocupacion(self.otra), 0)
+
+    def test_mover_instancia_diferida(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_dispositivo(1, self.posicion)
+        dispositivo = Dispositivo.objects.only('id', 'serial').get(serial='SN1')
+        with self.captureOnCommitCallbacks(execute=True):
+            dispositivo.posicion = self.otra
+            dispositivo.save()
+        self.assertEqual((self.ocupacion(self.posicion), self.ocupacion(self.otra)), (0, 1))
+        movimiento = Movimiento.objects.get(dispositivo=dispositivo)
+        self.assertEqual((movimiento.posicion_origen_id, movimiento.posicion_destino_id), (self.posicion.id, self.otra.id))
+
+        # La validación de capacidad también aplica a instancias diferidas
+        with self.captureOnCommitCallbacks(execute=True):
+            for numero in range(2, Posicion.MAX_DISPOSITIVOS + 2):
+                self.crear_dispositivo(numero, self.posicion)
+        dispositivo = Dispositivo.objects.only('id').get(serial='SN1')
+        dispositivo.posicion = self.posicion
+        with self.assertRaises(ValidationError):
+            dispositivo.save()
+
+    def test_guardar_posicion_no_pisa_el_contador(self):
+        posicion = Posicion.objects.get(pk=self.posicion.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_dispositivo(1, self.posicion)
+        posicion.nombre = 'Renombrada'
+        posicion.save()
+        self.assertEqual(self.ocupacion(posicion), 1)
+
+    def test_posicion_llena(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for numero in range(Posicion.MAX_DISPOSITIVOS):
+                self.crear_dispositivo(numero, self.posicion)
+        with self.assertRaises(ValidationError):
+            Posicion.ajustar_ocupacion({self.posicion.id: 1, self.otra.id: 1})
+        # Ningún cambio parcial: la otra posición tampoco se ocupó
+        self.assertEqual((self.ocupacion(self.posicion), self.ocupacion(self.otra)), (Posicion.MAX_DISPOSITIVOS, 0))
+
+    def test_asignar_desde_la_posicion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dispositivo = self.crear_dispositivo(1, self.otra)
+            serializer = PosicionSerializer(self.posicion, data={'dispositivos': [dispositivo.id]}, partial=True)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            serializer.save()
+        dispositivo.refresh_from_db()
+        self.assertEqual(dispositivo.posicion_id, self.posicion.id)
+        self.assertEqual((self.ocupacion(self.posicion), self.ocupacion(self.otra)), (1, 0))
+        self.assertEqual(list(self.posicion.dispositivos.all()), [dispositivo])
+
+
+@override_settings(PERFILADO_CONSULTAS=True, CACHES=CACHES_LOCALES)
+class PerfilConsultasTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        estadisticas_perfilado.limpiar()
+        self.client = APIClient()
+        self.sedes = [
+            Sede.objects.create(nombre=f'Sede {i}', ciudad='Bogotá', direccion='Calle 1') for i in range(3)
+        ]
+
+    def test_cabeceras(self):
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get('/api/sede/')
+        self.assertEqual(respuesta['X-Query-Count'], str(len(contexto)))
+        self.assertIn('db;dur=', respuesta['Server-Timing'])
+        self.assertIn('render;dur=', respuesta['Server-Timing'])
+
+    def test_consultas_repetidas(self):
+        registro = RegistroConsultas()
+        with connection.execute_wrapper(registro):
+            for sede in self.sedes:
+                Sede.objects.get(pk=sede.pk)
+            Sede.objects.filter(pk__in=[s.pk for s in self.sedes]).count()
+        self.assertEqual(registro.total, 4)
+        self.assertEqual(list(registro.duplicadas().values()), [3])
+
+    def test_estadisticas_por_endpoint(self):
+        self.client.get(f'/api/sedes/{self.sedes[0].pk}/posiciones/')
+        self.client.get(f'/api/sedes/{self.sedes[1].pk}/posiciones/')
+        admin = RolUser.objects.create_user(username='admin', email='admin@test.com', password='clave-segura-1', rol='admin')
+        self.client.force_authenticate(admin)
+
+        datos = self.client.get('/api/perfilado/').json()['endpoints']
+        endpoint = next(e for e in datos if e['endpoint'] == 'GET api/sedes/<int:sede_id>/posiciones/')
+        self.assertEqual(endpoint['peticiones'], 2)
+
+
+class GenerarInventarioTest(TestCase):
+
+    def test_inventario_coherente(self):
+        call_command(
+            'generate_inventory', sedes=2, pisos=2, posiciones=30, servicios=3, dispositivos=400,
+            lote=150, stdout=io.StringIO()
+        )
+        self.assertEqual(Sede.objects.count(), 2)
+        self.assertEqual(Posicion.objects.count(), 2 * 2 * 30)
+        self.assertEqual(Dispositivo.objects.count(), 400)
+        # La ocupación generada coincide con los dispositivos de cada posición
+        self.assertFalse(
+            Posicion.objects.annotate(total=Count('dispositivos')).exclude(ocupacion=F('total')).exists()
+        )
+        self.assertEqual(
+            CeldaPosicion.objects.count(),
+            sum(len(p.celdas()) for p in Posicion.objects.all())
+        )
+        self.assertTrue(Movimiento.objects.exists())
+        self.assertEqual(
+            EstadisticaDispositivos.objects.aggregate(total=Sum('total'))['total'], 400
+        )
+        with self.assertRaises(CommandError):
+            call_command('generate_inventory', dispositivos=1, stdout=io.StringIO())
+
+
+class BenchmarksTest(TestCase):
+
+    def test_medir_y_comparar(self):
+        sede = Sede.objects.create(nombre='Sede bench', ciudad='Bogotá', direccion='Calle 1')
+        admin = RolUser.objects.create_user(username='admin', email='admin@test.com', password='clave-segura-1', rol='admin')
+        cliente = APIClient()
+        cliente.force_authenticate(admin)
+
+        escenario = Escenario('dispositivos', lambda c, i: c.get(f'/api/dispositivos/?sede_id={sede.id}'))
+        resultado = medir(cliente, escenario, iteraciones=3, calentamiento=1)
+        self.assertEqual(resultado['iteraciones'], 3)
+        self.assertLessEqual(resultado['p50_ms'], resultado['p99_ms'])
+
+        linea_base = {'escenarios': {'dispositivos': resultado}}
+        self.assertEqual(comparar({'dispositivos': resultado}, linea_base), [])
+        peor = dict(resultado, consultas=resultado['consultas'] + 1, p95_ms=resultado['p95_ms'] * 2 + 10)
+        self.assertEqual(len(comparar({'dispositivos': peor}, linea_base)), 2)
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class PruebaCargaTest(LiveServerTestCase):
+
+    def test_recorridos_de_lectura(self):
+        sede = Sede.objects.create(nombre='Sede carga', ciudad='Bogotá', direccion='Calle 1')
+        for i in range(3):
+            posicion = Posicion.objects.create(nombre=f'P{i}', fila=1, columna='ABC'[i], piso='PISO1', sede=sede)
+            Dispositivo.objects.create(
+                tipo='MONITOR', marca='HP', modelo='P201', serial=f'CARGA{i}', sede=sede, posicion=posicion,
+                estado='BUENO', estado_uso='DISPONIBLE'
+            )
+        RolUser.objects.create_user(username='carga', email='carga@test.com', password='clave-segura-1', rol='admin')
+
+        resumen = ejecutar_carga(
+            self.live_server_url, 'carga', 'clave-segura-1', usuarios=2, duracion=2, pausa=0, sesion=3,
+            pesos={'tablero': 1, 'plano': 1, 'historial': 1}, semilla=1
+        )
+        endpoints = {fila['endpoint']: fila for fila in resumen['endpoints']}
+        self.assertIn('POST api/login/', endpoints)
+        self.assertIn('GET api/dashboard/', endpoints)
+        self.assertEqual(resumen['total']['errores'], 0)
+        self.assertGreaterEqual(resumen['concurrencia_maxima'], 1)
+
+        # Los recorridos que modifican datos no corren sin permiso explícito
+        with self.assertRaises(ErrorCarga):
+            ejecutar_carga(self.live_server_url, 'carga', 'clave-segura-1', pesos={'traslado': 1})
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class JWTSinConsultaTest(TestCase):
+
+    def setUp(self):
+        # Al confirmar, la señal registra al usuario como vigente en este proceso
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario = RolUser.objects.create_user(
+                username='admin', email='admin@test.com', password='clave-segura-1', rol='admin'
+            )
+        respuesta = APIClient().post('/api/login/', {'username': 'admin', 'password': 'clave-segura-1'}, format='json')
+        self.refresh = respuesta.data['refresh']
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {respuesta.data['access']}")
+
+    def test_validar_y_keepalive_sin_cargar_usuario(self):
+        usuario_vigente(self.usuario.pk)
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/api/validate/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['usuario']['rol'], 'admin')
+
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get('/auth/keepalive/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data['user']['email'], 'admin@test.com')
+        self.assertFalse([q for q in contexto.captured_queries if RolUser._meta.db_table in q['sql']])
+
+    def test_desactivacion(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario.is_active = False
+            self.usuario.save()
+        self.assertEqual(self.client.get('/api/validate/').status_code, 401)
+        self.assertEqual(self.client.get('/auth/keepalive/').status_code, 401)
+        self.assertEqual(APIClient().post('/auth/refresh/', {'refresh': self.refresh}).status_code, 401)
+
+    @override_settings(JWT_REVOCACION_VIGENCIA=0)
+    def test_desactivacion_en_otro_proceso(self):
+        # Sin señal (como un cambio hecho por otro proceso) se nota al releer los usuarios
+        RolUser.objects.filter(pk=self.usuario.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/validate/').status_code, 401)
+
+    @override_settings(JWT_REVOCACION_VIGENCIA=0)
+    def test_borrado_del_ultimo_usuario(self):
+        # Borrar el usuario de mayor id no hace que su id pase por uno creado después
+        self.usuario.delete()
+        self.assertEqual(self.client.get('/api/validate/').status_code, 401)
+        self.assertEqual(self.client.get('/auth/keepalive/').status_code, 401)
+
+
+@override_settings(CACHES=CACHES_LOCALES)
+class SesionesCacheTest(TestCase):
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.usuario = RolUser.objects.create_user(
+                username='admin', email='admin@test.com', password='clave-segura-1', rol='admin'
+            )
+        self.client = APIClient()
+        respuesta = self.client.post('/api/login/', {'username': 'admin', 'password': 'clave-segura-1'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {respuesta.data['access']}")
+        self.clave = respuesta.data['sessionid']
+
+    def renovada(self):
+        return SessionStore(self.clave).load()[RENOVADA]
+
+    def test_peticiones_sin_escribir_la_sesion(self):
+        usuario_vigente(self.usuario.pk)
+        renovada = self.renovada()
+        for _ in range(5):
+            # Ni django_session ni la sesión en cache se escriben en cada petición
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get('/api/validate/').status_code, 200)
+            self.assertEqual(self.client.get('/auth/keepalive/').status_code, 200)
+        self.assertEqual(self.renovada(), renovada)
+
+    def test_renovacion_pasada_la_fraccion(self):
+        # Sesión escrita hace 200 s: ya pasó la mitad de sus 300 s de vida
+        sesion = SessionStore(self.clave)
+        sesion._cache.set(sesion.cache_key, dict(sesion.load(), **{RENOVADA: time.time() - 200}), 300)
+        self.assertEqual(self.client.get('/auth/keepalive/').status_code, 200)
+        self.assertAlmostEqual(self.renovada(), time.time(), delta=5)
@@ -0,0 +1,120 @@
+"""
+Ejecución de importaciones de Excel en segundo plano.
+
+Los trabajos se envían a un pool local de procesos para no ocupar los workers
+HTTP. Cada lote de filas se confirma junto con el punto de control del trabajo,
+de modo que un trabajo fallido, o uno que dejó de avanzar porque su worker
+murió, puede reanudarse desde el último lote confirmado. Al completarse se
+borra el archivo subido.
+"""
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd # type: ignore
+from django.conf import settings # type: ignore
+from django.db import connections, transaction # type: ignore
+from django.utils import timezone # type: ignore
+from .importacion import ImportadorDispositivos, normalizar_dataframe
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 500
+
+_executor = None
+
+
+def _inicializar_worker():
+    import django # type: ignore
+    django.setup()
+
+
+def obtener_executor():
+    """Pool de procesos compartido por el proceso web, creado bajo demanda."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=getattr(settings, 'IMPORTACION_WORKERS', 2),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_inicializar_worker,
+        )
+    return _executor
+
+
+def encolar_importacion(trabajo):
+    """
+    Envía el trabajo al pool de procesos. Con IMPORTACION_EN_SEGUNDO_PLANO = False
+    se ejecuta en el mismo proceso (útil en pruebas y desarrollo).
+    """
+    if not getattr(settings, 'IMPORTACION_EN_SEGUNDO_PLANO', True):
+        ejecutar_importacion(trabajo.id)
+        return
+    # El trabajo debe existir en la base antes de que el worker lo lea
+    transaction.on_commit(lambda: obtener_executor().submit(ejecutar_importacion, trabajo.id))
+
+
+def borrar_archivo(trabajo):
+    """Un trabajo completado ya no se reanuda: el Excel subido no se necesita más."""
+    try:
+        trabajo.archivo.delete(save=False)
+        trabajo.save(update_fields=['archivo'])
+    except OSError as e:
+        logger.error(f'No se pudo borrar el archivo de la importación #{trabajo.id}: {str(e)}')
+
+
+def ejecutar_importacion(trabajo_id):
+    """Procesa un trabajo desde su último punto de control hasta el final."""
+    from .models import TrabajoImportacion
+
+    trabajo = TrabajoImportacion.objects.select_related('sede', 'usuario').get(pk=trabajo_id)
+    if trabajo.estado == 'COMPLETADO':
+        return
+
+    trabajo.estado = 'PROCESANDO'
+    trabajo.mensaje_error = None
+    trabajo.fecha_inicio = trabajo.fecha_inicio or timezone.now()
+    trabajo.ultimo_avance = timezone.now()
+    trabajo.save(update_fields=['estado', 'mensaje_error', 'fecha_inicio', 'ultimo_avance'])
+
+    try:
+        with trabajo.archivo.open('rb') as archivo:
+            df = normalizar_dataframe(pd.read_excel(archivo))
+
+        if trabajo.total_filas != len(df):
+            trabajo.total_filas = len(df)
+            trabajo.save(update_fields=['total_filas'])
+
+        importador = ImportadorDispositivos(trabajo.sede, usuario=trabajo.usuario)
+
+        for inicio in range(trabajo.filas_procesadas, len(df), TAMANO_LOTE):
+            lote = df.iloc[inicio:inicio + TAMANO_LOTE]
+            comienzo = time.monotonic()
+
+            # El lote y el punto de control se confirman juntos
+            with transaction.atomic():
+                parcial = importador.importar_lote(lote)
+                trabajo.filas_procesadas = inicio + len(lote)
+                trabajo.creados += parcial['created']
+                trabajo.actualizados += parcial['updated']
+                trabajo.errores = trabajo.errores + parcial['errors']
+                trabajo.segundos_procesando += time.monotonic() - comienzo
+                trabajo.ultimo_avance = timezone.now()
+                trabajo.save(update_fields=[
+                    'filas_procesadas', 'creados', 'actualizados', 'errores', 'segundos_procesando',
+                    'ultimo_avance'
+                ])
+
+        trabajo.estado = 'COMPLETADO'
+        trabajo.fecha_fin = timezone.now()
+        trabajo.save(update_fields=['estado', 'fecha_fin'])
+        borrar_archivo(trabajo)
+
+    except Exception as e:
+        logger.error(f'Error en importación #{trabajo_id}: {str(e)}', exc_info=True)
+        trabajo.estado = 'FALLIDO'
+        trabajo.mensaje_error = str(e)
+        trabajo.save(update_fields=['estado', 'mensaje_error'])
+
+    finally:
+        if getattr(settings, 'IMPORTACION_EN_SEGUNDO_PLANO', True):
+            connections.close_all()
@@ -0,0 +1,162 @@
+"""
+Traslado masivo de dispositivos entre posiciones.
+
+Recibe una lista de pares dispositivo -> posición destino y la aplica en una
+sola transacción con un número fijo de consultas, sin importar cuántos
+dispositivos se muevan:
+
+- Dispositivos y posiciones destino se leen (y bloquean) con una consulta
+  cada uno; la ocupación de cada destino es su columna `ocupacion`.
+- Capacidad y sede se validan en memoria, en el orden de la lista.
+- Los cambios se escriben con bulk_update / bulk_create (posición del
+  dispositivo, movimientos e historial) y la ocupación con dos UPDATE.
+
+Como los métodos bulk no disparan señales, los contadores de estadísticas,
+el índice de autocompletado y las versiones de cache se ajustan aquí.
+"""
+from collections import Counter
+from django.db import transaction # type: ignore
+from django.utils import timezone # type: ignore
+from .models import Dispositivo, Historial, Movimiento, Posicion
+from .historial import registrar_eventos
+from .estadisticas import (
+    aplicar_deltas_dispositivos, aplicar_deltas_movimientos, clave_dispositivo,
+    clave_movimiento, invalidar_dashboard
+)
+from .autocompletado import actualizar_dispositivos
+from .cache import POSICIONES, invalidar
+
+MAX_TRASLADOS = 1000
+
+def _leer_items(items):
+    """[(dispositivo_id, destino_id | None, observacion)] o ValueError si el formato no es válido."""
+    if not isinstance(items, list) or not items:
+        raise ValueError("Debe enviar una lista de movimientos")
+    if len(items) > MAX_TRASLADOS:
+        raise ValueError(f"Máximo {MAX_TRASLADOS} movimientos por petición")
+
+    leidos = []
+    for indice, item in enumerate(items):
+        try:
+            dispositivo_id = int(item['dispositivo'])
+            destino = item.get('posicion_destino')
+            destino_id = int(destino) if destino not in (None, '') else None
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValueError(f"Movimiento {indice}: se requiere 'dispositivo' y 'posicion_destino' numéricos")
+        leidos.append((dispositivo_id, destino_id, str(item.get('observacion') or '').strip()))
+    return leidos
+
+
+def trasladar_dispositivos(items, usuario=None, observacion='', atomico=False):
+    """
+    Aplica los traslados válidos y devuelve (resultados por ítem, movimientos
+    creados). Con atomico=True no aplica nada si alguno falla.
+    """
+    leidos = _leer_items(items)
+    usuario = usuario if getattr(usuario, 'is_authenticated', False) else None
+
+    with transaction.atomic():
+        dispositivos = Dispositivo.objects.select_for_update().in_bulk({d for d, _, _ in leidos})
+        destinos = Posicion.objects.select_for_update().in_bulk({p for _, p, _ in leidos if p})
+        ocupacion = Counter({posicion_id: p.ocupacion for posicion_id, p in destinos.items()})
+
+        resultados = []
+        aplicados = []
+        vistos = set()
+        for dispositivo_id, destino_id, nota in leidos:
+            resultado = {'dispositivo': dispositivo_id, 'posicion_destino': destino_id}
+            resultados.append(resultado)
+            dispositivo = dispositivos.get(dispositivo_id)
+            destino = destinos.get(destino_id)
+            error = None
+            if dispositivo is None:
+                error = "Dispositivo no encontrado"
+            elif dispositivo_id in vistos:
+                error = "El dispositivo aparece más de una vez"
+            elif destino_id and destino is None:
+                error = "Posición destino no encontrada"
+            elif destino_id == dispositivo.posicion_id:
+                error = "El dispositivo ya está en esa posición"
+            elif destino and dispositivo.sede_id and destino.sede_id != dispositivo.sede_id:
+                error = "El dispositivo y la posición destino deben pertenecer a la misma sede"
+            elif destino and ocupacion[destino_id] >= Posicion.MAX_DISPOSITIVOS:
+                error = f"La posición destino ya tiene el máximo de {Posicion.MAX_DISPOSITIVOS} dispositivos"
+            vistos.add(dispositivo_id)
+
+            if error:
+                resultado.update(ok=False, error=error)
+                continue
+
+            if dispositivo.posicion_id:
+                ocupacion[dispositivo.posicion_id] -= 1
+            if destino:
+                ocupacion[destino_id] += 1
+            resultado['ok'] = True
+            aplicados.append((dispositivo, destino, nota))
+
+        if not aplicados or (atomico and len(aplicados) != len(leidos)):
+            return resultados, []
+
+        movimientos = _aplicar(aplicados, usuario, observacion)
+        for resultado, movimiento in zip([r for r in resultados if r['ok']], movimientos):
+            resultado['movimiento_id'] = movimiento.id
+    return resultados, movimientos
+
+
+def _aplicar(aplicados, usuario, observacion):
+    movimientos = []
+    ocupacion = Counter()
+    ahora = timezone.now()
+    for dispositivo, destino, nota in aplicados:
+        origen_id = dispositivo.posicion_id
+        ocupacion[origen_id] -= 1
+        ocupacion[destino.id if destino else None] += 1
+        dispositivo.posicion = destino
+        if destino:
+            dispositivo.piso = destino.piso
+            dispositivo.sede_id = dispositivo.sede_id or destino.sede_id
+        movimientos.append(Movimiento(
+            dispositivo=dispositivo,
+            posicion_origen_id=origen_id,
+            posicion_destino=destino,
+            # Sin posición el dispositivo sale de (o vuelve a) bodega, como exige Movimiento.clean
+            ubicacion_origen=None if origen_id else 'BODEGA',
+            ubicacion_destino=None if destino else 'BODEGA',
+            encargado=usuario,
+            sede_id=dispositivo.sede_id,
+            observacion=nota or observacion or "Traslado masivo de dispositivos",
+            confirmado=True,
+            fecha_confirmacion=ahora,
+        ))
+    Posicion.ajustar_ocupacion(ocupacion)
+    Dispositivo.objects.bulk_update([d for d, _, _ in aplicados], ['posicion', 'piso', 'sede'], batch_size=500)
+    Movimiento.objects.bulk_create(movimientos, batch_size=500)
+
+    registrar_eventos([
+        Historial(
+            dispositivo=movimiento.dispositivo,
+            usuario=usuario,
+            tipo_cambio=Historial.TipoCambio.MOVIMIENTO,
+            modelo_afectado="Dispositivo",
+            instancia_id=movimiento.dispositivo_id,
+            cambios={
+                "movimiento_id": movimiento.id,
+                "posicion_anterior": movimiento.posicion_origen_id,
+                "posicion_nueva": movimiento.posicion_destino_id,
+            },
+        )
+        for movimiento in movimientos
+    ])
+
+    # bulk_update / bulk_create no disparan señales
+    deltas = Counter()
+    for dispositivo, _, _ in aplicados:
+        deltas[clave_dispositivo(dispositivo)] += 1
+        deltas[clave_dispositivo(dispositivo, anterior=True)] -= 1
+    aplicar_deltas_dispositivos(deltas)
+    aplicar_deltas_movimientos(Counter(clave_movimiento(m) for m in movimientos))
+    dispositivos = [d for d, _, _ in aplicados]
+    transaction.on_commit(lambda: actualizar_dispositivos(dispositivos))
+    transaction.on_commit(invalidar_dashboard)
+    transaction.on_commit(lambda: invalidar(POSICIONES))
+    return movimientos
@@ -1,6 +1,7 @@
 import pandas as pd # type: ignore
 from django.http import HttpResponse
 from .models import Dispositivo
+from .exportacion import exportar_dispositivos
 
 def importar_excel(archivo):
     try:
@@ -37,12 +38,6 @@ def importar_excel(archivo):
     except Exception as e:
         return HttpResponse(f"Error: {str(e)}", status=500)
 
-def exportar_excel():
-    dispositivos = Dispositivo.objects.all().values()
-    df = pd.DataFrame(list(dispositivos))
-
-    response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    response["Content-Disposition"] = 'attachment; filename="dispositivos.xlsx"'
-
-    df.to_excel(response, index=False)
-    return response
\ No newline at end of file
+def exportar_excel(params=None):
+    # La exportación se genera por streaming para no cargar todo el inventario en memoria
+    return exportar_dispositivos(params or {}, formato='xlsx')
@@ -5,12 +5,14 @@ import jwt # type: ignore
 import pandas as pd  # type: ignore
 from fuzzywuzzy import process  # type: ignore
 from django.conf import settings  # type: ignore
+from django.core.cache import cache # type: ignore
 from django.core.exceptions import ObjectDoesNotExist # type: ignore
 from django.core.mail import send_mail  # type: ignore
 from django.db import IntegrityError, transaction # type: ignore
 from django.db.models import Count, ExpressionWrapper, F, FloatField, Q, Sum # type: ignore
-from django.http import JsonResponse # type: ignore
+from django.http import Http404, JsonResponse # type: ignore
 from django.shortcuts import get_object_or_404, render # type: ignore
+from django.urls import reverse # type: ignore
 from django.utils import timezone # type: ignore
 from django.views.decorators.cache import never_cache, cache_control # type: ignore
 from django.views.decorators.csrf import csrf_exempt # type: ignore
@@ -24,19 +26,31 @@ from rest_framework.decorators import (  # type: ignore
     api_view, parser_classes, permission_classes,
     action, authentication_classes
 ) # type: ignore
+from rest_framework.exceptions import ValidationError # type: ignore
 from rest_framework.parsers import MultiPartParser # type: ignore
 from rest_framework.permissions import AllowAny, IsAuthenticated # type: ignore
 from rest_framework.response import Response # type: ignore
 from django_filters.rest_framework import DjangoFilterBackend  # type: ignore
 from rest_framework_simplejwt.tokens import AccessToken, RefreshToken # type: ignore
 from rest_framework_simplejwt.exceptions import TokenError # type: ignore
-from .models import RolUser, Sede, Dispositivo, Servicios, Posicion, Historial, Movimiento
+from .models import RolUser, Sede, Dispositivo, Servicios, Posicion, Historial, Movimiento, TrabajoImportacion
 from .serializers import (
     RolUserSerializer, ServiciosSerializer, LoginSerializer,
-    DispositivoSerializer, SedeSerializer, PosicionSerializer, HistorialSerializer,  MovimientoSerializer
+    DispositivoSerializer, SedeSerializer, PosicionSerializer, HistorialSerializer,  MovimientoSerializer,
+    TrabajoImportacionSerializer
 )
-from .pagination import StandardPagination
+from .pagination import StandardPagination, DispositivoCursorPagination
 from .utils import importar_excel, exportar_excel
+from .trabajos import encolar_importacion
+from .historial import registrar_historial
+from .busqueda import BusquedaDispositivoFilter, buscar_dispositivos, filtrar_por_dispositivo
+from .autocompletado import sugerencias
+from .cache import POSICIONES, SEDES, SERVICIOS, TIEMPO_CACHE, cachear_respuesta, etag_vigente
+from .plano import etag_plano, plano_piso
+from .traslados import trasladar_dispositivos
+from .estadisticas import obtener_tarjetas, totales_dispositivos_por_sede, totales_movimientos_por_sede
+from .perfilado import estadisticas as estadisticas_perfilado
+from .autenticacion import JWTSinConsulta, agregar_claims, emitir_tokens, usuario_vigente
 
 logger = logging.getLogger(__name__)
 
@@ -141,8 +155,8 @@ def login_user(request):
         if sede_id:
             request.session['sede_id'] = sede_id  # Solo almacenar sede si existe
         
-        # Generar tokens JWT
-        refresh = RefreshToken.for_user(user)
+        # Generar tokens JWT (con rol y sede como claims para validarlos sin consultar la base)
+        refresh = emitir_tokens(user, sede_id)
         
         logger.info(f"Login exitoso para usuario: {username} (Rol: {user.rol})")
         
@@ -166,10 +180,10 @@ def login_user(request):
         )
         
 @api_view(['GET'])
+@authentication_classes([JWTSinConsulta, TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def keepalive(request):
-    request.session['last_activity'] = timezone.now().isoformat()
-    request.session.save()
+    # La sesión se extiende al responder, solo si ya corresponde renovarla (ver sesiones.py)
     return Response({
         "status": "active",
         "user": {
@@ -177,11 +191,12 @@ def keepalive(request):
             "username": request.user.username,
             "email": request.user.email
         },
-        "last_activity": request.session['last_activity'],
-        "session_expiry": request.session.get_expiry_date()
+        "last_activity": timezone.now().isoformat(),
+        "session_expiry": request.session.fecha_expiracion()
     }, status=status.HTTP_200_OK)
     
 @api_view(["GET"])  # Cambiado a GET ya que es una verificación
+@authentication_classes([])  # El token se valida aquí, sin cargar el usuario
 @permission_classes([])
 def validate_token(request):
     auth_header = request.headers.get("Authorization")
@@ -197,12 +212,19 @@ def validate_token(request):
         if not auth_header.startswith("Bearer "):
             raise TokenError("Formato de token inválido")
             
-        token = auth_header.split(" ")[1]
-        AccessToken(token).verify()  # Verifica expiración y firma
+        token = AccessToken(auth_header.split(" ")[1])  # Verifica expiración y firma
+        if not usuario_vigente(token.get('user_id')):
+            raise TokenError("Usuario desactivado")
         
         return Response({
             "message": "Token válido",
-            "is_valid": True
+            "is_valid": True,
+            "usuario": {
+                "id": int(token.get("user_id")),
+                "username": token.get('username'),
+                "rol": token.get('rol'),
+                "sede_id": token.get('sede_id'),
+            }
         }, status=status.HTTP_200_OK)
         
     except TokenError as e:
@@ -390,6 +412,7 @@ def reset_password(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny]) 
+@cachear_respuesta(SEDES)
 def get_sedes_view(request):
     try:
         sedes = Sede.objects.all().values('id', 'nombre', 'ciudad', 'direccion')
@@ -435,30 +458,60 @@ def edit_user_view(request, user_id):
 def dispositivo_view(request):
     if request.method == 'GET':
         try:
-            queryset = Dispositivo.objects.select_related('posicion', 'sede')
-            
+            params = request.query_params
+
+            # Campos solicitados (?fields=id,serial,modelo) para reducir columnas y payload
+            campos = [c.strip() for c in params.get('fields', '').split(',') if c.strip()] or None
+            if campos:
+                invalidos = set(campos) - set(DispositivoSerializer().fields)
+                if invalidos:
+                    return Response(
+                        {"error": f"Campos no válidos: {', '.join(sorted(invalidos))}"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+            queryset = DispositivoSerializer.optimizar_queryset(Dispositivo.objects.all(), campos)
+
             # Filtrado por sede si se proporciona
-            sede_id = request.query_params.get('sede_id')
+            sede_id = params.get('sede_id')
             if sede_id:
                 queryset = queryset.filter(sede_id=sede_id)
-            
+
             # Filtrado por posición si se proporciona
-            posicion_id = request.query_params.get('posicion_id')
+            posicion_id = params.get('posicion_id')
             if posicion_id:
                 queryset = queryset.filter(posicion_id=posicion_id)
-            
-            dispositivos = queryset.all()
-            serializer = DispositivoSerializer(dispositivos, many=True)
-            
+
+            filtros = {
+                'sede_id': sede_id,
+                'posicion_id': posicion_id
+            }
+
+            # Modo paginado por cursor: se activa con ?cursor= o ?page_size=
+            if 'cursor' in params or 'page_size' in params:
+                paginator = DispositivoCursorPagination()
+                pagina = paginator.paginate_queryset(queryset, request)
+                serializer = DispositivoSerializer(pagina, many=True, fields=campos)
+
+                # El total es opcional (?count=false) porque requiere un COUNT(*) aparte
+                incluir_total = params.get('count', 'true').lower() not in ('false', '0', 'no')
+
+                return Response({
+                    'data': serializer.data,
+                    'count': queryset.count() if incluir_total else None,
+                    'next': paginator.get_next_link(),
+                    'previous': paginator.get_previous_link(),
+                    'filters': filtros
+                }, status=status.HTTP_200_OK)
+
+            serializer = DispositivoSerializer(queryset, many=True, fields=campos)
+
             return Response({
                 'data': serializer.data,
                 'count': len(serializer.data),
-                'filters': {
-                    'sede_id': sede_id,
-                    'posicion_id': posicion_id
-                }
+                'filters': filtros
             }, status=status.HTTP_200_OK)
-            
+
         except Exception as e:
             logger.error(f"Error al obtener dispositivos: {str(e)}", exc_info=True)
             return Response(
@@ -509,12 +562,105 @@ def dispositivo_view(request):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def buscar_dispositivos_view(request):
+    """
+    Búsqueda por serial, placa CU, marca, modelo y observaciones ordenada por relevancia.
+    Parámetros: q (texto), limit (por defecto 20, máximo 100), fields, sede_id.
+    """
+    params = request.query_params
+    texto = params.get('q', '').strip()
+    if not texto:
+        return Response({"error": "Debe indicar el texto a buscar (q)"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limite = min(max(int(params.get('limit', 20)), 1), 100)
+    except ValueError:
+        return Response({"error": "El parámetro limit debe ser un número"}, status=status.HTTP_400_BAD_REQUEST)
+
+    campos = [c.strip() for c in params.get('fields', '').split(',') if c.strip()] or None
+    if campos:
+        invalidos = set(campos) - set(DispositivoSerializer().fields)
+        if invalidos:
+            return Response(
+                {"error": f"Campos no válidos: {', '.join(sorted(invalidos))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    try:
+        queryset = DispositivoSerializer.optimizar_queryset(Dispositivo.objects.all(), campos)
+        sede_id = params.get('sede_id')
+        if sede_id:
+            queryset = queryset.filter(sede_id=sede_id)
+
+        resultados = list(buscar_dispositivos(texto, queryset)[:limite])
+        serializer = DispositivoSerializer(resultados, many=True, fields=campos)
+        data = serializer.data
+        for fila, dispositivo in zip(data, resultados):
+            fila['relevancia'] = dispositivo.relevancia
+
+        return Response({'data': data, 'count': len(data), 'q': texto}, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        logger.error(f"Error en la búsqueda de dispositivos: {str(e)}", exc_info=True)
+        return Response(
+            {"error": "Error interno del servidor al buscar dispositivos"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def autocompletar_dispositivos_view(request):
+    """
+    Sugerencias de dispositivos cuyo serial, placa CU o modelo empiezan por el texto.
+    Parámetros: q (texto), limit (por defecto 10, máximo 50), sede_id, estado_uso.
+    """
+    params = request.query_params
+    texto = params.get('q', '').strip()
+    if not texto:
+        return Response({"error": "Debe indicar el texto a buscar (q)"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limite = min(max(int(params.get('limit', 10)), 1), 50)
+        sede_id = int(params['sede_id']) if params.get('sede_id') else None
+    except ValueError:
+        return Response({"error": "limit y sede_id deben ser números"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        data, fuente = sugerencias(texto, limite, sede_id=sede_id, estado_uso=params.get('estado_uso') or None)
+        return Response({'data': data, 'count': len(data), 'q': texto, 'fuente': fuente}, status=status.HTTP_200_OK)
+
+    except Exception as e:
+        logger.error(f"Error en el autocompletado de dispositivos: {str(e)}", exc_info=True)
+        return Response(
+            {"error": "Error interno del servidor al buscar dispositivos"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def perfilado_view(request):
+    """
+    Consultas y tiempos recientes por endpoint de este proceso (ver
+    perfilado.py), de mayor a menor número de consultas. DELETE las reinicia.
+    """
+    if getattr(request.user, 'rol', None) != 'admin':
+        return Response({"error": "Solo los administradores pueden ver el perfilado"}, status=status.HTTP_403_FORBIDDEN)
+    if not getattr(settings, 'PERFILADO_CONSULTAS', False):
+        return Response({"error": "El perfilado de consultas no está activo"}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'DELETE':
+        estadisticas_perfilado.limpiar()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({'endpoints': estadisticas_perfilado.resumen()}, status=status.HTTP_200_OK)
+
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([AllowAny])
 def dispositivo_detail_view(request, dispositivo_id):
     try:
         dispositivo = Dispositivo.objects.select_related(
-            'posicion', 'sede'
+            'posicion__servicio', 'sede'
         ).get(id=dispositivo_id)
     except Dispositivo.DoesNotExist:
         return Response(
@@ -586,6 +732,7 @@ def dispositivo_detail_view(request, dispositivo_id):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cachear_respuesta(POSICIONES, SEDES)
 def posiciones_por_sede_view(request, sede_id):
     try:
         # Validar que el ID sea un número entero
@@ -621,8 +768,40 @@ def posiciones_por_sede_view(request, sede_id):
             {"error": "Error interno al obtener posiciones"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def plano_piso_view(request, sede_id, piso):
+    """
+    Cuadrícula de posiciones de un piso (fila -> columna -> celda) con servicio y
+    cantidad de dispositivos. Responde 304 si el If-None-Match sigue vigente.
+    """
+    piso = piso.upper()
+    if piso not in dict(Posicion.PISOS):
+        return Response({"error": f"Piso no válido: {piso}"}, status=status.HTTP_404_NOT_FOUND)
+
+    valor = etag_plano(sede_id, piso)
+    cabeceras = {'ETag': valor, 'Cache-Control': 'private, no-cache'}
+    if etag_vigente(request, valor):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=cabeceras)
+
+    try:
+        clave = f'plano:{valor}'
+        data = cache.get(clave)
+        if data is None:
+            data = plano_piso(sede_id, piso)
+            cache.set(clave, data, TIEMPO_CACHE)
+        return Response(data, status=status.HTTP_200_OK, headers=cabeceras)
+
+    except Exception as e:
+        logger.error(f"Error al obtener el plano de la sede {sede_id}, piso {piso}: {str(e)}", exc_info=True)
+        return Response(
+            {"error": "Error interno al obtener el plano"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
+@cachear_respuesta(SERVICIOS, SEDES)
 def servicios_view(request):
     if request.method == 'GET':
         # Obtener todos los servicios
@@ -779,68 +958,14 @@ def posiciones_view(request):
 def dashboard_data(request):
     sede_id = request.query_params.get('sede')
     
-    if sede_id == "null":
-        dispositivos = Dispositivo.objects.filter(sede__isnull=True)
-    elif sede_id:
+    if sede_id and sede_id != "null":
         try:
             sede_id = int(sede_id)
-            dispositivos = Dispositivo.objects.filter(sede_id=sede_id)
         except (ValueError, TypeError):
             return Response({"error": "ID de sede inválido"}, status=400)
-    else:
-        dispositivos = Dispositivo.objects.all()
-
-    total_dispositivos = dispositivos.count()
-    dispositivos_en_uso = dispositivos.filter(estado_uso='EN_USO').count()
-    dispositivos_buen_estado = dispositivos.filter(estado='BUENO').count()
-    dispositivos_disponibles = dispositivos.filter(estado_uso='DISPONIBLE').count()
-    dispositivos_en_reparacion = dispositivos.filter(estado='REPARAR').count()
-    dispositivos_perdidos = dispositivos.filter(estado='PERDIDO').count()
-    dispositivos_mal_estado = dispositivos.filter(estado='MALO').count()
-    dispositivos_inhabilitados = dispositivos.filter(estado_uso='INHABILITADO').count()
-
-    cardsData = [
-        {
-            "title": "Total dispositivos",
-            "value": total_dispositivos,
-            "date": "Actualizado hoy"
-        },
-        {
-            "title": "Dispositivos en uso",
-            "value": dispositivos_en_uso,
-            "date": "Actualizado hoy"
-        },
-        {
-            "title": "Buen estado",
-            "value": dispositivos_buen_estado,
-            "date": "Actualizado hoy"
-        },
-        {
-            "title": "Dispositivos disponibles",
-            "value": dispositivos_disponibles,
-            "date": "Actualizado hoy"
-        },
-        {
-            "title": "En reparación",
-            "value": dispositivos_en_reparacion,
-            "date": "Actualizado hoy"
-        },
-        {
-            "title": "Perdidos/robados",
-            "value": dispositivos_perdidos,
-            "date": "Actualizado hoy"
-        },
-        {
-            "title": "Mal estado",
-            "value": dispositivos_mal_estado,
-            "date": "Actualizado hoy"
-        },
-        {
-            "title": "Inhabilitados",
-            "value": dispositivos_inhabilitados,
-            "date": "Actualizado hoy"
-        }
-    ]
+
+    # Todas las tarjetas salen de una sola consulta agregada, cacheada por sede
+    cardsData = obtener_tarjetas(sede_id)
 
     return Response({"cardsData": cardsData})
 
@@ -880,154 +1005,75 @@ def importar_dispositivos(request):
             return Response({'error': 'El archivo es demasiado grande (máximo 10MB)'}, 
                             status=status.HTTP_400_BAD_REQUEST)
         
+        # Un archivo ilegible o vacío se rechaza aquí, no como un trabajo fallido
         try:
-            df = pd.read_excel(file)
-            logger.info(f"Columnas detectadas en el archivo: {df.columns.tolist()}")
+            total_filas = len(pd.read_excel(file))
         except Exception as e:
-            return Response({'error': f'Error al leer el archivo Excel: {str(e)}'}, 
+            return Response({'error': f'Error al leer el archivo Excel: {str(e)}'},
                             status=status.HTTP_400_BAD_REQUEST)
-        
-        if df.empty:
+
+        if not total_filas:
             return Response({'error': 'El archivo está vacío'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Normalizar nombres de columnas
-        df.columns = [str(col).upper().strip().replace(' ', '_').replace('Ó', 'O').replace('É', 'E').replace('Á', 'A') for col in df.columns]
-        
-        batch_size = 100
-        total_rows = len(df)
-        created = 0
-        updated = 0
-        errors = []
-
-        with transaction.atomic():
-            for i in range(0, total_rows, batch_size):
-                batch = df.iloc[i:i+batch_size]
-                for idx, row in batch.iterrows():
-                    row_num = idx + 2  # +2 porque Excel empieza en 1 y hay encabezado
-                    try:
-                        row_data = {}
-                        for key, value in row.items():
-                            if pd.isna(value):
-                                row_data[key.lower()] = None
-                            elif isinstance(value, str) and value.strip().upper() in ['NA', 'N/A', '-']:
-                                row_data[key.lower()] = None
-                            elif isinstance(value, str):
-                                row_data[key.lower()] = value.strip()
-                            else:
-                                row_data[key.lower()] = value
-                        
-                        # Establecer valores por defecto para campos importantes
-                        if not row_data.get('tipo_dispositivo'):
-                            row_data['tipo_dispositivo'] = 'COMPUTADOR'
-                        
-                        if not row_data.get('modelo'):
-                            row_data['modelo'] = 'SIN MODELO'
-                        
-                        # Procesar servicio si existe en el Excel
-                        servicio = None
-                        if row_data.get('servicio'):
-                            servicio_nombre = str(row_data['servicio']).strip()
-                            servicio, _ = Servicios.objects.get_or_create(
-                                nombre=servicio_nombre,
-                                defaults={'codigo_analitico': f'SERV-{servicio_nombre[:3].upper()}'}
-                            )
-                        
-                        # Buscar posición si existe
-                        posicion = None
-                        if row_data.get('posicion'):
-                            posicion_nombre = str(row_data['posicion']).strip()
-                            piso = row_data.get('piso', None)
-                            
-                            # Buscar posición por nombre y piso en la sede
-                            if piso:
-                                posicion = Posicion.objects.filter(
-                                    nombre__iexact=posicion_nombre,
-                                    piso__iexact=piso,
-                                    sede=sede
-                                ).first()
-                            else:
-                                posicion = Posicion.objects.filter(
-                                    nombre__iexact=posicion_nombre,
-                                    sede=sede
-                                ).first()
-                            
-                            # Si encontramos la posición y hay servicio, actualizamos el servicio
-                            if posicion and servicio:
-                                posicion.servicio = servicio
-                                posicion.save()
-                        
-                        # Mapeo de nombres de columnas del Excel a campos del modelo
-                        dispositivo_data = {
-                            'tipo': row_data.get('tipo_dispositivo'),
-                            'marca': row_data.get('fabricante'),
-                            'modelo': row_data.get('modelo'),
-                            'serial': row_data.get('serial'),  # Puede ser null
-                            'placa_cu': row_data.get('cu'),
-                            'sistema_operativo': row_data.get('sistema_operativo'),
-                            'procesador': row_data.get('procesador'),
-                            'capacidad_disco_duro': row_data.get('disco_duro'),
-                            'capacidad_memoria_ram': row_data.get('memoria_ram'),
-                            'proveedor': row_data.get('proveedor'),
-                            'estado_propiedad': row_data.get('estado_proveedor'),
-                            'razon_social': row_data.get('razon_social') or row_data.get('razón_social'),
-                            'ubicacion': row_data.get('ubicacion') or row_data.get('ubicación'),
-                            'estado': row_data.get('estado', 'BUENO'),  # Valor por defecto
-                            'observaciones': row_data.get('observacion') or row_data.get('observación'),
-                            'regimen': row_data.get('regimen'),
-                            'piso': row_data.get('piso'),
-                            'sede': sede,
-                            'posicion': posicion
-                        }
-                        
-                        logger.debug(f"Datos mapeados para fila {row_num}: {dispositivo_data}")
-                        
-                        # Mantener estos campos incluso si son None
-                        campos_a_mantener = [
-                            'serial', 'razon_social', 'ubicacion', 'observaciones', 
-                            'estado_propiedad', 'regimen', 'piso'
-                        ]
-                        dispositivo_data = {
-                            k: v for k, v in dispositivo_data.items() 
-                            if v is not None or k in campos_a_mantener
-                        }
-                        
-                        # Buscar por serial si existe, o crear nuevo si no hay serial
-                        if row_data.get('serial'):
-                            dispositivo, created_flag = Dispositivo.objects.update_or_create(
-                                serial=row_data['serial'],
-                                defaults=dispositivo_data
-                            )
-                        else:
-                            dispositivo = Dispositivo.objects.create(**dispositivo_data)
-                            created_flag = True
-
-                        if created_flag:
-                            created += 1
-                        else:
-                            updated += 1
-                    
-                    except Exception as e:
-                        logger.error(f'Error procesando fila {row_num}: {str(e)}', exc_info=True)
-                        errors.append(f'Fila {row_num}: Error al procesar - {str(e)}')
-                        continue
-        
-        result = {
-            'message': 'Importación completada',
-            'total': total_rows,
-            'created': created,
-            'updated': updated,
-            'errors': errors if errors else None
-        }
-        if errors:
-            result['warning'] = f'Se encontraron {len(errors)} errores'
-        
-        return Response(result, status=status.HTTP_200_OK)
+        file.seek(0)
+
+        # La importación se procesa en segundo plano; se devuelve el trabajo para consultar su avance
+        trabajo = TrabajoImportacion.objects.create(
+            archivo=file, sede=sede, usuario=request.user, total_filas=total_filas
+        )
+        encolar_importacion(trabajo)
+        trabajo.refresh_from_db()
+
+        return Response({
+            'message': 'Importación en proceso',
+            'trabajo_id': trabajo.id,
+            'url_estado': reverse('estado_importacion', args=[trabajo.id]),
+            'trabajo': TrabajoImportacionSerializer(trabajo).data
+        }, status=status.HTTP_202_ACCEPTED)
     
     except Exception as e:
         logger.error(f'Error en importación: {str(e)}', exc_info=True)
         return Response({'error': f'Error en el servidor: {str(e)}'}, 
                         status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def obtener_trabajo_importacion(request, trabajo_id):
+    """Trabajo visible para el usuario: admin, quien lo subió o un usuario asignado a su sede"""
+    trabajo = get_object_or_404(TrabajoImportacion.objects.select_related('sede'), id=trabajo_id)
+    usuario = request.user
+    if (getattr(usuario, 'rol', None) != 'admin' and trabajo.usuario_id != usuario.id
+            and not usuario.sedes.filter(id=trabajo.sede_id).exists()):
+        raise Http404
+    return trabajo
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def estado_importacion(request, trabajo_id):
+    """Avance de una importación: filas confirmadas, errores por fila y velocidad"""
+    trabajo = obtener_trabajo_importacion(request, trabajo_id)
+    return Response(TrabajoImportacionSerializer(trabajo).data, status=status.HTTP_200_OK)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def reanudar_importacion(request, trabajo_id):
+    """Reanuda una importación fallida o detenida desde el último lote confirmado"""
+    trabajo = obtener_trabajo_importacion(request, trabajo_id)
+
+    with transaction.atomic():
+        # Bloqueo para que dos peticiones simultáneas no encolen el mismo trabajo dos veces
+        trabajo = TrabajoImportacion.objects.select_for_update().get(pk=trabajo.pk)
+        if trabajo.estado != 'FALLIDO' and not trabajo.detenido():
+            return Response(
+                {'error': f'Solo se pueden reanudar importaciones fallidas o detenidas (estado actual: {trabajo.get_estado_display()})'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        trabajo.estado = 'PENDIENTE'
+        trabajo.ultimo_avance = timezone.now()
+        trabajo.save(update_fields=['estado', 'ultimo_avance'])
+    encolar_importacion(trabajo)
+    trabajo.refresh_from_db()
+
+    return Response(TrabajoImportacionSerializer(trabajo).data, status=status.HTTP_202_ACCEPTED)
+
 @csrf_exempt
 @permission_classes([AllowAny])
 def subir_excel(request):
@@ -1038,10 +1084,11 @@ def subir_excel(request):
 
 @permission_classes([AllowAny])
 def descargar_excel(request):
-    return exportar_excel()
+    return exportar_excel(request.GET)
 
 class PosicionListCreateView(generics.ListCreateAPIView):
-    queryset = Posicion.objects.all()
+    # Servicio, sedes del servicio y dispositivos en consultas fijas, no una por fila
+    queryset = Posicion.objects.select_related('sede', 'servicio').prefetch_related('servicio__sedes', 'dispositivos')
     serializer_class = PosicionSerializer
     permission_classes = [AllowAny]
 
@@ -1096,23 +1143,22 @@ class PosicionRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
 
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
+@cachear_respuesta(SERVICIOS, por_usuario=False)
 def get_colores_pisos(request):
+    # Los colores de las posiciones son los de sus servicios
     return Response({
-        "colores": dict(Posicion.COLORES),
+        "colores": dict(Servicios.objects.order_by('nombre').values_list('nombre', 'color')),
         "pisos": dict(Posicion.PISOS),
     })
 
 class HistorialViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
-    queryset = Historial.objects.all().select_related('dispositivo', 'usuario')
+    queryset = Historial.objects.all()
     serializer_class = HistorialSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, BusquedaDispositivoFilter, filters.OrderingFilter]
     filterset_fields = ['tipo_cambio']
+    # Los campos del dispositivo se buscan con BusquedaDispositivoFilter (índices de trigramas)
     search_fields = [
-        'dispositivo__serial', 
-        'dispositivo__modelo',
-        'dispositivo__marca',
-        'dispositivo__placa_cu',
         'usuario__nombre',
         'usuario__username',
         'usuario__email'
@@ -1120,34 +1166,44 @@ class HistorialViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['fecha_modificacion', 'fecha_creacion']
     ordering = ['-fecha_modificacion']  # Orden por defecto
 
+    def get_expand(self):
+        # ?expand=dispositivo,usuario incluye los objetos completos en lugar de los resúmenes
+        expand = {e.strip() for e in self.request.query_params.get('expand', '').split(',') if e.strip()}
+        invalidos = expand - set(HistorialSerializer.EXPANSIBLES)
+        if invalidos:
+            raise ValidationError({"error": f"Valores de expand no válidos: {', '.join(sorted(invalidos))}"})
+        return expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['expand'] = self.get_expand()
+        return context
+
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = HistorialSerializer.optimizar_queryset(super().get_queryset(), self.get_expand())
         
         # Filtros adicionales
         fecha_inicio = self.request.query_params.get('fecha_inicio')
         fecha_fin = self.request.query_params.get('fecha_fin')
         dispositivo_id = self.request.query_params.get('dispositivo_id')
         tipo_cambio = self.request.query_params.get('tipo_cambio')
+        # Rango semiabierto [inicio, fin + 1 día) para que PostgreSQL solo lea las particiones de esos meses
         try:
             if fecha_inicio:
-                fecha_inicio_dt = datetime.strptime(fecha_inicio, '%Y-%m-%d')
+                fecha_inicio_dt = timezone.make_aware(datetime.strptime(fecha_inicio, '%Y-%m-%d'))
                 queryset = queryset.filter(fecha_modificacion__gte=fecha_inicio_dt)
                 
             if fecha_fin:
-                fecha_fin_dt = datetime.strptime(fecha_fin, '%Y-%m-%d') + timedelta(days=1)
-                queryset = queryset.filter(fecha_modificacion__lte=fecha_fin_dt)
+                fecha_fin_dt = timezone.make_aware(datetime.strptime(fecha_fin, '%Y-%m-%d') + timedelta(days=1))
+                queryset = queryset.filter(fecha_modificacion__lt=fecha_fin_dt)
         except ValueError as e:
             pass
         if dispositivo_id:
             if dispositivo_id.isdigit():
                 queryset = queryset.filter(dispositivo__id=dispositivo_id)
             else:
-                queryset = queryset.filter(
-                    Q(dispositivo__serial__icontains=dispositivo_id) |
-                    Q(dispositivo__placa_cu__icontains=dispositivo_id) |
-                    Q(dispositivo__modelo__icontains=dispositivo_id) |
-                    Q(dispositivo__marca__icontains=dispositivo_id)
-                )
+                # Usa los índices de trigramas de dispositivos (ver busqueda.py)
+                queryset = filtrar_por_dispositivo(queryset, dispositivo_id)
                 
         if tipo_cambio:
             queryset = queryset.filter(tipo_cambio=tipo_cambio)
@@ -1184,6 +1240,11 @@ def refresh_token_view(request):
             return Response({'error': 'Refresh token requerido'}, status=400)
             
         refresh = RefreshToken(refresh_token)
+        # Al renovar se vuelven a leer rol y estado del usuario
+        usuario = RolUser.objects.filter(pk=refresh.get('user_id'), is_active=True).first()
+        if usuario is None:
+            return Response({'error': 'Usuario desactivado'}, status=401)
+        agregar_claims(refresh, usuario, refresh.get('sede_id'))
         new_access = str(refresh.access_token)
         
         return Response({
@@ -1199,14 +1260,16 @@ def refresh_token_view(request):
 @permission_classes([AllowAny])
 def dispositivos_por_sede(request):
     try:
-        # Consulta corregida - usando 'dispositivos' en lugar de 'dispositivo'
-        sedes_con_dispositivos = Sede.objects.annotate(
-            total_dispositivos=Count('dispositivos')  # ¡Cambio importante aquí!
-        ).values('nombre', 'total_dispositivos').order_by('nombre')
+        # Los totales salen de la tabla de contadores, no de un COUNT sobre el inventario
+        totales = totales_dispositivos_por_sede()
+        sedes_con_dispositivos = [
+            {'nombre': nombre, 'total_dispositivos': totales.get(sede_id, 0)}
+            for sede_id, nombre in Sede.objects.order_by('nombre').values_list('id', 'nombre')
+        ]
 
         response = Response({
             'success': True,
-            'data': list(sedes_con_dispositivos)
+            'data': sedes_con_dispositivos
         }, status=200)
 
         # Configuración CORS
@@ -1288,6 +1351,7 @@ class MovimientoViewSet(viewsets.ModelViewSet):
         - posicion: ID de posición (origen o destino)
         - fecha_inicio/fecha_fin: Rango de fechas
         - encargado: ID del usuario encargado
+        - search: serial, placa CU, marca, modelo u observaciones del dispositivo
         """
         queryset = super().get_queryset()
         
@@ -1296,6 +1360,9 @@ class MovimientoViewSet(viewsets.ModelViewSet):
         
         if 'dispositivo' in params:
             queryset = queryset.filter(dispositivo__id=params['dispositivo'])
+
+        if params.get('search'):
+            queryset = filtrar_por_dispositivo(queryset, params['search'])
             
         if 'sede' in params:
             queryset = queryset.filter(sede__id=params['sede'])
@@ -1393,21 +1460,18 @@ class MovimientoViewSet(viewsets.ModelViewSet):
         
         try:
             with transaction.atomic():
-                # 1. Remover de posición anterior si existe
+                # 1. La posición anterior se libera al cambiar la FK del dispositivo
                 posicion_anterior = dispositivo.posicion
-                if posicion_anterior:
-                    posicion_anterior.dispositivos.remove(dispositivo)
                 
-                # 2. Agregar a nueva posición si existe
+                # 2. Asignar la nueva posición si existe
                 if posicion_destino:
                     # Verificar límite de dispositivos
-                    if posicion_destino.dispositivos.count() >= Posicion.MAX_DISPOSITIVOS:
+                    if posicion_destino.ocupacion >= Posicion.MAX_DISPOSITIVOS:
                         return Response(
                             {"error": f"La posición destino ya tiene el máximo de {Posicion.MAX_DISPOSITIVOS} dispositivos"},
                             status=status.HTTP_400_BAD_REQUEST
                         )
                     
-                    posicion_destino.dispositivos.add(dispositivo)
                     dispositivo.posicion = posicion_destino
                     dispositivo.sede = posicion_destino.sede if posicion_destino.sede else movimiento.sede
                 
@@ -1423,7 +1487,7 @@ class MovimientoViewSet(viewsets.ModelViewSet):
                 movimiento.save()
                 
                 # 5. Registrar en historial
-                Historial.objects.create(
+                registrar_historial(
                     dispositivo=dispositivo,
                     usuario=request.user,
                     tipo_cambio=Historial.TipoCambio.MOVIMIENTO,
@@ -1467,7 +1531,7 @@ class MovimientoViewSet(viewsets.ModelViewSet):
                 pos_origen = dispositivo.posicion
                 
                 # Verificar límite en posición destino
-                if pos_destino and pos_destino.dispositivos.count() >= Posicion.MAX_DISPOSITIVOS:
+                if pos_destino and pos_destino.ocupacion >= Posicion.MAX_DISPOSITIVOS:
                     return Response(
                         {"error": f"La posición destino ya tiene el máximo de {Posicion.MAX_DISPOSITIVOS} dispositivos"},
                         status=status.HTTP_400_BAD_REQUEST
@@ -1478,18 +1542,12 @@ class MovimientoViewSet(viewsets.ModelViewSet):
                 
                 # Actualizar posición del dispositivo si hay destino
                 if pos_destino:
-                    # Remover de posición anterior si existe
-                    if pos_origen:
-                        pos_origen.dispositivos.remove(dispositivo)
-                    
-                    # Agregar a nueva posición
-                    pos_destino.dispositivos.add(dispositivo)
                     dispositivo.posicion = pos_destino
                     dispositivo.piso = pos_destino.piso
                     dispositivo.save()
                     
                     # Registrar en el historial
-                    Historial.objects.create(
+                    registrar_historial(
                         dispositivo=dispositivo,
                         usuario=request.user,
                         tipo_cambio=Historial.TipoCambio.MOVIMIENTO,
@@ -1509,6 +1567,41 @@ class MovimientoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['POST'])
+    def trasladar(self, request):
+        """
+        Traslado masivo: {"movimientos": [{"dispositivo", "posicion_destino", "observacion"}],
+        "observacion", "atomico"}. Valida capacidad y sede de todos los destinos en
+        conjunto y devuelve el resultado de cada ítem. Con atomico=true no aplica
+        nada si alguno falla.
+        """
+        atomico = request.data.get('atomico', False)
+        if isinstance(atomico, str):
+            # Formularios y JSON armado a mano envían texto: "false" no es verdadero
+            atomico = atomico.strip().lower() in ('true', '1', 'si', 'sí')
+        atomico = bool(atomico)
+        try:
+            resultados, movimientos = trasladar_dispositivos(
+                request.data.get('movimientos'),
+                usuario=request.user,
+                observacion=str(request.data.get('observacion') or '').strip(),
+                atomico=atomico
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error en el traslado masivo: {str(e)}", exc_info=True)
+            return Response(
+                {"error": "Error interno al trasladar dispositivos"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        errores = sum(1 for r in resultados if not r['ok'])
+        return Response(
+            {'resultados': resultados, 'movidos': len(movimientos), 'errores': errores},
+            status=status.HTTP_400_BAD_REQUEST if atomico and errores else status.HTTP_200_OK
+        )
+
     @action(detail=True, methods=['GET', 'POST'])
     def revertir(self, request, pk=None):
         """
@@ -1541,19 +1634,15 @@ class MovimientoViewSet(viewsets.ModelViewSet):
                 # Actualizar posición del dispositivo
                 dispositivo = movimiento.dispositivo
                 
-                # Remover de posición actual
-                if dispositivo.posicion:
-                    dispositivo.posicion.dispositivos.remove(dispositivo)
-                
-                # Agregar a posición original si existe
-                if movimiento.posicion_origen:
-                    movimiento.posicion_origen.dispositivos.add(dispositivo)
-                    dispositivo.posicion = movimiento.posicion_origen
-                    dispositivo.piso = movimiento.posicion_origen.piso
+                # Volver a la posición original (o dejarlo sin posición si no tenía)
+                posicion_origen = movimiento.posicion_origen
+                if dispositivo.posicion_id != getattr(posicion_origen, 'pk', None):
+                    dispositivo.posicion = posicion_origen
+                    dispositivo.piso = posicion_origen.piso if posicion_origen else None
                     dispositivo.save()
                 
                 # Registrar en el historial
-                Historial.objects.create(
+                registrar_historial(
                     dispositivo=dispositivo,
                     usuario=request.user,
                     tipo_cambio=Historial.TipoCambio.REVERSION,
@@ -1636,13 +1725,10 @@ def movimientos_por_sede(request):
     sede_id = request.query_params.get('sede')
     
     try:
-        # Query base para sedes con movimientos
-        sedes_query = Sede.objects.annotate(
-            total_movimientos=Count('movimiento')  # Relación inversa correcta
-        )
-
-        # Contar movimientos sin sede asignada
-        movimientos_sin_sede = Movimiento.objects.filter(sede__isnull=True).count()
+        # Totales por sede desde la tabla de contadores
+        totales = totales_movimientos_por_sede()
+        movimientos_sin_sede = totales.get(None, 0)
+        sedes_query = Sede.objects.order_by('id')
 
         # Aplicar filtros según parámetros
         if sede_id == "null":
@@ -1650,28 +1736,19 @@ def movimientos_por_sede(request):
                 'nombre_sede': 'Sin sede asignada',
                 'total_movimientos': movimientos_sin_sede
             }]
-        elif sede_id:
-            sede_id = int(sede_id)
-            sedes_query = sedes_query.filter(id=sede_id)
-            data = list(sedes_query.values('id', 'nombre', 'total_movimientos'))
-            
-            # Formatear datos para la gráfica de React
-            data = [{
-                'name': item['nombre'],
-                'value': item['total_movimientos']
-            } for item in data]
         else:
-            # Todas las sedes más movimientos sin sede
-            data = list(sedes_query.values('id', 'nombre', 'total_movimientos'))
-            
+            if sede_id:
+                sede_id = int(sede_id)
+                sedes_query = sedes_query.filter(id=sede_id)
+
             # Formatear datos para la gráfica de React
             data = [{
-                'name': item['nombre'],
-                'value': item['total_movimientos']
-            } for item in data]
-            
-            # Agregar movimientos sin sede si existen
-            if movimientos_sin_sede > 0:
+                'name': nombre,
+                'value': totales.get(id_sede, 0)
+            } for id_sede, nombre in sedes_query.values_list('id', 'nombre')]
+
+            # Todas las sedes: agregar movimientos sin sede si existen
+            if not sede_id and movimientos_sin_sede > 0:
                 data.append({
                     'name': 'Sin sede asignada',
                     'value': movimientos_sin_sede
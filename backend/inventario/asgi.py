@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventario.settings')
 
 application = get_asgi_application()
+
+# Índice de autocompletado de dispositivos (se construye en un hilo aparte)
+from dispositivos.autocompletado import precargar_indice  # noqa: E402
+precargar_indice()
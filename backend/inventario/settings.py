@@ -51,10 +51,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'dispositivos.middlewares.PerfilConsultasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
-    'django.middleware.cache.UpdateCacheMiddleware', 
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -185,9 +185,43 @@ LOGGING = {
 }
 
 
+# Cache compartida por los procesos del servidor (respuestas de sedes, servicios,
+# posiciones y dashboard, ver dispositivos/cache.py). Para varios servidores
+# basta con cambiar el backend por uno compartido, p. ej.
+# 'django.core.cache.backends.redis.RedisCache' con LOCATION 'redis://...'.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Sesiones (ver dispositivos/sesiones.py), aparte para que vaciar la cache
+    # de respuestas no cierre sesiones. LocMemCache solo sirve con un único proceso.
+    'sesiones': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache_sesiones',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+
+# Importaciones de Excel en segundo plano (pool local de procesos)
+IMPORTACION_EN_SEGUNDO_PLANO = True
+IMPORTACION_WORKERS = 2
+# Un trabajo en curso sin lotes confirmados en este tiempo se puede reanudar
+IMPORTACION_SEGUNDOS_SIN_AVANCE = 600
+
+
 SESSION_COOKIE_AGE = 300  # 5 minutos (300 segundos)
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_SAVE_EVERY_REQUEST = True  # Renueva la sesión en cada solicitud
+# Sesiones en la cache 'sesiones' en lugar de django_session. El vencimiento se
+# extiende (se reescribe la sesión) solo cuando pasó esta fracción de
+# SESSION_COOKIE_AGE desde la última escritura.
+SESSION_ENGINE = 'dispositivos.sesiones'
+SESSION_CACHE_ALIAS = 'sesiones'
+SESION_FRACCION_RENOVACION = 0.5
 
 
 
@@ -219,4 +253,26 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),  # Extiende el tiempo del token
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
-}
\ No newline at end of file
+}
+# /api/validate/ y /auth/keepalive/ validan el JWT sin consultar la base; cada
+# proceso relee qué usuarios están activos cada JWT_REVOCACION_VIGENCIA
+# segundos, que es lo que tarda en aplicarse una desactivación hecha en otro proceso.
+JWT_REVOCACION_VIGENCIA = 5
+# Historial: los eventos se escriben en lote al confirmar la transacción. Con
+# True la escritura se delega a un proceso aparte que drena una cola local.
+HISTORIAL_EN_SEGUNDO_PLANO = False
+
+# Retención del historial particionado por mes (comando archivar_historial)
+HISTORIAL_MESES_RETENCION = 24
+HISTORIAL_DIRECTORIO_ARCHIVO = BASE_DIR / 'archivo_historial'
+
+# Autocompletado de dispositivos: índice de prefijos en memoria por proceso,
+# reconstruido cada AUTOCOMPLETADO_VIGENCIA segundos. Con False se consulta la base.
+AUTOCOMPLETADO_INDICE = True
+AUTOCOMPLETADO_VIGENCIA = 300
+
+# Perfilado de consultas por petición (cabeceras Server-Timing / X-Query-Count y
+# estadísticas en /api/perfilado/). Pensado para desarrollo y staging.
+PERFILADO_CONSULTAS = False
+PERFILADO_MUESTRAS = 200  # Peticiones recientes que se conservan por endpoint
+PERFILADO_UMBRAL_DUPLICADAS = 10  # Consultas repetidas a partir de las que se avisa de un N+1
@@ -37,6 +37,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     
     path('api/dashboard/', dashboard_data, name='dashboard-data'),
+    path('api/perfilado/', views.perfilado_view, name='perfilado'),
 
     # Autenticación y gestión de usuarios
     path('api/login/', views.login_user, name='login'),
@@ -56,11 +57,15 @@ urlpatterns = [
     path('api/sede/', views.get_sedes_view, name='get_sedes_view'),
     path('api/sedes/', views.sede_view, name='sede_view'),
     path('api/sedes/<int:sede_id>/', views.sede_detail_view, name='sede_detail_view'),
+    path('api/sedes/<int:sede_id>/posiciones/', views.posiciones_por_sede_view, name='posiciones_por_sede_view'),
+    path('api/sedes/<int:sede_id>/pisos/<str:piso>/plano/', views.plano_piso_view, name='plano_piso'),
     
     
     # Rutas para dispositivos
     path('api/dispositivos/', views.dispositivo_view, name='dispositivo_view'),
     path('api/dispositivos/<int:dispositivo_id>/', views.dispositivo_detail_view, name='dispositivo_view'),
+    path('api/dispositivos/search/', views.buscar_dispositivos_view, name='buscar-dispositivos'),
+    path('api/dispositivos/autocomplete/', views.autocompletar_dispositivos_view, name='autocompletar-dispositivos'),
     path('api/movimientos/crear/', MovimientoViewSet.as_view({'post': 'crear_movimiento_completo'}), name='movimiento-crear'),
     path('api/dispositivos-disponibles/<int:sede_id>/', views.dispositivos_disponibles_para_movimiento, name='dispositivos-disponibles'),
     
@@ -82,14 +87,17 @@ urlpatterns = [
     
 
     path('api/importar-dispositivos/', importar_dispositivos, name='importar_dispositivos'),
+    path('api/importaciones/<int:trabajo_id>/', views.estado_importacion, name='estado_importacion'),
+    path('api/importaciones/<int:trabajo_id>/reanudar/', views.reanudar_importacion, name='reanudar_importacion'),
     path("importar-excel/", subir_excel, name="importar-excel"),
     path("exportar-excel/", descargar_excel, name="exportar-excel"),
     
     
     # URLs para posiciones
     path('api/posiciones/', views.PosicionListCreateView.as_view(), name='posicion-list-create'),
-    path('api/posiciones/<str:id>/', views.PosicionRetrieveUpdateDestroyView.as_view(), name='posicion-retrieve-update-destroy'),
+    # colores-pisos va antes de <str:id> para que no lo capture esa ruta
     path('api/posiciones/colores-pisos/', views.get_colores_pisos, name='colores-pisos'),
+    path('api/posiciones/<str:id>/', views.PosicionRetrieveUpdateDestroyView.as_view(), name='posicion-retrieve-update-destroy'),
     
     
     
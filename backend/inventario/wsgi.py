@@ -4,3 +4,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventario.settings')
 
 application = get_wsgi_application()
+
+# Índice de autocompletado de dispositivos (se construye en un hilo aparte)
+from dispositivos.autocompletado import precargar_indice  # noqa: E402
+precargar_indice()